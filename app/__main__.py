@@ -0,0 +1,9 @@
+"""
+`python -m app`: bulk inventory runner (see app.batch)
+"""
+
+import sys
+
+from .batch import main
+
+sys.exit(main())
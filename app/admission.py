@@ -0,0 +1,238 @@
+"""
+Cost-based admission control for analysis requests
+
+Each request is priced in Monte Carlo samples: iterations per enabled
+analysis plus a fixed overhead (sensitivity also pays for its rank
+correlations). The price of all admitted, unfinished requests is held
+against a global budget (ADMISSION_BUDGET, default 60k samples per CPU).
+One caller (user, or client address when anonymous) may hold at most
+ADMISSION_USER_SHARE of it.
+
+A request that does not fit waits up to ADMISSION_QUEUE_TIMEOUT_SECONDS
+for capacity. If it still does not fit, it is degraded to the largest
+plan that does (fewer iterations, then no sensitivity, then the
+deterministic Tier 1 result, which is free). It is rejected with
+Retry-After instead when ADMISSION_OVERLOAD=reject or the request sets
+`allow_degraded=false`: 429 when the caller's share is the limit, 503
+when the global budget is.
+
+Waiters are futures of the loop that created them and are woken with
+call_soon_threadsafe, so the controller works across event loops.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from . import metrics
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1").lower() in ("1", "true", "yes")
+ADMISSION_BUDGET = float(os.getenv("ADMISSION_BUDGET", str(60_000 * (os.cpu_count() or 1))))
+ADMISSION_USER_SHARE = float(os.getenv("ADMISSION_USER_SHARE", "0.5"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2.0"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_OVERLOAD = os.getenv("ADMISSION_OVERLOAD", "degrade")  # or "reject"
+
+MIN_ITERATIONS = 100
+
+# Samples-equivalent overhead per enabled analysis (measured: ~2.5 ms and
+# ~5 ms fixed versus ~1 us per iteration)
+UNCERTAINTY_OVERHEAD = 2_500
+SENSITIVITY_OVERHEAD = 5_000
+
+DECISIONS = metrics.registry.register(metrics.Counter(
+    "reservoir_admission_decisions_total", "Analysis admission outcomes", ("outcome",)
+))
+
+# (run_uncertainty, run_sensitivity, iterations)
+Plan = Tuple[bool, bool, int]
+
+
+def cost(plan: Plan) -> float:
+    """Price of a plan in Monte Carlo samples; 0 for the deterministic result"""
+    run_uncertainty, run_sensitivity, iterations = plan
+    price = 0.0
+    if run_uncertainty:
+        price += UNCERTAINTY_OVERHEAD + iterations
+    if run_sensitivity:
+        price += SENSITIVITY_OVERHEAD + iterations
+    return price
+
+
+def _fitting_iterations(plan: Plan, available: float) -> Optional[int]:
+    """Most iterations (>= MIN_ITERATIONS) for which `plan` costs <= available"""
+    run_uncertainty, run_sensitivity, _ = plan
+    per_iteration = int(run_uncertainty) + int(run_sensitivity)
+    overhead = cost((run_uncertainty, run_sensitivity, 0))
+    iterations = int((available - overhead) // per_iteration)
+    return iterations if iterations >= MIN_ITERATIONS else None
+
+
+def degrade(plan: Plan, available: float) -> Plan:
+    """Largest plan within `available`: fewer iterations, then no sensitivity, then none"""
+    run_uncertainty, run_sensitivity, iterations = plan
+    for candidate in ((run_uncertainty, run_sensitivity), (run_uncertainty, False), (False, run_sensitivity)):
+        if not any(candidate):
+            continue
+        fitting = _fitting_iterations((*candidate, iterations), available)
+        if fitting is not None:
+            return (*candidate, min(fitting, iterations))
+    return (False, False, iterations)
+
+
+class Overloaded(Exception):
+    """No capacity for a request that may not be degraded"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Permit:
+    """Budget held by one admitted request until `release`"""
+
+    def __init__(self, controller: "AdmissionController", key: str, price: float):
+        self.controller = controller
+        self.key = key
+        self.price = price
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """Global compute budget with a per-caller share and a bounded wait queue"""
+
+    def __init__(
+        self,
+        budget: float = ADMISSION_BUDGET,
+        user_share: float = ADMISSION_USER_SHARE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        overload: str = ADMISSION_OVERLOAD,
+    ):
+        self.budget = budget
+        self.user_share = user_share
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.overload = overload
+        self.in_flight = 0.0
+        self._by_key: Dict[str, float] = defaultdict(float)
+        self._waiters: List[asyncio.Future] = []
+        self._lock = threading.Lock()
+        # Seconds per sample of finished requests (EWMA), for Retry-After
+        self._seconds_per_sample = 1e-6
+
+    @property
+    def user_budget(self) -> float:
+        return self.budget * self.user_share
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _available(self, key: str) -> float:
+        return max(0.0, min(self.budget - self.in_flight, self.user_budget - self._by_key[key]))
+
+    def _try_take(self, key: str, price: float) -> Optional[Permit]:
+        with self._lock:
+            if price > self._available(key):
+                return None
+            self.in_flight += price
+            self._by_key[key] += price
+            return Permit(self, key, price)
+
+    def _release(self, permit: Permit) -> None:
+        elapsed = time.monotonic() - permit.started
+        with self._lock:
+            self.in_flight = max(0.0, self.in_flight - permit.price)
+            self._by_key[permit.key] -= permit.price
+            if self._by_key[permit.key] <= 0:
+                del self._by_key[permit.key]
+            if permit.price:
+                self._seconds_per_sample += 0.2 * (elapsed / permit.price - self._seconds_per_sample)
+            waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+
+    def retry_after(self) -> int:
+        """Seconds until roughly the in-flight work has drained"""
+        cpus = os.cpu_count() or 1
+        return max(1, math.ceil(self.in_flight * self._seconds_per_sample / cpus))
+
+    async def _wait_for_capacity(self, key: str, price: float) -> Optional[Permit]:
+        deadline = time.monotonic() + self.queue_timeout
+        while True:
+            permit = self._try_take(key, price)
+            remaining = deadline - time.monotonic()
+            if permit is not None or remaining <= 0:
+                return permit
+            waiter = asyncio.get_running_loop().create_future()
+            with self._lock:
+                self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._lock:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+
+    async def admit(self, key: str, plan: Plan, allow_degraded: bool = True) -> Tuple[Plan, Optional[Permit]]:
+        """
+        Admit `plan` for caller `key`, possibly after waiting or degraded
+
+        Returns:
+            (plan to run, permit to release when done; None for free plans)
+
+        Raises:
+            Overloaded: when the request can neither run nor be degraded
+        """
+        price = cost(plan)
+        if price == 0:
+            return plan, None
+
+        permit = self._try_take(key, price)
+        if permit is not None:
+            DECISIONS.inc("admitted")
+            return plan, permit
+
+        if price <= self.user_budget and self.queue_depth < self.max_queue:
+            DECISIONS.inc("queued")
+            permit = await self._wait_for_capacity(key, price)
+            if permit is not None:
+                return plan, permit
+
+        share_limited = self.user_budget - self._by_key[key] < self.budget - self.in_flight
+        if not allow_degraded or self.overload == "reject":
+            DECISIONS.inc("rejected")
+            if share_limited:
+                raise Overloaded(429, "Too many concurrent analyses for this user", self.retry_after())
+            raise Overloaded(503, "Server is at analysis capacity", self.retry_after())
+
+        DECISIONS.inc("degraded")
+        while True:
+            degraded = degrade(plan, self._available(key))
+            permit = self._try_take(key, cost(degraded))
+            if permit is not None or cost(degraded) == 0:
+                return degraded, permit
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+# Process-wide controller; None when ADMISSION_ENABLED=0
+controller: Optional[AdmissionController] = AdmissionController() if ADMISSION_ENABLED else None
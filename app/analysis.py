@@ -4,9 +4,9 @@ Uncertainty and Sensitivity Analysis for Reservoir Emissions
 
 import numpy as np
 import math
-from scipy import stats
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Tuple
 from .ipcc_tier1 import calculate_emissions, UNCERTAINTY_RANGES
+from .metrics import stage
 
 # 定义GWP常量
 GWP_CH4 = 28  # IPCC AR5
@@ -49,6 +49,59 @@ class UncertaintyAnalysis:
         Returns:
             Dictionary with statistics for each emission type
         """
+        ch4_results, co2_results, co2eq_results = self._simulate(
+            self.iterations, surface_area, ch4_ef, co2_ef, n2o_ef, uncertainty_ranges
+        )
+        
+        # Calculate statistics
+        return {
+            "CH4": self._calculate_statistics(ch4_results),
+            "CO2": self._calculate_statistics(co2_results),
+            "CO2_equivalent": self._calculate_statistics(co2eq_results),
+        }
+    
+    def iter_chunks(
+        self,
+        surface_area: float,
+        ch4_ef: float,
+        co2_ef: float,
+        n2o_ef: float,
+        chunk_size: int = None,
+        uncertainty_ranges: Dict[str, float] = None
+    ) -> Iterator[Tuple[int, Dict[str, Dict[str, float]]]]:
+        """
+        Run the simulation in chunks for progress reporting
+        
+        Yields:
+            (iterations done, statistics over all samples so far); the last
+            item covers all `iterations` samples, like `run`
+        """
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(self.iterations / 20))
+        
+        results = {name: np.empty(self.iterations) for name in ("CH4", "CO2", "CO2_equivalent")}
+        done = 0
+        while done < self.iterations:
+            n = min(chunk_size, self.iterations - done)
+            chunk = self._simulate(n, surface_area, ch4_ef, co2_ef, n2o_ef, uncertainty_ranges)
+            for values, part in zip(results.values(), chunk):
+                values[done:done + n] = part
+            done += n
+            yield done, {
+                name: self._calculate_statistics(values[:done])
+                for name, values in results.items()
+            }
+    
+    def _simulate(
+        self,
+        n: int,
+        surface_area: float,
+        ch4_ef: float,
+        co2_ef: float,
+        n2o_ef: float,
+        uncertainty_ranges: Dict[str, float] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Draw `n` samples; returns (CH4, CO2, CO2-eq) emissions"""
         if uncertainty_ranges is None:
             uncertainty_ranges = UNCERTAINTY_RANGES
         
@@ -57,7 +110,7 @@ class UncertaintyAnalysis:
         
         # Surface area uncertainty (±10%)
         area_std = surface_area * 0.1
-        area_samples = np.random.normal(surface_area, area_std, self.iterations)
+        area_samples = np.random.normal(surface_area, area_std, n)
         area_samples = np.maximum(area_samples, 0.01)  # Ensure positive
         
         # Emission factor uncertainties
@@ -70,42 +123,36 @@ class UncertaintyAnalysis:
             ch4_ef_samples = np.random.lognormal(
                 np.log(ch4_ef) - 0.5 * (ch4_std/ch4_ef)**2,
                 ch4_std/ch4_ef,
-                self.iterations
+                n
             )
         else:
-            ch4_ef_samples = np.zeros(self.iterations)
+            ch4_ef_samples = np.zeros(n)
         
         # 处理CO2排放因子
         if co2_ef > 0:
             co2_ef_samples = np.random.lognormal(
                 np.log(co2_ef) - 0.5 * (co2_std/co2_ef)**2,
                 co2_std/co2_ef,
-                self.iterations
+                n
             )
         else:
-            co2_ef_samples = np.zeros(self.iterations)
+            co2_ef_samples = np.zeros(n)
         
         # 处理N2O排放因子（IPCC Tier 1通常为0）
         if n2o_ef > 0:
             n2o_ef_samples = np.random.lognormal(
                 np.log(n2o_ef) - 0.5 * (n2o_std/n2o_ef)**2,
                 n2o_std/n2o_ef,
-                self.iterations
+                n
             )
         else:
-            n2o_ef_samples = np.zeros(self.iterations)
+            n2o_ef_samples = np.zeros(n)
         
         # Calculate emissions for each iteration
         ch4_results = area_samples * ch4_ef_samples
         co2_results = area_samples * co2_ef_samples
         co2eq_results = co2_results + (ch4_results * GWP_CH4)
-        
-        # Calculate statistics
-        return {
-            "CH4": self._calculate_statistics(ch4_results),
-            "CO2": self._calculate_statistics(co2_results),
-            "CO2_equivalent": self._calculate_statistics(co2eq_results),
-        }
+        return ch4_results, co2_results, co2eq_results
     
     def _calculate_statistics(self, data: np.ndarray) -> Dict[str, float]:
         """Calculate statistical measures from sample data"""
@@ -197,6 +244,9 @@ class SensitivityAnalysis:
             "CO2 Emission Factor": co2_ef_samples,
         }
         
+        # Deferred import: scipy.stats costs ~0.5 s and is only needed here
+        from scipy import stats
+        
         # Calculate correlations
         results = []
         for param_name, param_values in parameters.items():
@@ -237,11 +287,13 @@ def run_full_analysis(
     sensitivity_results = None
     
     if run_uncertainty:
-        ua = UncertaintyAnalysis(iterations=iterations)
-        uncertainty_results = ua.run(surface_area, ch4_ef, co2_ef, n2o_ef)
+        with stage("uncertainty"):
+            ua = UncertaintyAnalysis(iterations=iterations)
+            uncertainty_results = ua.run(surface_area, ch4_ef, co2_ef, n2o_ef)
     
     if run_sensitivity:
-        sa = SensitivityAnalysis(iterations=iterations)
-        sensitivity_results = sa.run(surface_area, ch4_ef, co2_ef, n2o_ef)
+        with stage("sensitivity"):
+            sa = SensitivityAnalysis(iterations=iterations)
+            sensitivity_results = sa.run(surface_area, ch4_ef, co2_ef, n2o_ef)
     
     return uncertainty_results, sensitivity_results
@@ -0,0 +1,230 @@
+"""
+Tiered retention: move old analyses to Parquet cold storage
+
+`archive` copies every analysis older than a cutoff into one Parquet file
+per creation month (`<ARCHIVE_DIR>/month=YYYY-MM/analyses.parquet`, rows
+sorted by id). It then strips the bulky results (uncertainty,
+sensitivity, user inputs) from the database row and records the month
+in `archived_month`. The stub keeps the summary columns, so listings,
+rollups, statistics and the map are unaffected. Reading an archived id
+loads the results from its partition instead; row-group statistics on
+id skip most of the file. Finally the SQLite file is vacuumed to give
+back the freed pages.
+
+The Parquet file is replaced atomically before the stubs are written.
+An interrupted run therefore only leaves rows to archive again, and the
+duplicates are dropped by id. Analyses deleted after archiving keep
+their archived copy until `prune` rewrites the partitions.
+
+Usage:
+    python -m app.archive run [--older-than-days 365] [--dir DIR]
+    python -m app.archive prune [--dir DIR]
+"""
+
+import argparse
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import Engine
+
+from . import models
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./data/archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+
+# Stub columns emptied by archiving (database name -> archive column)
+RESULT_COLUMNS = {
+    "uncertainty_packed": "uncertainty_analysis",
+    "sensitivity_packed": "sensitivity_analysis",
+    "user_inputs_packed": "user_inputs",
+}
+
+# Columns that stay out of the archive: pre-packing leftovers and the marker
+_SKIPPED = {"uncertainty_analysis", "sensitivity_analysis", "user_inputs", "archived_month"}
+
+_ROW_GROUP_SIZE = 10_000
+
+
+def partition_path(month: str, directory: Optional[str] = None) -> str:
+    return os.path.join(directory or ARCHIVE_DIR, f"month={month}", "analyses.parquet")
+
+
+def _archive_columns():
+    table = models.ReservoirAnalysis.__table__
+    return [column for column in table.columns if column.name not in _SKIPPED]
+
+
+def _record(row) -> Dict:
+    """One archived row: results as JSON text, everything else as stored"""
+    record = {}
+    for name, value in row._mapping.items():
+        if name in RESULT_COLUMNS:
+            record[RESULT_COLUMNS[name]] = None if value is None else json.dumps(value)
+        else:
+            record[name] = value
+    return record
+
+
+def _write_partition(path: str, records: List[Dict]) -> None:
+    """Merge records into a month's file, replacing it atomically"""
+    # Deferred import: pandas/pyarrow are only needed by the archive job and archived reads
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(records)
+    if os.path.exists(path):
+        frame = pd.concat([pd.read_parquet(path), frame], ignore_index=True)
+    frame = frame.drop_duplicates("id", keep="last").sort_values("id")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + ".partial"
+    frame.to_parquet(partial, index=False, row_group_size=_ROW_GROUP_SIZE)
+    os.replace(partial, path)
+
+
+def archive(
+    bind: Engine,
+    older_than: timedelta = timedelta(days=ARCHIVE_AFTER_DAYS),
+    directory: Optional[str] = None,
+    batch_size: int = 1000,
+    compact: bool = True
+) -> Dict[str, int]:
+    """
+    Archive analyses created more than `older_than` ago
+
+    Returns:
+        {"analyses": rows archived, "partitions": month files written}
+    """
+    table = models.ReservoirAnalysis.__table__
+    cutoff = datetime.utcnow() - older_than
+
+    with bind.connect() as conn:
+        candidates = conn.execute(
+            select(table.c.id, table.c.created_at)
+            .where(table.c.created_at < cutoff, table.c.archived_month.is_(None))
+            .order_by(table.c.created_at, table.c.id)
+        ).all()
+    months: Dict[str, List[int]] = defaultdict(list)
+    for analysis_id, created_at in candidates:
+        months[created_at.strftime("%Y-%m")].append(analysis_id)
+
+    columns = _archive_columns()
+    for month, ids in months.items():
+        records = []
+        with bind.connect() as conn:
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                records.extend(_record(row) for row in conn.execute(select(*columns).where(table.c.id.in_(batch))))
+        _write_partition(partition_path(month, directory), records)
+
+        stub = update(table).values(archived_month=month, **dict.fromkeys(RESULT_COLUMNS))
+        for start in range(0, len(ids), batch_size):
+            with bind.begin() as conn:
+                conn.execute(stub.where(table.c.id.in_(ids[start:start + batch_size])))
+
+    if candidates and compact:
+        from .migrations import vacuum
+
+        vacuum(bind)
+    return {"analyses": len(candidates), "partitions": len(months)}
+
+
+def _decode(record: Dict) -> Dict:
+    for column in RESULT_COLUMNS.values():
+        value = record.get(column)
+        record[column] = None if value is None else json.loads(value)
+    return record
+
+
+def load_many(keys: Iterable[Tuple[int, str]], directory: Optional[str] = None) -> Dict[int, Dict]:
+    """
+    Archived rows for (analysis_id, archived_month) pairs, one read per month
+
+    Returns:
+        {analysis_id: archived columns with results decoded}; ids not found are left out
+    """
+    import pandas as pd
+
+    months: Dict[str, List[int]] = defaultdict(list)
+    for analysis_id, month in keys:
+        months[month].append(analysis_id)
+
+    found = {}
+    for month, ids in months.items():
+        path = partition_path(month, directory)
+        if not os.path.exists(path):
+            continue
+        frame = pd.read_parquet(path, filters=[("id", "in", ids)])
+        frame = frame.astype(object).where(frame.notna(), None)
+        for record in frame.to_dict("records"):
+            found[int(record["id"])] = _decode(record)
+    return found
+
+
+def load(analysis_id: int, month: str, directory: Optional[str] = None) -> Optional[Dict]:
+    """Archived row of one analysis, or None if the partition lacks it"""
+    return load_many([(analysis_id, month)], directory).get(analysis_id)
+
+
+def prune(bind: Engine, directory: Optional[str] = None) -> int:
+    """
+    Drop archived copies of analyses whose stub was deleted
+
+    Returns:
+        Number of archived rows removed
+    """
+    import pandas as pd
+
+    directory = directory or ARCHIVE_DIR
+    if not os.path.isdir(directory):
+        return 0
+    table = models.ReservoirAnalysis.__table__
+    removed = 0
+    for name in sorted(os.listdir(directory)):
+        if not name.startswith("month="):
+            continue
+        month = name[len("month="):]
+        path = partition_path(month, directory)
+        if not os.path.exists(path):
+            continue
+        with bind.connect() as conn:
+            live = set(conn.scalars(select(table.c.id).where(table.c.archived_month == month)))
+        frame = pd.read_parquet(path)
+        keep = frame["id"].isin(live)
+        if keep.all():
+            continue
+        removed += int((~keep).sum())
+        if keep.any():
+            partial = path + ".partial"
+            frame[keep].to_parquet(partial, index=False, row_group_size=_ROW_GROUP_SIZE)
+            os.replace(partial, path)
+        else:
+            os.remove(path)
+    return removed
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Archive old analyses to Parquet cold storage")
+    parser.add_argument("command", choices=["run", "prune"],
+                        help="run: archive old analyses; prune: drop archived copies of deleted ones")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--dir", default=ARCHIVE_DIR, help="archive root directory")
+    parser.add_argument("--no-vacuum", action="store_true", help="skip compacting the database")
+    args = parser.parse_args(argv)
+
+    from .database import engine
+    from . import migrations
+
+    migrations.upgrade(engine)
+    if args.command == "run":
+        summary = archive(engine, timedelta(days=args.older_than_days), args.dir, compact=not args.no_vacuum)
+        print(f"✅ Archived {summary['analyses']:,} analyses into {summary['partitions']} monthly partitions")
+    else:
+        print(f"✅ Pruned {prune(engine, args.dir):,} archived analyses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Precompressed, fingerprinted static assets and pre-rendered page shells
+
+On first use (warmed at startup) every file under `static/` is read once,
+content-hashed and compressed with gzip and, when the optional `brotli`
+package is installed, brotli. Fingerprinted URLs (`app.<hash>.js`) are
+served with immutable caching; plain URLs and page shells are revalidated
+with ETags. Files changed on disk are picked up on the next restart.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+try:
+    import brotli
+except ImportError:  # optional: gzip alone still works
+    brotli = None
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(APP_DIR, "static")
+TEMPLATES_DIR = os.path.join(APP_DIR, "templates")
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# Don't bother compressing payloads smaller than a TCP packet or so
+MIN_COMPRESS_SIZE = 1024
+
+
+class Asset:
+    """One static payload with its precompressed variants"""
+
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.etag = f'W/"{self.digest[:16]}"'
+        self.encodings: Dict[str, bytes] = {}
+
+        if len(body) >= MIN_COMPRESS_SIZE:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.encodings["gzip"] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.encodings["br"] = compressed
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        """Build a response, honouring If-None-Match and Accept-Encoding"""
+        headers = {
+            "ETag": self.etag,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+
+        if _etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+
+        body = self.body
+        encoding = _choose_encoding(request.headers.get("accept-encoding", ""), self.encodings)
+        if encoding:
+            body = self.encodings[encoding]
+            headers["Content-Encoding"] = encoding
+
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: ignore W/ prefixes on either side
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(","))
+
+
+def _choose_encoding(accept_encoding: str, available: Dict[str, bytes]) -> Optional[str]:
+    """Pick the best precompressed variant the client accepts"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(name)
+
+    for encoding in ("br", "gzip"):
+        if encoding in available and encoding in accepted:
+            return encoding
+    return None
+
+
+def fingerprinted_name(name: str, digest: str) -> str:
+    """`js/app.js` -> `js/app.<hash>.js`"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest[:12]}{ext}"
+
+
+class AssetStore:
+    """In-memory static files and page shells, built once per process"""
+
+    def __init__(self, static_dir: str = STATIC_DIR, templates_dir: str = TEMPLATES_DIR):
+        self.static_dir = static_dir
+        self.templates_dir = templates_dir
+        self.static: Dict[str, Asset] = {}       # request path -> asset
+        self.immutable: Dict[str, bool] = {}     # request path -> fingerprinted?
+        self.manifest: Dict[str, str] = {}       # logical name -> fingerprinted name
+        self.pages: Dict[str, Asset] = {}        # template name -> rendered shell
+
+        self._load_static()
+        self.env = Environment(
+            loader=FileSystemLoader(templates_dir),
+            autoescape=select_autoescape(["html"])
+        )
+        self.env.globals["static_url"] = self.static_url
+
+    def _load_static(self) -> None:
+        for root, _, files in os.walk(self.static_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.static_dir).replace(os.sep, "/")
+                media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                if media_type.startswith("text/") or media_type == "application/javascript":
+                    media_type += "; charset=utf-8"
+
+                with open(path, "rb") as f:
+                    asset = Asset(f.read(), media_type)
+
+                hashed = fingerprinted_name(name, asset.digest)
+                self.manifest[name] = hashed
+                self.static[name] = asset
+                self.immutable[name] = False
+                self.static[hashed] = asset
+                self.immutable[hashed] = True
+
+    def static_url(self, name: str) -> str:
+        """URL for a static file, fingerprinted when the file is known"""
+        return "/static/" + self.manifest.get(name, name)
+
+    def static_response(self, path: str, request: Request) -> Optional[Response]:
+        asset = self.static.get(path)
+        if asset is None:
+            return None
+        cache_control = IMMUTABLE_CACHE if self.immutable[path] else REVALIDATE_CACHE
+        return asset.response(request, cache_control)
+
+    def page_response(self, template_name: str, request: Request) -> Response:
+        """Serve a template rendered once, without per-request context"""
+        page = self.pages.get(template_name)
+        if page is None:
+            html = self.env.get_template(template_name).render()
+            page = Asset(html.encode("utf-8"), "text/html; charset=utf-8")
+            self.pages[template_name] = page
+        return page.response(request, REVALIDATE_CACHE)
+
+    def prerender(self) -> None:
+        """Render every page shell now rather than on its first request"""
+        for template_name in self.env.list_templates(extensions=["html"]):
+            if template_name not in self.pages:
+                html = self.env.get_template(template_name).render()
+                self.pages[template_name] = Asset(html.encode("utf-8"), "text/html; charset=utf-8")
+
+
+_store: Optional[AssetStore] = None
+
+
+def get_store() -> AssetStore:
+    """Process-wide asset store, built on first use"""
+    global _store
+    if _store is None:
+        _store = AssetStore()
+    return _store
@@ -1,17 +1,42 @@
+import asyncio
 import bcrypt
 import jwt
 from jwt.exceptions import InvalidTokenError
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional
 import os
+import time
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from . import models, schemas
+from .cache import TTLCache
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# bcrypt runs on a small dedicated pool so login bursts never block the event loop
+HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+# Logins/registrations allowed to wait for a hashing worker before shedding load
+HASH_MAX_PENDING = int(os.getenv("AUTH_HASH_MAX_PENDING", "64"))
+
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_pending = 0
+
+# Verified token -> username, and username -> profile fields / user id
+token_cache = TTLCache(maxsize=4096, ttl=float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "60")))
+profile_cache = TTLCache(maxsize=1024, ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "30")))
+user_id_cache = TTLCache(maxsize=4096, ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "30")))
+
+PROFILE_FIELDS = ("username", "email", "first_name", "last_name", "organization", "created_at")
+
+
+class HashingBusyError(Exception):
+    """Raised when too many password hashes are already queued"""
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     # bcrypt has a 72-byte limit, so truncate if necessary
@@ -42,14 +67,50 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def verify_token(token: str) -> Optional[str]:
     """Verify a JWT token and return the username"""
+    username = token_cache.get(token)
+    if username is not None:
+        return username
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             return None
-        return username
     except InvalidTokenError:
         return None
+    
+    # Never cache a token beyond its own expiry
+    ttl = token_cache.ttl
+    if payload.get("exp") is not None:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        token_cache.set(token, username, ttl=ttl)
+    return username
+
+def hash_queue_depth() -> int:
+    """Password hashes running or waiting for a hashing worker"""
+    return _hash_pending
+
+async def _run_hashing(func, *args):
+    """Run a bcrypt call on the hashing pool, shedding load past HASH_MAX_PENDING"""
+    global _hash_pending
+    if _hash_pending >= HASH_MAX_PENDING:
+        raise HashingBusyError("Too many authentication requests in progress")
+    
+    _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_pending -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """`verify_password` off the event loop"""
+    return await _run_hashing(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """`get_password_hash` off the event loop"""
+    return await _run_hashing(get_password_hash, password)
 
 def authenticate_user(db: Session, username: str, password: str) -> Optional[models.User]:
     """Authenticate a user with username/email and password"""
@@ -66,6 +127,22 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[mod
     
     return user
 
+async def authenticate_user_async(db: AsyncSession, username: str, password: str) -> Optional[models.User]:
+    """`authenticate_user` on an async session, with the bcrypt check run on the hashing pool"""
+    user = await db.scalar(
+        select(models.User).where(
+            (models.User.username == username) | (models.User.email == username)
+        ).limit(1)
+    )
+    
+    if not user:
+        return None
+    
+    if not await verify_password_async(password, user.hashed_password):
+        return None
+    
+    return user
+
 def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
     """Get user by username"""
     return db.query(models.User).filter(models.User.username == username).first()
@@ -74,8 +151,8 @@ def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     """Get user by email"""
     return db.query(models.User).filter(models.User.email == email).first()
 
-def create_user(db: Session, user_data: schemas.RegisterRequest) -> models.User:
-    """Create a new user"""
+def check_registration_available(db: Session, user_data: schemas.RegisterRequest) -> None:
+    """Raise ValueError if the username or email is already taken"""
     # Check if username already exists
     if get_user_by_username(db, user_data.username):
         raise ValueError("Username already registered")
@@ -83,9 +160,18 @@ def create_user(db: Session, user_data: schemas.RegisterRequest) -> models.User:
     # Check if email already exists
     if get_user_by_email(db, user_data.email):
         raise ValueError("Email already registered")
+
+def create_user(
+    db: Session,
+    user_data: schemas.RegisterRequest,
+    hashed_password: Optional[str] = None
+) -> models.User:
+    """Create a new user (pass `hashed_password` if it was hashed off-thread)"""
+    check_registration_available(db, user_data)
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    if hashed_password is None:
+        hashed_password = get_password_hash(user_data.password)
     db_user = models.User(
         username=user_data.username,
         email=user_data.email,
@@ -100,4 +186,99 @@ def create_user(db: Session, user_data: schemas.RegisterRequest) -> models.User:
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
-    return db_user
\ No newline at end of file
+    return db_user
+
+def get_user_profile(db: Session, username: str) -> Optional[Dict]:
+    """Profile fields for `username`, served from a short-lived cache"""
+    profile = profile_cache.get(username)
+    if profile is not None:
+        return profile
+    
+    user = get_user_by_username(db, username)
+    if not user:
+        return None
+    
+    profile = {field: getattr(user, field) for field in PROFILE_FIELDS}
+    profile_cache.set(username, profile)
+    return profile
+
+def get_user_id(db: Session, username: str) -> Optional[int]:
+    """Primary key of `username`, served from a short-lived cache"""
+    user_id = user_id_cache.get(username)
+    if user_id is not None:
+        return user_id
+    
+    user_id = db.query(models.User.id).filter(models.User.username == username).scalar()
+    if user_id is not None:
+        user_id_cache.set(username, user_id)
+    return user_id
+
+def invalidate_user_profile(username: str) -> None:
+    """Drop a cached profile after the user row changes"""
+    profile_cache.pop(username)
+
+
+# Async session variants, used by the request handlers
+
+async def get_user_by_username_async(db: AsyncSession, username: str) -> Optional[models.User]:
+    return await db.scalar(select(models.User).where(models.User.username == username).limit(1))
+
+async def get_user_by_email_async(db: AsyncSession, email: str) -> Optional[models.User]:
+    return await db.scalar(select(models.User).where(models.User.email == email).limit(1))
+
+async def check_registration_available_async(db: AsyncSession, user_data: schemas.RegisterRequest) -> None:
+    """Raise ValueError if the username or email is already taken"""
+    if await get_user_by_username_async(db, user_data.username):
+        raise ValueError("Username already registered")
+    if await get_user_by_email_async(db, user_data.email):
+        raise ValueError("Email already registered")
+
+async def create_user_async(
+    db: AsyncSession,
+    user_data: schemas.RegisterRequest,
+    hashed_password: Optional[str] = None
+) -> models.User:
+    """`create_user` on an async session; hashes on the hashing pool if needed"""
+    await check_registration_available_async(db, user_data)
+    
+    if hashed_password is None:
+        hashed_password = await get_password_hash_async(user_data.password)
+    db_user = models.User(
+        username=user_data.username,
+        email=user_data.email,
+        hashed_password=hashed_password,
+        first_name=user_data.first_name,
+        last_name=user_data.last_name,
+        organization=user_data.organization,
+        is_active=True,
+        is_verified=False
+    )
+    
+    db.add(db_user)
+    await db.commit()
+    return db_user
+
+async def get_user_profile_async(db: AsyncSession, username: str) -> Optional[Dict]:
+    """`get_user_profile` on an async session (same cache)"""
+    profile = profile_cache.get(username)
+    if profile is not None:
+        return profile
+    
+    user = await get_user_by_username_async(db, username)
+    if not user:
+        return None
+    
+    profile = {field: getattr(user, field) for field in PROFILE_FIELDS}
+    profile_cache.set(username, profile)
+    return profile
+
+async def get_user_id_async(db: AsyncSession, username: str) -> Optional[int]:
+    """`get_user_id` on an async session (same cache)"""
+    user_id = user_id_cache.get(username)
+    if user_id is not None:
+        return user_id
+    
+    user_id = await db.scalar(select(models.User.id).where(models.User.username == username))
+    if user_id is not None:
+        user_id_cache.set(username, user_id)
+    return user_id
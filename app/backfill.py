@@ -0,0 +1,171 @@
+"""
+Recompute stored analyses after the emission factor set changes
+
+Each analysis records the factor set it was computed with
+(`factor_version`, see ipcc_tier1.FACTOR_VERSION). When the factors in
+ipcc_tier1 change, `backfill` walks the stale rows in id order, in chunks,
+and recomputes each chunk's Tier 1 results with the vectorized
+`calculate_ipcc_tier1_emissions_batch`: emission factors, emission
+totals, CO2 equivalent and climate region. It writes them back with one
+executemany UPDATE per chunk. The rollup deltas are applied in the same
+transaction, so portfolio totals stay consistent throughout.
+
+A chunk is committed with its new version stamp, so an interrupted run
+simply resumes with the rows still stale. Rows without a reservoir age
+cannot be recomputed and are left alone (they are counted as skipped).
+Monte Carlo uncertainty and sensitivity results are not rerun; they keep
+describing the factors they were drawn from.
+
+Usage:
+    python -m app.backfill [--chunk-size 50000] [--dry-run]
+"""
+
+import argparse
+import sys
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, func, or_, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import ipcc_tier1, models, rollups
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Columns rewritten by the backfill
+_RESULT_COLUMNS = (
+    "climate_region", "ch4_emission_factor", "co2_emission_factor",
+    "total_ch4_emissions", "total_co2_emissions", "co2_equivalent",
+)
+
+
+def _stale(version: str):
+    table = models.ReservoirAnalysis.__table__
+    return or_(table.c.factor_version.is_(None), table.c.factor_version != version)
+
+
+def count_stale(bind: Engine, version: Optional[str] = None) -> Dict[str, int]:
+    """{"stale": rows to recompute, "skipped": stale rows without a reservoir age}"""
+    table = models.ReservoirAnalysis.__table__
+    with bind.connect() as conn:
+        stale, skipped = conn.execute(
+            select(func.count(), func.count().filter(table.c.reservoir_age.is_(None)))
+            .where(_stale(version or ipcc_tier1.FACTOR_VERSION))
+        ).one()
+    return {"stale": stale - skipped, "skipped": skipped}
+
+
+def recompute(rows) -> Dict[str, np.ndarray]:
+    """Tier 1 results for rows of (latitude, surface_area, trophic_status, reservoir_age), as stored columns"""
+    latitude = np.fromiter((row.latitude for row in rows), dtype=float, count=len(rows))
+    area_km2 = np.fromiter((row.surface_area for row in rows), dtype=float, count=len(rows))
+    age = np.fromiter((row.reservoir_age for row in rows), dtype=float, count=len(rows))
+    trophic_status = np.array([row.trophic_status for row in rows], dtype=object)
+
+    # Same steps as the analyze route: areas in ha, totals tCO2eq -> kgCO2eq
+    results = ipcc_tier1.calculate_ipcc_tier1_emissions_batch(area_km2 * 100, latitude, trophic_status, age)
+    ch4_ef, co2_ef, _ = ipcc_tier1.get_emission_factors_batch(results["climate_region"], trophic_status, age)
+    return {
+        "climate_region": results["climate_region"],
+        "ch4_emission_factor": ch4_ef,
+        "co2_emission_factor": co2_ef,
+        "total_ch4_emissions": results["E_CH4"] * 1000,
+        "total_co2_emissions": results["E_CO2"] * 1000,
+        "co2_equivalent": results["E_total"] * 1000,
+    }
+
+
+def backfill(
+    bind: Engine,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    version: Optional[str] = None,
+    progress=sys.stderr
+) -> Dict[str, float]:
+    """
+    Recompute every analysis whose factor version differs from `version`
+
+    Returns:
+        {"rows": rows updated, "skipped": rows without an age, "seconds": ..., "rows_per_second": ...}
+    """
+    version = version or ipcc_tier1.FACTOR_VERSION
+    table = models.ReservoirAnalysis.__table__
+    counts = count_stale(bind, version)
+    total = counts["stale"]
+
+    # Inputs, plus the rollup attributes to move each row's old totals
+    read = select(
+        table.c.id, table.c.latitude, table.c.reservoir_age, *(table.c[name] for name in rollups._TRACKED_ATTRIBUTES)
+    ).where(_stale(version), table.c.reservoir_age.isnot(None)).order_by(table.c.id).limit(chunk_size)
+    write = update(table).where(table.c.id == bindparam("b_id")).values(
+        factor_version=version, **{name: bindparam(f"b_{name}") for name in _RESULT_COLUMNS}
+    )
+
+    done = 0
+    last_id = 0
+    start = time.perf_counter()
+    while True:
+        with Session(bind) as session:
+            conn = session.connection()
+            rows = conn.execute(read.where(table.c.id > last_id)).all()
+            if not rows:
+                break
+            results = recompute(rows)
+            columns = {name: values.tolist() for name, values in results.items()}
+            conn.execute(write, [
+                {"b_id": row.id, **{f"b_{name}": columns[name][i] for name in _RESULT_COLUMNS}}
+                for i, row in enumerate(rows)
+            ])
+
+            before = pd.DataFrame.from_records(rows, columns=list(rows[0]._fields))
+            after = before.assign(**results)
+            rollups.apply_updated(session, before, after)
+            session.commit()
+
+        done += len(rows)
+        last_id = rows[-1].id
+        if progress is not None:
+            elapsed = time.perf_counter() - start
+            rate = done / elapsed if elapsed else 0.0
+            eta = f", ~{(total - done) / rate:,.0f}s left" if rate and total > done else ""
+            of_total = f"/{total:,} ({done / total:.0%})" if total else ""
+            print(f"{done:,}{of_total} analyses recomputed, {rate:,.0f} rows/s{eta}", file=progress, flush=True)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": done,
+        "skipped": counts["skipped"],
+        "seconds": elapsed,
+        "rows_per_second": done / elapsed if elapsed else 0.0,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Recompute stored analyses computed with an older emission factor set")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="only count the stale analyses")
+    args = parser.parse_args(argv)
+
+    from .database import engine
+    from . import migrations
+
+    migrations.upgrade(engine)
+    if args.dry_run:
+        counts = count_stale(engine)
+        print(
+            f"{counts['stale']:,} analyses to recompute for factor version {ipcc_tier1.FACTOR_VERSION} "
+            f"({counts['skipped']:,} without a reservoir age)"
+        )
+        return
+    summary = backfill(engine, args.chunk_size)
+    print(
+        f"✅ Recomputed {summary['rows']:,} analyses with factor version {ipcc_tier1.FACTOR_VERSION} "
+        f"in {summary['seconds']:.1f}s ({summary['rows_per_second']:,.0f} rows/s, "
+        f"{summary['skipped']:,} without a reservoir age skipped)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""
+Offline bulk inventories: `python -m app INPUT --out OUTPUT`
+
+Reads CSV, Parquet or JSONL reservoir files in chunks. Each chunk is
+validated and computed as columns (no per-row pydantic model) in a worker
+process: Tier 1 emissions, optionally Monte Carlo uncertainty. Results are
+written as CSV or Parquet in input order, and progress and throughput are
+reported on stderr as chunks complete.
+
+Input columns use the API field names: latitude, longitude, surface_area
+(km²) and reservoir_age are required. trophic_status, total_phosphorus,
+total_nitrogen, chlorophyll_a and secchi_depth are optional. Any other
+column (an id or name, say) is passed through to the output. Invalid rows
+are left out of the results and reported, with the reason, in `--errors`.
+
+Uncertainty runs are seeded per input row from `--seed` and the row number.
+The results therefore do not depend on the chunk size or the number of
+workers, and a row's statistics equal `UncertaintyAnalysis.run` after
+`np.random.seed([seed, row])`.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .analysis import UncertaintyAnalysis
+from .ipcc_tier1 import (
+    TROPHIC_ADJUSTMENT_FACTORS,
+    assess_trophic_status_batch,
+    calculate_ipcc_tier1_emissions_batch,
+    get_emission_factors_batch,
+)
+
+DEFAULT_CHUNK_SIZE = 5000
+# Reservoirs whose Monte Carlo samples are held in memory at once, per worker
+UNCERTAINTY_BLOCK = 500
+
+REQUIRED_COLUMNS = ("latitude", "longitude", "surface_area", "reservoir_age")
+WATER_QUALITY_COLUMNS = ("total_phosphorus", "total_nitrogen", "chlorophyll_a", "secchi_depth")
+
+# Same names as the analysis export (app.export)
+TIER1_KEYS = (
+    "E_total", "E_CO2", "E_CH4", "E_CH4_age_le_20", "E_CH4_age_gt_20",
+    "annual_CO2", "annual_CH4_age_le_20", "annual_CH4_age_gt_20",
+    "annual_CH4_res_surface_le_20", "annual_CH4_res_surface_gt_20",
+    "annual_CH4_downstream_le_20", "annual_CH4_downstream_gt_20",
+    "EF_CO2_age_le_20", "EF_CH4_age_le_20", "EF_CH4_age_gt_20", "trophic_factor",
+    "F_CO2_tot", "F_CH4_res_age_le_20", "F_CH4_downstream_age_le_20",
+    "F_CH4_res_age_gt_20", "F_CH4_downstream_age_gt_20",
+)
+UNCERTAINTY_OUTPUTS = ("CH4", "CO2", "CO2_equivalent")
+UNCERTAINTY_PERCENTILES = {
+    "ci_lower": 2.5, "ci_upper": 97.5,
+    "percentile_5": 5, "percentile_25": 25, "percentile_50": 50, "percentile_75": 75, "percentile_95": 95,
+}
+
+FORMATS = ("csv", "parquet", "jsonl")
+
+
+def detect_format(path: str, explicit: Optional[str] = None) -> str:
+    if explicit:
+        return explicit
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension in ("ndjson", "json"):
+        return "jsonl"
+    if extension in ("pq", "parq"):
+        return "parquet"
+    if extension not in FORMATS:
+        raise ValueError(f"Cannot tell the format of {path!r}; pass --format")
+    return extension
+
+
+def count_rows(path: str, input_format: str) -> Optional[int]:
+    """Row count when it is cheap to know (Parquet metadata), else None"""
+    if input_format == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    return None
+
+
+def read_chunks(path: str, input_format: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Input rows in DataFrames of at most `chunk_size` rows"""
+    if input_format == "csv":
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    elif input_format == "jsonl":
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size)
+    else:
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+
+def validate(frame: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Columnar validation of one chunk
+
+    Returns the chunk with numeric columns coerced to float, and the error
+    message of every invalid row (empty string for valid rows).
+
+    Raises:
+        ValueError: if a required column is missing
+    """
+    missing = [column for column in REQUIRED_COLUMNS if column not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    frame = frame.copy()
+    errors = pd.Series("", index=frame.index, dtype=object)
+
+    def reject(mask, message):
+        errors[mask] += message + "; "
+
+    for column in REQUIRED_COLUMNS + WATER_QUALITY_COLUMNS:
+        if column not in frame.columns:
+            continue
+        values = pd.to_numeric(frame[column], errors="coerce")
+        reject(frame[column].notna() & values.isna(), f"{column} is not a number")
+        frame[column] = values.astype(float)
+
+    reject(frame["latitude"].isna() | ~frame["latitude"].between(-90, 90), "latitude must be between -90 and 90")
+    reject(frame["longitude"].isna() | ~frame["longitude"].between(-180, 180), "longitude must be between -180 and 180")
+    reject(~(frame["surface_area"] > 0), "surface_area must be > 0")
+    # Tier 1 annualizes lifetime totals by age, so 0 is not usable
+    reject(~(frame["reservoir_age"] > 0), "reservoir_age must be > 0")
+    for column in WATER_QUALITY_COLUMNS:
+        if column in frame.columns:
+            reject(frame[column] < 0, f"{column} must be >= 0")
+    if "trophic_status" in frame.columns:
+        status = frame["trophic_status"]
+        reject(
+            status.notna() & ~status.isin(list(TROPHIC_ADJUSTMENT_FACTORS)),
+            f"trophic_status must be one of {', '.join(TROPHIC_ADJUSTMENT_FACTORS)}"
+        )
+
+    return frame, errors.str.rstrip("; ")
+
+
+def _resolve_trophic_status(frame: pd.DataFrame) -> np.ndarray:
+    """Given status, else assessed from any measured water quality, else None"""
+    status = (
+        frame["trophic_status"].to_numpy(dtype=object) if "trophic_status" in frame.columns
+        else np.full(len(frame), None, dtype=object)
+    )
+    status = np.where(pd.isna(status), None, status)
+
+    measured = [frame[column] if column in frame.columns else None for column in WATER_QUALITY_COLUMNS]
+    present = [values for values in measured if values is not None]
+    if present:
+        has_quality = np.logical_or.reduce([values.notna().to_numpy() for values in present])
+        assessed = assess_trophic_status_batch(
+            *[None if values is None else values.to_numpy() for values in measured]
+        )
+        status = np.where((status == None) & has_quality, assessed, status)  # noqa: E711
+    return status
+
+
+def uncertainty_statistics(
+    rows: np.ndarray,
+    surface_area: np.ndarray,
+    ch4_ef: np.ndarray,
+    co2_ef: np.ndarray,
+    iterations: int,
+    seed: int
+) -> Dict[str, np.ndarray]:
+    """Monte Carlo statistics per row; columns named like the analysis export"""
+    analysis = UncertaintyAnalysis(iterations=iterations)
+    names = [
+        f"uncertainty_{output}_{stat}"
+        for output in UNCERTAINTY_OUTPUTS for stat in ("mean", "std", *UNCERTAINTY_PERCENTILES)
+    ]
+    columns = {name: np.empty(len(rows)) for name in names}
+
+    # Samples are held for UNCERTAINTY_BLOCK rows at a time
+    for start in range(0, len(rows), UNCERTAINTY_BLOCK):
+        block = slice(start, min(start + UNCERTAINTY_BLOCK, len(rows)))
+        samples = {output: np.empty((block.stop - start, iterations)) for output in UNCERTAINTY_OUTPUTS}
+        for i in range(start, block.stop):
+            np.random.seed([seed, int(rows[i])])
+            drawn = analysis._simulate(iterations, surface_area[i], ch4_ef[i], co2_ef[i], 0.0)
+            for output, values in zip(UNCERTAINTY_OUTPUTS, drawn):
+                samples[output][i - start] = values
+
+        for output, values in samples.items():
+            stats = {"mean": values.mean(axis=1), "std": values.std(axis=1)}
+            percentiles = np.percentile(values, list(UNCERTAINTY_PERCENTILES.values()), axis=1)
+            stats.update(zip(UNCERTAINTY_PERCENTILES, percentiles))
+            for stat, values in stats.items():
+                columns[f"uncertainty_{output}_{stat}"][block] = values
+
+    return {
+        name: np.nan_to_num(values, nan=0.0, posinf=0.0, neginf=0.0)
+        for name, values in columns.items()
+    }
+
+
+def process_chunk(
+    frame: pd.DataFrame,
+    first_row: int,
+    uncertainty_iterations: int = 0,
+    seed: int = 0
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Validate and compute one chunk; returns (results, rejected rows)"""
+    frame = frame.reset_index(drop=True)
+    rows = np.arange(first_row, first_row + len(frame))
+    frame, errors = validate(frame)
+
+    invalid = (errors != "").to_numpy()
+    rejected = pd.DataFrame({"row": rows[invalid], "error": errors[invalid].to_numpy()})
+    frame = frame[~invalid].reset_index(drop=True)
+    rows = rows[~invalid]
+
+    trophic_status = _resolve_trophic_status(frame)
+    area = frame["surface_area"].to_numpy()
+    age = frame["reservoir_age"].to_numpy()
+    tier1 = calculate_ipcc_tier1_emissions_batch(
+        surface_area_ha=area * 100,  # km² -> ha
+        latitude=frame["latitude"].to_numpy(),
+        trophic_status=trophic_status,
+        reservoir_age=age
+    )
+    ch4_ef, co2_ef, _ = get_emission_factors_batch(tier1["climate_region"], trophic_status, age)
+
+    results = {
+        "row": rows,
+        **{column: frame[column].to_numpy() for column in frame.columns if column != "trophic_status"},
+        "climate_region": tier1["climate_region"],
+        "trophic_status": trophic_status,
+        "ch4_emission_factor": ch4_ef,
+        "co2_emission_factor": co2_ef,
+        # tCO2eq -> kgCO2eq, as stored by /api/analyze
+        "total_ch4_emissions": tier1["E_CH4"] * 1000,
+        "total_co2_emissions": tier1["E_CO2"] * 1000,
+        "co2_equivalent": tier1["E_total"] * 1000,
+    }
+    results.update({f"tier1_{key}": tier1[key] for key in TIER1_KEYS})
+    if uncertainty_iterations:
+        results.update(uncertainty_statistics(rows, area, ch4_ef, co2_ef, uncertainty_iterations, seed))
+
+    return pd.DataFrame(results), rejected
+
+
+class ResultWriter:
+    """Append DataFrames to one CSV or Parquet file"""
+
+    def __init__(self, path: str, output_format: str):
+        if output_format not in ("csv", "parquet"):
+            raise ValueError("Results are written as csv or parquet")
+        self.path = path
+        self.output_format = output_format
+        self._parquet = None
+        self._schema = None
+        self._started = False
+
+    def write(self, frame: pd.DataFrame) -> None:
+        if self.output_format == "csv":
+            frame.to_csv(self.path, mode="a" if self._started else "w", header=not self._started, index=False)
+            self._started = True
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if self._parquet is None:
+            # All-None columns in the first chunk would otherwise be typed null
+            self._schema = pa.schema([
+                field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                for field in table.schema
+            ])
+            self._parquet = pq.ParquetWriter(self.path, self._schema, compression="snappy")
+        self._parquet.write_table(table.cast(self._schema))
+
+    def close(self) -> None:
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def run(
+    input_path: str,
+    output_path: str,
+    input_format: Optional[str] = None,
+    output_format: Optional[str] = None,
+    errors_path: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: Optional[int] = None,
+    uncertainty_iterations: int = 0,
+    seed: int = 0,
+    progress=sys.stderr
+) -> Dict:
+    """Process `input_path` into `output_path`; returns a summary dict"""
+    input_format = detect_format(input_path, input_format)
+    output_format = detect_format(output_path, output_format)
+    workers = workers or os.cpu_count() or 1
+    total = count_rows(input_path, input_format)
+
+    writer = ResultWriter(output_path, output_format)
+    rejected = []
+    done = valid = 0
+    start = time.perf_counter()
+
+    def report():
+        elapsed = time.perf_counter() - start
+        of_total = f"/{total:,} ({done / total:.0%})" if total else ""
+        print(
+            f"{done:,}{of_total} rows, {done - valid:,} invalid, "
+            f"{done / elapsed if elapsed else 0:,.0f} rows/s",
+            file=progress, flush=True
+        )
+
+    # Chunks are computed out of order but written in input order; at most
+    # two per worker are in flight, so memory stays bounded
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        finished = {}
+        next_to_write = 0
+        chunks = enumerate(read_chunks(input_path, input_format, chunk_size))
+        first_row = 0
+        exhausted = False
+        try:
+            while pending or not exhausted:
+                while not exhausted and len(pending) < 2 * workers:
+                    try:
+                        index, frame = next(chunks)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    future = pool.submit(process_chunk, frame, first_row, uncertainty_iterations, seed)
+                    pending[future] = (index, len(frame))
+                    first_row += len(frame)
+                if not pending:
+                    break
+
+                completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    index, size = pending.pop(future)
+                    finished[index] = (future.result(), size)
+
+                while next_to_write in finished:
+                    (results, bad), size = finished.pop(next_to_write)
+                    if len(results):
+                        writer.write(results)
+                    if len(bad):
+                        rejected.append(bad)
+                    done += size
+                    valid += len(results)
+                    next_to_write += 1
+                    report()
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+        finally:
+            writer.close()
+
+    if errors_path:
+        columns = ["row", "error"]
+        (pd.concat(rejected) if rejected else pd.DataFrame(columns=columns)).to_csv(errors_path, index=False)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": done,
+        "valid": valid,
+        "invalid": done - valid,
+        "seconds": elapsed,
+        "rows_per_second": done / elapsed if elapsed else 0.0,
+        "workers": workers,
+        "errors": pd.concat(rejected) if rejected else None,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app",
+        description="Run Tier 1 (and optionally uncertainty) analyses for a file of reservoirs"
+    )
+    parser.add_argument("input", help="CSV, Parquet or JSONL file of reservoirs")
+    parser.add_argument("--out", required=True, help="results file (.csv or .parquet)")
+    parser.add_argument("--format", choices=FORMATS, help="input format (default: from the extension)")
+    parser.add_argument("--out-format", choices=("csv", "parquet"), help="output format (default: from the extension)")
+    parser.add_argument("--errors", help="write rejected rows and reasons to this CSV")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--uncertainty", action="store_true", help="add Monte Carlo uncertainty statistics")
+    parser.add_argument("--iterations", type=int, default=1000, help="Monte Carlo iterations per reservoir")
+    parser.add_argument("--seed", type=int, default=0, help="base seed; rows are seeded with (seed, row)")
+    args = parser.parse_args(argv)
+
+    try:
+        summary = run(
+            args.input,
+            args.out,
+            input_format=args.format,
+            output_format=args.out_format,
+            errors_path=args.errors,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            uncertainty_iterations=args.iterations if args.uncertainty else 0,
+            seed=args.seed
+        )
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    print(
+        f"✅ {summary['valid']:,} of {summary['rows']:,} reservoirs written to {args.out} "
+        f"in {summary['seconds']:.1f}s ({summary['rows_per_second']:,.0f} rows/s, {summary['workers']} workers)"
+    )
+    if summary["invalid"]:
+        first = summary["errors"].iloc[0]
+        where = f"; see {args.errors}" if args.errors else ""
+        print(f"⚠️  {summary['invalid']:,} invalid rows skipped (first: row {first['row']}: {first['error']}){where}")
+    return 0
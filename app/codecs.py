@@ -0,0 +1,148 @@
+"""
+Compact binary encodings for stored analysis results
+
+Uncertainty and sensitivity results have a fixed shape, so they are packed
+as little-endian float64 arrays behind a one-byte format tag. Anything that
+does not match the expected shape (and free-form payloads such as the raw
+user inputs) falls back to zlib-compressed compact JSON, so no input is
+ever rejected.
+
+Format tags (first byte):
+    0x00  zlib-compressed JSON
+    0x01  uncertainty: output mask byte, then 9 float64 per present output
+    0x02  sensitivity: entry count, then (parameter id, correlation, rank correlation)
+"""
+
+import json
+import struct
+import zlib
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+TAG_JSON = 0
+TAG_UNCERTAINTY = 1
+TAG_SENSITIVITY = 2
+
+UNCERTAINTY_OUTPUTS = ("CH4", "CO2", "CO2_equivalent")
+UNCERTAINTY_STATS = (
+    "mean", "std", "ci_lower", "ci_upper",
+    "percentile_5", "percentile_25", "percentile_50", "percentile_75", "percentile_95",
+)
+SENSITIVITY_PARAMETERS = ("Surface Area", "CH4 Emission Factor", "CO2 Emission Factor")
+SENSITIVITY_STATS = ("correlation", "rank_correlation")
+
+_STATS_STRUCT = struct.Struct("<9d")
+_SENSITIVITY_ENTRY = struct.Struct("<B2d")
+
+
+def encode_json(value: Any) -> bytes:
+    text = json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+    return bytes([TAG_JSON]) + zlib.compress(text.encode("utf-8"), 6)
+
+
+def encode_uncertainty(value: Dict) -> bytes:
+    """Pack an UncertaintyAnalysis result (falls back to JSON for other shapes)"""
+    if not isinstance(value, dict) or set(value) - set(UNCERTAINTY_OUTPUTS):
+        return encode_json(value)
+
+    mask = 0
+    payload = b""
+    for bit, output in enumerate(UNCERTAINTY_OUTPUTS):
+        stats = value.get(output)
+        if stats is None:
+            continue
+        if not isinstance(stats, dict) or set(stats) != set(UNCERTAINTY_STATS):
+            return encode_json(value)
+        mask |= 1 << bit
+        payload += _STATS_STRUCT.pack(*(float(stats[stat]) for stat in UNCERTAINTY_STATS))
+    return bytes([TAG_UNCERTAINTY, mask]) + payload
+
+
+def encode_sensitivity(value: List[Dict]) -> bytes:
+    """Pack a SensitivityAnalysis result (falls back to JSON for other shapes)"""
+    if not isinstance(value, list) or len(value) > 255:
+        return encode_json(value)
+
+    payload = bytes([TAG_SENSITIVITY, len(value)])
+    for entry in value:
+        if (
+            not isinstance(entry, dict)
+            or set(entry) != {"parameter", *SENSITIVITY_STATS}
+            or entry["parameter"] not in SENSITIVITY_PARAMETERS
+        ):
+            return encode_json(value)
+        payload += _SENSITIVITY_ENTRY.pack(
+            SENSITIVITY_PARAMETERS.index(entry["parameter"]),
+            float(entry["correlation"]),
+            float(entry["rank_correlation"]),
+        )
+    return payload
+
+
+def decode(data: Optional[bytes]) -> Any:
+    """Decode any payload produced by the encoders in this module"""
+    if data is None:
+        return None
+    data = bytes(data)
+    tag = data[0]
+
+    if tag == TAG_JSON:
+        return json.loads(zlib.decompress(data[1:]).decode("utf-8"))
+
+    if tag == TAG_UNCERTAINTY:
+        mask = data[1]
+        result = {}
+        offset = 2
+        for bit, output in enumerate(UNCERTAINTY_OUTPUTS):
+            if mask & (1 << bit):
+                values = _STATS_STRUCT.unpack_from(data, offset)
+                offset += _STATS_STRUCT.size
+                result[output] = dict(zip(UNCERTAINTY_STATS, values))
+        return result
+
+    if tag == TAG_SENSITIVITY:
+        count = data[1]
+        result = []
+        for i in range(count):
+            index, correlation, rank_correlation = _SENSITIVITY_ENTRY.unpack_from(
+                data, 2 + i * _SENSITIVITY_ENTRY.size
+            )
+            result.append({
+                "parameter": SENSITIVITY_PARAMETERS[index],
+                "correlation": correlation,
+                "rank_correlation": rank_correlation,
+            })
+        return result
+
+    raise ValueError(f"Unknown packed result tag: {tag}")
+
+
+class _Packed(TypeDecorator):
+    """BLOB column that stores Python values through an encoder above"""
+    impl = LargeBinary
+    cache_ok = True
+    encoder = staticmethod(encode_json)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return self.encoder(value)
+
+    def process_result_value(self, value, dialect):
+        return decode(value)
+
+
+class PackedJSON(_Packed):
+    cache_ok = True  # not inherited by SQLAlchemy
+    encoder = staticmethod(encode_json)
+
+
+class PackedUncertainty(_Packed):
+    cache_ok = True  # not inherited by SQLAlchemy
+    encoder = staticmethod(encode_uncertainty)
+
+
+class PackedSensitivity(_Packed):
+    cache_ok = True  # not inherited by SQLAlchemy
+    encoder = staticmethod(encode_sensitivity)
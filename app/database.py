@@ -1,19 +1,267 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from typing import Optional
+import asyncio
+import importlib.util
+import logging
 import os
 
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/reservoir_emissions.db")
 
+# Async drivers used by the request handlers, by backend of DATABASE_URL
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+# SQLite profile: WAL lets readers proceed during a write and makes commits
+# cheaper; busy_timeout makes concurrent writers wait instead of failing
+# with "database is locked"
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024))),  # negative = KiB
+    "temp_store": "MEMORY",
+}
+
+# Server database (PostgreSQL/MySQL) profile
+SERVER_POOL_SETTINGS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": True,
+}
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.database in (None, "", ":memory:") or "mode=memory" in str(url)
+
+
+def _apply_sqlite_pragmas(engine: Engine, pragmas: dict) -> None:
+    """Run `pragmas` on every new DBAPI connection of `engine`"""
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def build_engine(url: str = DATABASE_URL, **overrides) -> Engine:
+    """
+    Create an engine tuned for the backend named in `url`
+
+    SQLite gets the SQLITE_PRAGMAS profile; any other backend gets a sized
+    connection pool with pre-ping and recycle. `overrides` are passed to
+    `create_engine` (and replace the pool settings for server databases).
+    """
+    parsed = make_url(url)
+
+    if parsed.get_backend_name() == "sqlite":
+        pragmas = dict(SQLITE_PRAGMAS)
+        if _is_memory_sqlite(parsed):
+            # WAL and mmap need a file
+            pragmas.pop("journal_mode")
+            pragmas.pop("mmap_size")
+        connect_args = {
+            "check_same_thread": False,
+            "timeout": pragmas["busy_timeout"] / 1000,
+        }
+        engine = create_engine(url, connect_args=connect_args, **overrides)
+        _apply_sqlite_pragmas(engine, pragmas)
+        return engine
+
+    settings = {**SERVER_POOL_SETTINGS, **overrides}
+    return create_engine(url, **settings)
+
+
+def async_url(url: str = DATABASE_URL) -> str:
+    """`url` with its driver swapped for the backend's asyncio driver"""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(
+            f"No asyncio driver known for {parsed.get_backend_name()!r}; set ASYNC_DATABASE_URL"
+        )
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+def _daemon_aiosqlite(database: str, **connect_args):
+    """
+    `async_creator` for aiosqlite connections whose worker thread is a daemon
+
+    SQLAlchemy marks the aiosqlite connection itself as a daemon thread;
+    since aiosqlite 0.22 the thread is a separate `_thread` attribute, and
+    idle pooled connections would keep the interpreter from exiting.
+    """
+    def connect():
+        import aiosqlite
+
+        connection = aiosqlite.connect(database, **connect_args)
+        getattr(connection, "_thread", connection).daemon = True
+        return connection
+    return connect
+
+
+def build_async_engine(url: str, **overrides) -> AsyncEngine:
+    """
+    Asyncio counterpart of `build_engine`, with the same tuning
+
+    File databases, SQLite included, get the SERVER_POOL_SETTINGS pool, so
+    connections keep their page cache and pragmas across requests. Each
+    aiosqlite connection runs its own thread. In-memory SQLite is not
+    pooled.
+    """
+    parsed = make_url(url)
+
+    if parsed.get_backend_name() == "sqlite":
+        pragmas = dict(SQLITE_PRAGMAS)
+        if _is_memory_sqlite(parsed):
+            pragmas.pop("journal_mode")
+            pragmas.pop("mmap_size")
+        connect_args = {"check_same_thread": False, "timeout": pragmas["busy_timeout"] / 1000}
+        # The aiosqlite dialect defaults to NullPool; ask for a queue pool
+        # unless `overrides` pick one
+        if "poolclass" in overrides:
+            pool = {"connect_args": connect_args}
+        elif _is_memory_sqlite(parsed):
+            pool = {"connect_args": connect_args, "poolclass": NullPool}
+        else:
+            pool = {
+                "async_creator": _daemon_aiosqlite(parsed.database, **connect_args),
+                "poolclass": AsyncAdaptedQueuePool,
+                **SERVER_POOL_SETTINGS,
+            }
+        settings = {**pool, **overrides}
+        async_engine = create_async_engine(url, **settings)
+        _apply_sqlite_pragmas(async_engine.sync_engine, pragmas)
+        return async_engine
+
+    settings = {**SERVER_POOL_SETTINGS, **overrides}
+    return create_async_engine(url, **settings)
+
+
+def resolve_async_url(url: str = DATABASE_URL) -> Optional[str]:
+    """
+    URL for the asyncio engine: ASYNC_DATABASE_URL, else `url` with its
+    backend's asyncio driver; None if that driver is unknown or not installed
+    """
+    configured = os.getenv("ASYNC_DATABASE_URL")
+    if configured:
+        return configured
+    backend = make_url(url).get_backend_name()
+    driver = ASYNC_DRIVERS.get(backend)
+    if driver is None or importlib.util.find_spec(driver) is None:
+        return None
+    return async_url(url)
+
+
+class ThreadedSession:
+    """
+    The subset of AsyncSession the handlers use, over a sync Session whose
+    calls run in the default threadpool
+
+    Used when the backend has no asyncio driver installed: queries still
+    stay off the event loop. Results are buffered in the worker thread.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def add(self, instance) -> None:
+        self.session.add(instance)
+
+    async def execute(self, statement, *args, **kwargs):
+        frozen = await asyncio.to_thread(lambda: self.session.execute(statement, *args, **kwargs).freeze())
+        return frozen()
+
+    async def scalars(self, statement, *args, **kwargs):
+        return (await self.execute(statement, *args, **kwargs)).scalars()
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await asyncio.to_thread(self.session.scalar, statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await asyncio.to_thread(self.session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance) -> None:
+        await asyncio.to_thread(self.session.delete, instance)
+
+    async def commit(self) -> None:
+        await asyncio.to_thread(self.session.commit)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await asyncio.to_thread(fn, self.session, *args, **kwargs)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self.session.close)
+
+
 # Create engine
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+engine = build_engine(DATABASE_URL)
 
 # Create session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for request handlers, on the same database unless
+# ASYNC_DATABASE_URL overrides it. Built on first use, so importing this
+# module never needs an asyncio driver.
+_async_engine: Optional[AsyncEngine] = None
+_async_sessions = None
+# Sessions for ThreadedSession when there is no asyncio driver
+_threaded_sessions = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
+def get_async_engine() -> Optional[AsyncEngine]:
+    """The asyncio engine, or None when no asyncio driver is available"""
+    global _async_engine, _async_sessions
+    if _async_engine is None:
+        url = resolve_async_url(DATABASE_URL)
+        if url is None:
+            return None
+        _async_engine = build_async_engine(url)
+        # Loaded attributes stay readable after commit: an expired one would
+        # need an implicit (blocking) refresh
+        _async_sessions = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+def AsyncSessionLocal():
+    """A new AsyncSession, or a ThreadedSession if there is no asyncio driver"""
+    if get_async_engine() is None:
+        return ThreadedSession(_threaded_sessions())
+    return _async_sessions()
+
+
+async def dispose_async_engine() -> None:
+    """Close pooled async connections, if the async engine was built"""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
+if resolve_async_url(DATABASE_URL) is None:
+    logging.getLogger(__name__).warning(
+        "No asyncio driver installed for %s; request handlers use the sync engine in a threadpool",
+        make_url(DATABASE_URL).get_backend_name()
+    )
+
 # Base class for models
 Base = declarative_base()
 
@@ -24,3 +272,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,229 @@
+"""
+Streaming bulk export of stored analyses to CSV and Parquet
+
+Rows are read through a server-side cursor in fixed-size batches and each
+batch is flattened and encoded before the next is fetched, so memory stays
+constant regardless of table size and the first bytes leave the server
+before the query has finished.
+"""
+
+import io
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from . import archive, models
+from .database import SessionLocal
+from .ipcc_tier1 import FACTOR_VERSION, calculate_ipcc_tier1_emissions
+
+EXPORT_CHUNK_SIZE = 1000
+
+# Stored columns exported as-is
+BASE_COLUMNS = (
+    "id", "created_at", "latitude", "longitude", "climate_region", "trophic_status",
+    "surface_area", "reservoir_age",
+    "total_phosphorus", "total_nitrogen", "chlorophyll_a", "secchi_depth",
+    "ch4_emission_factor", "co2_emission_factor",
+    "total_ch4_emissions", "total_co2_emissions", "co2_equivalent", "factor_version",
+)
+
+# Tier 1 breakdown keys, recomputed from the stored inputs with the current
+# factors (constants omitted). `tier1_recomputed` flags rows whose stored
+# results come from another factor set (see app.backfill), where the two differ.
+TIER1_KEYS = (
+    "E_total", "E_CO2", "E_CH4", "E_CH4_age_le_20", "E_CH4_age_gt_20",
+    "annual_CO2", "annual_CH4_age_le_20", "annual_CH4_age_gt_20",
+    "annual_CH4_res_surface_le_20", "annual_CH4_res_surface_gt_20",
+    "annual_CH4_downstream_le_20", "annual_CH4_downstream_gt_20",
+    "EF_CO2_age_le_20", "EF_CH4_age_le_20", "EF_CH4_age_gt_20", "trophic_factor",
+    "F_CO2_tot", "F_CH4_res_age_le_20", "F_CH4_downstream_age_le_20",
+    "F_CH4_res_age_gt_20", "F_CH4_downstream_age_gt_20",
+)
+
+UNCERTAINTY_OUTPUTS = ("CH4", "CO2", "CO2_equivalent")
+UNCERTAINTY_STATS = (
+    "mean", "std", "ci_lower", "ci_upper",
+    "percentile_5", "percentile_25", "percentile_50", "percentile_75", "percentile_95",
+)
+
+EXPORT_COLUMNS = (
+    list(BASE_COLUMNS)
+    + [f"tier1_{key}" for key in TIER1_KEYS] + ["tier1_recomputed"]
+    + [f"uncertainty_{output}_{stat}" for output in UNCERTAINTY_OUTPUTS for stat in UNCERTAINTY_STATS]
+)
+
+_STRING_COLUMNS = {"climate_region", "trophic_status", "factor_version"}
+
+
+def flatten_analysis(row, uncertainty: Optional[Dict] = None) -> Dict:
+    """
+    Flatten one analysis row into a dict keyed by EXPORT_COLUMNS
+
+    `uncertainty` overrides the row's own results (archived analyses).
+    """
+    record = {column: getattr(row, column) for column in BASE_COLUMNS}
+
+    if row.reservoir_age is not None:
+        tier1 = calculate_ipcc_tier1_emissions(
+            surface_area_ha=row.surface_area * 100,
+            latitude=row.latitude,
+            trophic_status=row.trophic_status,
+            reservoir_age=row.reservoir_age
+        )
+    else:
+        tier1 = {}
+    for key in TIER1_KEYS:
+        record[f"tier1_{key}"] = tier1.get(key)
+    record["tier1_recomputed"] = bool(tier1) and row.factor_version != FACTOR_VERSION
+
+    uncertainty = (uncertainty if uncertainty is not None else row.uncertainty_analysis) or {}
+    for output in UNCERTAINTY_OUTPUTS:
+        stats = uncertainty.get(output) or {}
+        for stat in UNCERTAINTY_STATS:
+            record[f"uncertainty_{output}_{stat}"] = stats.get(stat)
+
+    return record
+
+
+def iter_export_frames(
+    user_id: Optional[int] = None,
+    climate_region: Optional[str] = None,
+    trophic_status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield flattened analyses as DataFrames of at most `chunk_size` rows
+
+    Opens its own session: the generator outlives the request dependency.
+    """
+    table = models.ReservoirAnalysis
+    columns = [getattr(table, column) for column in BASE_COLUMNS] + [table.uncertainty_analysis, table.archived_month]
+
+    db = SessionLocal()
+    try:
+        query = db.query(*columns)
+        if user_id is not None:
+            query = query.filter(table.user_id == user_id)
+        if climate_region:
+            query = query.filter(table.climate_region == climate_region)
+        if trophic_status:
+            query = query.filter(table.trophic_status == trophic_status)
+        if created_after:
+            query = query.filter(table.created_at >= created_after)
+        if created_before:
+            query = query.filter(table.created_at < created_before)
+
+        # yield_per enables stream_results (a server-side cursor where supported)
+        rows = query.order_by(table.id).yield_per(chunk_size)
+
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                yield _to_frame(_flatten_batch(batch))
+                batch = []
+        if batch:
+            yield _to_frame(_flatten_batch(batch))
+    finally:
+        db.close()
+
+
+def _flatten_batch(rows) -> List[Dict]:
+    """Flatten rows, reading archived results once per archive partition"""
+    stubs = [(row.id, row.archived_month) for row in rows if row.archived_month is not None]
+    archived = archive.load_many(stubs) if stubs else {}
+    return [
+        flatten_analysis(row, (archived.get(row.id) or {}).get("uncertainty_analysis"))
+        for row in rows
+    ]
+
+
+def _to_frame(batch: List[Dict]) -> pd.DataFrame:
+    frame = pd.DataFrame.from_records(batch, columns=EXPORT_COLUMNS)
+    frame["created_at"] = pd.to_datetime(frame["created_at"])
+    return frame
+
+
+def stream_csv(frames: Iterator[pd.DataFrame]) -> Iterator[str]:
+    """Encode DataFrame batches as one CSV document, header first"""
+    # Emit the header immediately so the download starts before the first batch
+    yield ",".join(EXPORT_COLUMNS) + "\n"
+    for frame in frames:
+        yield frame.to_csv(index=False, header=False)
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the caller"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    fields = []
+    for column in EXPORT_COLUMNS:
+        if column == "id":
+            fields.append(pa.field(column, pa.int64()))
+        elif column == "created_at":
+            fields.append(pa.field(column, pa.timestamp("us")))
+        elif column in _STRING_COLUMNS:
+            fields.append(pa.field(column, pa.string()))
+        elif column == "tier1_recomputed":
+            fields.append(pa.field(column, pa.bool_()))
+        else:
+            fields.append(pa.field(column, pa.float64()))
+    return pa.schema(fields)
+
+
+def stream_parquet(frames: Iterator[pd.DataFrame]) -> Iterator[bytes]:
+    """
+    Encode DataFrame batches as one Parquet file, one row group per batch
+
+    Raises:
+        ImportError: if pyarrow is not installed
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for frame in frames:
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def parquet_available() -> bool:
+    """Whether the optional pyarrow dependency is installed"""
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,137 @@
+"""
+Inverse questions over the Tier 1 model, solved for arrays of reservoirs
+
+"How large may this reservoir be / how eutrophic may it get / at what age
+does it cross the budget" are answered against the same
+`calculate_ipcc_tier1_emissions_batch` the bulk runner uses, so they agree
+with /api/analyze. Budgets are in the units of `co2_equivalent` in
+analysis results (kg CO2-eq over the reservoir's lifetime, E_total * 1000).
+
+- Surface area: co2_equivalent is proportional to area, so the limit is
+  budget / (co2_equivalent of 1 km²).
+- Trophic state: co2_equivalent is E_CO2 + trophic_factor * (E_CH4 per
+  unit factor), so the limiting factor is closed form too. The answer is
+  the most eutrophic state whose factor stays within it.
+- Age: co2_equivalent grows with age piecewise (the CH4 factor changes at
+  20 years), so all reservoirs are bisected together. Each step is one
+  batch evaluation, about 40 steps to `AGE_TOLERANCE`.
+"""
+
+import math
+from typing import Dict, Tuple
+
+import numpy as np
+
+from . import ipcc_tier1
+
+AGE_TOLERANCE = 1e-9  # years
+
+
+def co2_equivalent(surface_area, latitude, trophic_status, reservoir_age) -> np.ndarray:
+    """co2_equivalent (kg CO2-eq) as /api/analyze reports it, for arrays; area in km²"""
+    results = ipcc_tier1.calculate_ipcc_tier1_emissions_batch(
+        np.asarray(surface_area, dtype=float) * 100, latitude, trophic_status, reservoir_age
+    )
+    return results["E_total"] * 1000
+
+
+def max_surface_area(budget, latitude, trophic_status, reservoir_age) -> np.ndarray:
+    """Largest surface area (km²) whose co2_equivalent stays within `budget`"""
+    per_km2 = co2_equivalent(np.ones(len(latitude)), latitude, trophic_status, reservoir_age)
+    with np.errstate(divide="ignore"):
+        return np.where(per_km2 > 0, np.asarray(budget, dtype=float) / per_km2, np.inf)
+
+
+def max_trophic_status(budget, latitude, surface_area, reservoir_age) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Most eutrophic state within `budget`
+
+    Returns:
+        (trophic status or None when even the least eutrophic exceeds it,
+         largest admissible trophic factor)
+    """
+    size = len(latitude)
+    results = ipcc_tier1.calculate_ipcc_tier1_emissions_batch(
+        np.asarray(surface_area, dtype=float) * 100, latitude, np.full(size, None, dtype=object), reservoir_age
+    )
+    # The unknown-state default factor scales E_CH4; E_CO2 does not depend on it
+    per_factor = results["E_CH4"] * 1000 / results["trophic_factor"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = (np.asarray(budget, dtype=float) - results["E_CO2"] * 1000) / per_factor
+    factor = np.where(per_factor > 0, factor, np.inf)
+
+    status = np.full(size, None, dtype=object)
+    # From least to most eutrophic, so the last admissible state wins
+    for name, state_factor in sorted(ipcc_tier1.TROPHIC_ADJUSTMENT_FACTORS.items(), key=lambda item: item[1]):
+        status[factor >= state_factor] = name
+    return status, factor
+
+
+def crossing_age(
+    budget,
+    latitude,
+    surface_area,
+    trophic_status,
+    max_age: float = 500.0,
+    tolerance: float = AGE_TOLERANCE
+) -> np.ndarray:
+    """
+    Age (years) at which co2_equivalent reaches `budget`; NaN if not within `max_age`
+
+    co2_equivalent is 0 at age 0 and non-decreasing, so [0, max_age]
+    brackets every reachable budget and bisection converges for all
+    reservoirs at once.
+    """
+    budget = np.asarray(budget, dtype=float)
+    size = len(budget)
+    low = np.zeros(size)
+    high = np.full(size, float(max_age))
+    reached = co2_equivalent(surface_area, latitude, trophic_status, high) >= budget
+
+    for _ in range(max(1, math.ceil(math.log2(max_age / tolerance)))):
+        middle = (low + high) / 2
+        above = co2_equivalent(surface_area, latitude, trophic_status, middle) >= budget
+        high = np.where(above, middle, high)
+        low = np.where(above, low, middle)
+    return np.where(reached, high, np.nan)
+
+
+def _column(reservoirs, name: str, solve_for: str) -> np.ndarray:
+    values = [getattr(reservoir, name) for reservoir in reservoirs]
+    missing = [i for i, value in enumerate(values) if value is None]
+    if missing:
+        raise ValueError(f"solve_for={solve_for} needs {name} for every reservoir (missing at {missing[:10]})")
+    return np.asarray(values, dtype=float)
+
+
+def solve(solve_for: str, reservoirs, max_age: float = 500.0) -> Dict:
+    """Solve `solve_for` for each schemas.InverseReservoir; raises ValueError on missing inputs"""
+    latitude = np.array([reservoir.latitude for reservoir in reservoirs], dtype=float)
+    budget = np.array([reservoir.co2_equivalent_budget for reservoir in reservoirs], dtype=float)
+    trophic_status = np.array([reservoir.trophic_status for reservoir in reservoirs], dtype=object)
+
+    if solve_for == "surface_area":
+        age = _column(reservoirs, "reservoir_age", solve_for)
+        area = max_surface_area(budget, latitude, trophic_status, age)
+        # Unbounded (None) only if the model gives no emissions at all
+        solutions = [
+            {"feasible": True, "surface_area": value if math.isfinite(value) else None}
+            for value in area.tolist()
+        ]
+    elif solve_for == "trophic_status":
+        area = _column(reservoirs, "surface_area", solve_for)
+        age = _column(reservoirs, "reservoir_age", solve_for)
+        status, factor = max_trophic_status(budget, latitude, area, age)
+        solutions = [
+            {"feasible": name is not None, "trophic_status": name,
+             "max_trophic_factor": value if math.isfinite(value) else None}
+            for name, value in zip(status.tolist(), factor.tolist())
+        ]
+    else:
+        area = _column(reservoirs, "surface_area", solve_for)
+        age = crossing_age(budget, latitude, area, trophic_status, max_age)
+        solutions = [
+            {"feasible": not math.isnan(value), "reservoir_age": None if math.isnan(value) else value}
+            for value in age.tolist()
+        ]
+    return {"solve_for": solve_for, "solutions": solutions}
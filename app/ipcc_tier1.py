@@ -4,6 +4,8 @@ IPCC Tier 1 Methodology for Reservoir Greenhouse Gas Emissions
 """
 
 import numpy as np
+import hashlib
+import json
 import math
 from typing import Tuple, Optional, Dict
 
@@ -62,6 +64,26 @@ TROPHIC_ADJUSTMENT_FACTORS = {
     "Hypereutrophic": 25,   # 超富营养型
 }
 
+def factor_fingerprint() -> str:
+    """
+    排放因子与常量的版本号（内容哈希）
+    
+    每条分析记录保存计算时的版本号；修改上面任何因子或常量都会得到新版本号，
+    `python -m app.backfill` 据此重算过期的记录。
+    """
+    factor_set = {
+        "EMISSION_FACTORS": EMISSION_FACTORS,
+        "TROPHIC_ADJUSTMENT_FACTORS": TROPHIC_ADJUSTMENT_FACTORS,
+        "M_CO2": M_CO2,
+        "M_C": M_C,
+        "R_d_i": R_d_i,
+        "GWP_100yr_CH4": GWP_100yr_CH4,
+    }
+    encoded = json.dumps(factor_set, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:12]
+
+FACTOR_VERSION = factor_fingerprint()
+
 def clean_numeric_value(value):
     """
     清理数值，确保JSON兼容
@@ -331,6 +353,165 @@ def calculate_ipcc_tier1_emissions(
         "GWP_100yr_CH4": GWP_100yr_CH4,  # CH4全球变暖潜势
     }
 
+# 批量（向量化）版本：与上面的逐条函数结果一致，用于离线批处理
+def get_climate_region_batch(latitude) -> np.ndarray:
+    """`get_climate_region` for an array of latitudes"""
+    abs_lat = np.abs(np.asarray(latitude, dtype=float))
+    return np.where(
+        abs_lat <= 25, "炎热潮湿区", np.where(abs_lat <= 50, "温暖湿润区", "其他区域")
+    ).astype(object)
+
+def assess_trophic_status_batch(
+    total_phosphorus=None,
+    total_nitrogen=None,
+    chlorophyll_a=None,
+    secchi_depth=None
+) -> np.ndarray:
+    """
+    `assess_trophic_status` for arrays of water quality values
+
+    NaN (or a missing array) means the parameter was not measured.
+    """
+    arrays = [
+        None if values is None else np.asarray(values, dtype=float)
+        for values in (total_phosphorus, total_nitrogen, chlorophyll_a, secchi_depth)
+    ]
+    size = max((len(values) for values in arrays if values is not None), default=0)
+    total = np.zeros(size)
+    count = np.zeros(size)
+    
+    def add(values, scores):
+        measured = ~np.isnan(values)
+        total[measured] += scores[measured]
+        count[measured] += 1
+    
+    tp, tn, chla, sd = arrays
+    if tp is not None:
+        add(tp, np.digitize(tp * 1000, [10, 30, 100]) + 1)  # μg/L
+    if tn is not None:
+        add(tn, np.digitize(tn * 1000, [350, 650, 1200]) + 1)  # μg/L
+    if chla is not None:
+        add(chla, np.digitize(chla, [2.5, 8, 25]) + 1)
+    if sd is not None:
+        add(sd, 4 - np.digitize(sd, [1, 2, 4], right=True))
+    
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_score = total / count
+    status = np.select(
+        [count == 0, avg_score < 1.5, avg_score < 2.5, avg_score < 3.5],
+        ["Mesotrophic", "Oligotrophic", "Mesotrophic", "Eutrophic"],
+        "Hypereutrophic"
+    )
+    return status.astype(object)
+
+def _trophic_factors(trophic_status, size: int) -> np.ndarray:
+    factors = np.full(size, 3.0)  # 未知营养状态按中营养型
+    if trophic_status is not None:
+        trophic_status = np.asarray(trophic_status, dtype=object)
+        for name, factor in TROPHIC_ADJUSTMENT_FACTORS.items():
+            factors[trophic_status == name] = factor
+    return factors
+
+def _region_factors(climate_region, key: str) -> np.ndarray:
+    climate_region = np.asarray(climate_region, dtype=object)
+    values = np.full(len(climate_region), EMISSION_FACTORS["温暖湿润区"][key])  # 默认温暖湿润区
+    for region, factors in EMISSION_FACTORS.items():
+        values[climate_region == region] = factors[key]
+    return values
+
+def get_emission_factors_batch(
+    climate_region,
+    trophic_status=None,
+    reservoir_age=100
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """`get_emission_factors` for arrays; returns (CH4_EF, CO2_EF, N2O_EF) in kg/km²/yr"""
+    size = len(climate_region)
+    age = np.broadcast_to(np.asarray(reservoir_age, dtype=float), (size,))
+    
+    ch4_ef = np.where(
+        age <= 20,
+        _region_factors(climate_region, "EF_CH4_age_le_20"),
+        _region_factors(climate_region, "EF_CH4_age_gt_20")
+    )
+    ch4_ef = ch4_ef * _trophic_factors(trophic_status, size)
+    co2_ef = _region_factors(climate_region, "EF_CO2_age_le_20") * 100 * (M_CO2 / M_C)
+    ch4_ef = ch4_ef * 100
+    return ch4_ef, co2_ef, np.zeros(size)
+
+def calculate_ipcc_tier1_emissions_batch(
+    surface_area_ha,
+    latitude,
+    trophic_status=None,
+    reservoir_age=100
+) -> Dict[str, np.ndarray]:
+    """
+    `calculate_ipcc_tier1_emissions` for arrays of reservoirs
+
+    Returns the same keys (constants omitted) with one array per key.
+    """
+    area = np.asarray(surface_area_ha, dtype=float)
+    size = len(area)
+    age = np.broadcast_to(np.asarray(reservoir_age, dtype=float), (size,))
+    climate_region = get_climate_region_batch(latitude)
+    
+    ch4_ef, co2_ef, _ = get_emission_factors_batch(climate_region, trophic_status, age)
+    F_CO2_tot = area * (co2_ef / 100)
+    
+    trophic_factor = _trophic_factors(trophic_status, size)
+    ef_ch4_le_20 = _region_factors(climate_region, "EF_CH4_age_le_20")
+    ef_ch4_gt_20 = _region_factors(climate_region, "EF_CH4_age_gt_20")
+    
+    F_CH4_res_age_le_20 = trophic_factor * (ef_ch4_le_20 * area)
+    F_CH4_downstream_age_le_20 = F_CH4_res_age_le_20 * R_d_i
+    F_CH4_res_age_gt_20 = trophic_factor * (ef_ch4_gt_20 * area)
+    F_CH4_downstream_age_gt_20 = F_CH4_res_age_gt_20 * R_d_i
+    
+    older = age > 20
+    with np.errstate(invalid="ignore", divide="ignore"):
+        E_CH4_age_le_20 = ((F_CH4_res_age_le_20 + F_CH4_downstream_age_le_20) *
+                           GWP_100yr_CH4 / 1000) * np.minimum(20, age)
+        E_CH4_age_gt_20 = np.where(
+            older,
+            ((F_CH4_res_age_gt_20 + F_CH4_downstream_age_gt_20) * GWP_100yr_CH4 / 1000) * (age - 20),
+            0.0
+        )
+        E_CO2 = F_CO2_tot * (M_CO2 / M_C) * age
+        E_CH4 = E_CH4_age_le_20 + E_CH4_age_gt_20
+        
+        results = {
+            "E_total": E_CO2 + E_CH4,
+            "E_CO2": E_CO2,
+            "E_CH4": E_CH4,
+            "annual_CO2": F_CO2_tot * (M_CO2 / M_C) * 1000,
+            "annual_CH4_age_le_20": np.where(
+                older, (E_CH4_age_le_20 / 20) * 1000, (E_CH4_age_le_20 / age) * 1000
+            ),
+            "annual_CH4_age_gt_20": np.where(older, (E_CH4_age_gt_20 / (age - 20)) * 1000, 0.0),
+            "annual_CH4_res_surface_le_20": F_CH4_res_age_le_20 * GWP_100yr_CH4,
+            "annual_CH4_res_surface_gt_20": np.where(older, F_CH4_res_age_gt_20 * GWP_100yr_CH4, 0.0),
+            "annual_CH4_downstream_le_20": F_CH4_downstream_age_le_20 * GWP_100yr_CH4,
+            "annual_CH4_downstream_gt_20": np.where(older, F_CH4_downstream_age_gt_20 * GWP_100yr_CH4, 0.0),
+            "reservoir_age": age,
+            "surface_area_ha": area,
+            "EF_CO2_age_le_20": _region_factors(climate_region, "EF_CO2_age_le_20"),
+            "EF_CH4_age_le_20": ef_ch4_le_20,
+            "EF_CH4_age_gt_20": ef_ch4_gt_20,
+            "trophic_factor": trophic_factor,
+            "F_CO2_tot": F_CO2_tot,
+            "F_CH4_res_age_le_20": F_CH4_res_age_le_20,
+            "F_CH4_downstream_age_le_20": F_CH4_downstream_age_le_20,
+            "F_CH4_res_age_gt_20": F_CH4_res_age_gt_20,
+            "F_CH4_downstream_age_gt_20": F_CH4_downstream_age_gt_20,
+            "E_CH4_age_le_20": E_CH4_age_le_20,
+            "E_CH4_age_gt_20": E_CH4_age_gt_20,
+        }
+    
+    # 与 clean_numeric_value 一致：NaN/inf -> 0
+    results = {key: np.nan_to_num(values, nan=0.0, posinf=0.0, neginf=0.0) for key, values in results.items()}
+    results["climate_region"] = climate_region
+    results["trophic_status"] = trophic_status
+    return results
+
 # 保持向后兼容的函数
 def calculate_emissions(
     surface_area: float,
@@ -2,31 +2,37 @@
 Main FastAPI application for Reservoir Emissions Tool
 """
 
-from fastapi import FastAPI, Depends, HTTPException, Request, status
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import FileResponse, HTMLResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+import asyncio
+import json
 import os
 import jwt
 from datetime import datetime, timedelta
 
-from . import models, schemas, auth
-from .database import engine, get_db
+from . import models, schemas, auth, migrations, pagination, rollups, statistics, assets, persistence, metrics, profiling, spatial, nearby, admission, responses, inverse
+from .metrics import stage
+from .database import AsyncSessionLocal, SessionLocal, dispose_async_engine, engine, get_async_db
 from .ipcc_tier1 import (
     get_climate_region,
     assess_trophic_status,
     get_emission_factors,
     calculate_emissions,
     calculate_ipcc_tier1_emissions,
-    clean_numeric_value
+    clean_numeric_value,
+    FACTOR_VERSION
 )
-from .analysis import run_full_analysis
+from .analysis import SensitivityAnalysis, UncertaintyAnalysis, run_full_analysis
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# Schema setup is an explicit step (`python -m app.migrations`), not an
+# import side effect; AUTO_MIGRATE=1 opts back in for development
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "0").lower() in ("1", "true", "yes")
 
 # JWT Configuration (moved to auth.py)
 
@@ -37,8 +43,15 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Admin opt-in profiling (X-Profile: 1); innermost so metrics stay out of profiles
+app.add_middleware(profiling.ProfilingMiddleware)
+
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Security
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # JWT Token verification function
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -51,11 +64,81 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
         )
     return username
 
-# Setup templates
-templates = Jinja2Templates(directory="/app/app/templates")
+async def current_user_id(username: str = Depends(verify_token), db: AsyncSession = Depends(get_async_db)) -> int:
+    """Id of the authenticated user"""
+    user_id = await auth.get_user_id_async(db, username)
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials"
+        )
+    return user_id
+
+async def optional_user_id(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: AsyncSession = Depends(get_async_db)
+) -> Optional[int]:
+    """Id of the authenticated user, or None for anonymous requests"""
+    if credentials is None:
+        return None
+    return await current_user_id(verify_token(credentials), db)
+
+@app.on_event("startup")
+async def auto_migrate():
+    """Create/upgrade the schema at startup when AUTO_MIGRATE is set"""
+    if AUTO_MIGRATE:
+        migrations.upgrade(engine)
+
+
+@app.on_event("startup")
+async def start_persister():
+    """Start the write-behind persister when WRITE_BEHIND is set"""
+    await persistence.start(engine)
+
+
+@app.on_event("shutdown")
+async def stop_persister():
+    """Drain queued analyses before the process exits"""
+    await persistence.stop()
+
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    """Close pooled async connections"""
+    await dispose_async_engine()
+
 
-# Serve static files
-app.mount("/static", StaticFiles(directory="/app/app/static"), name="static")
+_loop_watcher = None
+
+@app.on_event("startup")
+async def start_loop_watcher():
+    """Sample event-loop lag into /metrics"""
+    global _loop_watcher
+    if metrics.METRICS_ENABLED and _loop_watcher is None:
+        _loop_watcher = asyncio.create_task(metrics.watch_event_loop())
+
+
+@app.on_event("shutdown")
+async def stop_loop_watcher():
+    global _loop_watcher
+    if _loop_watcher is not None:
+        _loop_watcher.cancel()
+        _loop_watcher = None
+
+
+@app.on_event("startup")
+async def warm_assets():
+    """Precompress static files and pre-render page shells before serving"""
+    assets.get_store().prerender()
+
+
+# Serve precompressed, fingerprinted static files
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def static_file(path: str, request: Request):
+    response = assets.get_store().static_response(path, request)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return response
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -66,17 +149,41 @@ async def read_root(request: Request):
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request):
     """Serve the main web interface"""
-    return templates.TemplateResponse("index.html", {"request": request})
+    return assets.get_store().page_response("index.html", request)
 
 
-@app.post("/api/analyze", response_model=schemas.AnalysisResponse)
-async def analyze_reservoir(
+async def _with_monitoring(
     reservoir_input: schemas.ReservoirInput,
-    db: Session = Depends(get_db)
-):
-    """
-    Analyze reservoir emissions using IPCC Tier 1 methodology
-    """
+    user_id: Optional[int],
+    db: AsyncSession
+) -> schemas.ReservoirInput:
+    """Fill in water quality from a referenced monitoring record"""
+    # ReservoirInput rejects it together with trophic_status or water_quality
+    if not reservoir_input.monitoring_reservoir_id:
+        return reservoir_input
+    
+    # Deferred import: pandas is only needed once monitoring data is used
+    from . import monitoring
+    
+    # Without a period: the latest year
+    query = monitoring.record_query(
+        reservoir_input.monitoring_reservoir_id, user_id, reservoir_input.monitoring_period,
+        annual_only=reservoir_input.monitoring_period is None
+    )
+    record = await db.scalar(query.limit(1))
+    if record is None:
+        raise HTTPException(status_code=404, detail="Monitoring record not found")
+    
+    return reservoir_input.model_copy(update={
+        "water_quality": schemas.WaterQualityInput(
+            **{parameter: getattr(record, parameter) for parameter in monitoring.PARAMETERS}
+        ),
+        "monitoring_period": record.period,
+    })
+
+
+def _assess(reservoir_input: schemas.ReservoirInput) -> dict:
+    """Climate region, trophic status, Tier 1 totals and emission factors"""
     # Determine climate region
     climate_region = get_climate_region(reservoir_input.latitude)
     
@@ -88,176 +195,680 @@ async def analyze_reservoir(
     elif reservoir_input.water_quality:
         # 通过水质参数自动评估
         wq = reservoir_input.water_quality
-        trophic_status = assess_trophic_status(
-            total_phosphorus=wq.total_phosphorus,
-            total_nitrogen=wq.total_nitrogen,
-            chlorophyll_a=wq.chlorophyll_a,
-            secchi_depth=wq.secchi_depth
-        )
+        with stage("trophic"):
+            trophic_status = assess_trophic_status(
+                total_phosphorus=wq.total_phosphorus,
+                total_nitrogen=wq.total_nitrogen,
+                chlorophyll_a=wq.chlorophyll_a,
+                secchi_depth=wq.secchi_depth
+            )
     
-    # 使用IPCC Tier 1方法计算排放
-    # 转换面积单位：km² -> ha
-    surface_area_ha = reservoir_input.surface_area * 100
-    
-    # 执行IPCC Tier 1计算
-    ipcc_results = calculate_ipcc_tier1_emissions(
-        surface_area_ha=surface_area_ha,
-        latitude=reservoir_input.latitude,
-        trophic_status=trophic_status,
-        reservoir_age=reservoir_input.reservoir_age
-    )
+    with stage("tier1"):
+        # 使用IPCC Tier 1方法计算排放
+        # 转换面积单位：km² -> ha
+        surface_area_ha = reservoir_input.surface_area * 100
+        
+        # 执行IPCC Tier 1计算
+        ipcc_results = calculate_ipcc_tier1_emissions(
+            surface_area_ha=surface_area_ha,
+            latitude=reservoir_input.latitude,
+            trophic_status=trophic_status,
+            reservoir_age=reservoir_input.reservoir_age
+        )
+        
+        # 获取排放因子（用于不确定性分析）
+        ch4_ef, co2_ef, n2o_ef = get_emission_factors(
+            ipcc_results["climate_region"],
+            trophic_status,
+            reservoir_input.reservoir_age
+        )
     
     # 提取主要结果
-    ch4_total = clean_numeric_value(ipcc_results["E_CH4"] * 1000)  # tCO2eq -> kgCO2eq
-    co2_total = clean_numeric_value(ipcc_results["E_CO2"] * 1000)  # tCO2eq -> kgCO2eq
-    n2o_total = 0  # IPCC Tier 1中N2O忽略
-    co2_eq = clean_numeric_value(ipcc_results["E_total"] * 1000)  # tCO2eq -> kgCO2eq
-    
-    # 获取排放因子（用于不确定性分析）
-    ch4_ef, co2_ef, n2o_ef = get_emission_factors(
-        ipcc_results["climate_region"],
-        trophic_status,
-        reservoir_input.reservoir_age
-    )
-    
-    # Run uncertainty and sensitivity analysis
-    uncertainty_results, sensitivity_results = run_full_analysis(
-        surface_area=reservoir_input.surface_area,
+    return dict(
+        climate_region=climate_region,
+        trophic_status=trophic_status,
+        ipcc_results=ipcc_results,
+        ch4_total=clean_numeric_value(ipcc_results["E_CH4"] * 1000),  # tCO2eq -> kgCO2eq
+        co2_total=clean_numeric_value(ipcc_results["E_CO2"] * 1000),  # tCO2eq -> kgCO2eq
+        n2o_total=0,  # IPCC Tier 1中N2O忽略
+        co2_eq=clean_numeric_value(ipcc_results["E_total"] * 1000),  # tCO2eq -> kgCO2eq
         ch4_ef=ch4_ef,
         co2_ef=co2_ef,
         n2o_ef=n2o_ef,
-        run_uncertainty=reservoir_input.run_uncertainty,
-        run_sensitivity=reservoir_input.run_sensitivity,
-        iterations=reservoir_input.uncertainty_iterations
     )
-    
-    # Store in database
-    db_analysis = models.ReservoirAnalysis(
+
+
+async def _store_analysis(
+    reservoir_input: schemas.ReservoirInput,
+    assessed: dict,
+    uncertainty_results,
+    sensitivity_results,
+    user_id: Optional[int],
+    db: AsyncSession
+):
+    """Store one analysis; returns (id, created_at)"""
+    wq = reservoir_input.water_quality
+    analysis_values = dict(
         latitude=reservoir_input.latitude,
         longitude=reservoir_input.longitude,
-        climate_region=climate_region,
-        total_phosphorus=reservoir_input.water_quality.total_phosphorus if reservoir_input.water_quality else None,
-        total_nitrogen=reservoir_input.water_quality.total_nitrogen if reservoir_input.water_quality else None,
-        chlorophyll_a=reservoir_input.water_quality.chlorophyll_a if reservoir_input.water_quality else None,
-        secchi_depth=reservoir_input.water_quality.secchi_depth if reservoir_input.water_quality else None,
-        trophic_status=trophic_status,
+        quadkey=spatial.quadkey(reservoir_input.latitude, reservoir_input.longitude),
+        climate_region=assessed["climate_region"],
+        total_phosphorus=wq.total_phosphorus if wq else None,
+        total_nitrogen=wq.total_nitrogen if wq else None,
+        chlorophyll_a=wq.chlorophyll_a if wq else None,
+        secchi_depth=wq.secchi_depth if wq else None,
+        trophic_status=assessed["trophic_status"],
         surface_area=reservoir_input.surface_area,
         reservoir_age=reservoir_input.reservoir_age,
-        ch4_emission_factor=ch4_ef,
-        co2_emission_factor=co2_ef,
-        total_ch4_emissions=ch4_total,
-        total_co2_emissions=co2_total,
-        co2_equivalent=co2_eq,
+        ch4_emission_factor=assessed["ch4_ef"],
+        co2_emission_factor=assessed["co2_ef"],
+        total_ch4_emissions=assessed["ch4_total"],
+        total_co2_emissions=assessed["co2_total"],
+        co2_equivalent=assessed["co2_eq"],
+        factor_version=FACTOR_VERSION,
         uncertainty_analysis=uncertainty_results,
         sensitivity_analysis=sensitivity_results,
-        user_inputs=reservoir_input.dict()
+        user_inputs=reservoir_input.model_dump(),
+        user_id=user_id
     )
     
-    db.add(db_analysis)
-    db.commit()
-    db.refresh(db_analysis)
-    
-    # Prepare response with detailed IPCC Tier 1 results
-    emission_results = schemas.EmissionResults(
-        total_ch4_emissions=ch4_total,
-        total_co2_emissions=co2_total,
-        total_n2o_emissions=n2o_total,
-        co2_equivalent=co2_eq,
-        ch4_emission_factor=ch4_ef,
-        co2_emission_factor=co2_ef,
-        n2o_emission_factor=n2o_ef,
-        climate_region=ipcc_results["climate_region"],
-        trophic_status=trophic_status,
-        # 添加IPCC Tier 1详细结果
-        ipcc_tier1_results=ipcc_results
+    with stage("db"):
+        if persistence.persister is not None:
+            # Write-behind: id assigned now, row committed with the next batch
+            return await persistence.persister.submit(analysis_values)
+        db_analysis = models.ReservoirAnalysis(**analysis_values)
+        db.add(db_analysis)
+        await db.commit()
+        # created_at is filled in before the flush (see app.rollups)
+        return db_analysis.id, db_analysis.created_at
+
+
+def _analysis_response(
+    reservoir_input: schemas.ReservoirInput,
+    assessed: dict,
+    analysis_id: int,
+    created_at: datetime,
+    uncertainty_results,
+    sensitivity_results,
+    degradation: Optional[schemas.Degradation] = None
+) -> dict:
+    """AnalysisResponse payload of a fresh analysis (see app.responses)"""
+    return responses.analysis_payload(
+        analysis_id, created_at,
+        reservoir_input.latitude, reservoir_input.longitude, reservoir_input.surface_area,
+        assessed["climate_region"], assessed["trophic_status"],
+        {
+            "total_ch4_emissions": assessed["ch4_total"],
+            "total_co2_emissions": assessed["co2_total"],
+            "co2_equivalent": assessed["co2_eq"],
+            "ch4_emission_factor": assessed["ch4_ef"],
+            "co2_emission_factor": assessed["co2_ef"],
+            "climate_region": assessed["ipcc_results"]["climate_region"],
+            "trophic_status": assessed["trophic_status"],
+            # 添加IPCC Tier 1详细结果
+            "ipcc_tier1_results": assessed["ipcc_results"],
+        },
+        uncertainty_results, sensitivity_results, degradation
     )
+
+
+def _render_analysis(payload: dict, fields: Optional[str], view: str) -> responses.AnalysisJSONResponse:
+    with stage("serialize"):
+        try:
+            payload = responses.shape(payload, fields, view)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return responses.AnalysisJSONResponse(payload)
+
+
+async def _admit(reservoir_input: schemas.ReservoirInput, request: Request, user_id: Optional[int]):
+    """
+    Pass the request through admission control (see app.admission)
+
+    Returns:
+        (input to run, possibly scaled down; Degradation or None; permit or None)
+    """
+    controller = admission.controller
+    if controller is None:
+        return reservoir_input, None, None
     
-    return schemas.AnalysisResponse(
-        id=db_analysis.id,
-        created_at=db_analysis.created_at,
-        latitude=reservoir_input.latitude,
-        longitude=reservoir_input.longitude,
-        surface_area=reservoir_input.surface_area,
-        climate_region=climate_region,
-        trophic_status=trophic_status,
-        emissions=emission_results,
-        uncertainty=uncertainty_results,
-        sensitivity=sensitivity_results
+    requested = (
+        reservoir_input.run_uncertainty, reservoir_input.run_sensitivity, reservoir_input.uncertainty_iterations
+    )
+    key = f"user:{user_id}" if user_id is not None else f"client:{request.client.host if request.client else ''}"
+    try:
+        plan, permit = await controller.admit(key, requested, reservoir_input.allow_degraded)
+    except admission.Overloaded as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+    if plan == requested:
+        return reservoir_input, None, permit
+    
+    run_uncertainty, run_sensitivity, iterations = plan
+    degradation = schemas.Degradation(
+        reason="overloaded",
+        requested_iterations=requested[2],
+        iterations=iterations if run_uncertainty or run_sensitivity else None,
+        uncertainty_skipped=requested[0] and not run_uncertainty,
+        sensitivity_skipped=requested[1] and not run_sensitivity,
+    )
+    reservoir_input = reservoir_input.model_copy(update={
+        "run_uncertainty": run_uncertainty, "run_sensitivity": run_sensitivity, "uncertainty_iterations": iterations
+    })
+    return reservoir_input, degradation, permit
+
+
+def _run_full_analysis(**kwargs):
+    """run_full_analysis in a worker thread, profiled as its own segment when requested"""
+    with profiling.profile_segment([profiling.current()], "analysis worker"):
+        return run_full_analysis(**kwargs)
+
+
+def _next_chunk(chunks):
+    """Next uncertainty chunk of a streamed analysis, profiled when requested"""
+    with profiling.profile_segment([profiling.current()], "uncertainty chunks"):
+        return next(chunks, None)
+
+
+def _run_sensitivity(*args, iterations: int):
+    """Sensitivity analysis of a streamed analysis, profiled when requested"""
+    with profiling.profile_segment([profiling.current()], "sensitivity worker"):
+        return SensitivityAnalysis(iterations=iterations).run(*args)
+
+
+@app.post("/api/analyze", response_model=schemas.AnalysisResponse, response_class=responses.AnalysisJSONResponse)
+async def analyze_reservoir(
+    reservoir_input: schemas.ReservoirInput,
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated dotted paths to return, e.g. id,emissions.co2_equivalent"),
+    view: str = Query("full", pattern="^(full|compact)$", description="compact: drop nulls, constants and repeated inputs"),
+    user_id: Optional[int] = Depends(optional_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Analyze reservoir emissions using IPCC Tier 1 methodology
+
+    With a bearer token the analysis is owned by that user; anonymous
+    analyses are stored without an owner. `monitoring_reservoir_id` uses a
+    stored monitoring record in place of `water_quality`. Under load the
+    request may wait, be scaled down (`degraded` in the response) or be
+    refused with Retry-After. `fields` and `view` trim the response.
+    """
+    reservoir_input = await _with_monitoring(reservoir_input, user_id, db)
+    assessed = _assess(reservoir_input)
+    reservoir_input, degradation, permit = await _admit(reservoir_input, request, user_id)
+    
+    # Run uncertainty and sensitivity analysis off the event loop
+    try:
+        uncertainty_results, sensitivity_results = await asyncio.to_thread(
+            _run_full_analysis,
+            surface_area=reservoir_input.surface_area,
+            ch4_ef=assessed["ch4_ef"],
+            co2_ef=assessed["co2_ef"],
+            n2o_ef=assessed["n2o_ef"],
+            run_uncertainty=reservoir_input.run_uncertainty,
+            run_sensitivity=reservoir_input.run_sensitivity,
+            iterations=reservoir_input.uncertainty_iterations
+        )
+    finally:
+        if permit is not None:
+            permit.release()
+    
+    # Store in database
+    analysis_id, created_at = await _store_analysis(
+        reservoir_input, assessed, uncertainty_results, sensitivity_results, user_id, db
+    )
+    payload = _analysis_response(
+        reservoir_input, assessed, analysis_id, created_at, uncertainty_results, sensitivity_results, degradation
+    )
+    return _render_analysis(payload, fields, view)
+
+
+def _sse(event: str, data) -> str:
+    """One server-sent event frame"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+
+async def _analysis_events(
+    reservoir_input: schemas.ReservoirInput,
+    user_id: Optional[int],
+    degradation: Optional[schemas.Degradation] = None,
+    permit: Optional[admission.Permit] = None
+):
+    """
+    Progress events for one analysis, then the stored result
+
+    Each Monte Carlo chunk runs in a worker thread between two yields. When
+    the client disconnects the generator is closed at its current yield, so
+    no further chunks run and nothing is stored. The admission permit is
+    released once the computation ends either way.
+    """
+    try:
+        assessed = _assess(reservoir_input)
+        total = reservoir_input.uncertainty_iterations
+        
+        uncertainty_results = None
+        if reservoir_input.run_uncertainty:
+            chunks = UncertaintyAnalysis(iterations=total).iter_chunks(
+                reservoir_input.surface_area, assessed["ch4_ef"], assessed["co2_ef"], assessed["n2o_ef"]
+            )
+            with stage("uncertainty"):
+                while True:
+                    step = await asyncio.to_thread(_next_chunk, chunks)
+                    if step is None:
+                        break
+                    done, uncertainty_results = step
+                    yield _sse("progress", {
+                        "stage": "uncertainty", "done": done, "total": total, "estimate": uncertainty_results
+                    })
+        
+        sensitivity_results = None
+        if reservoir_input.run_sensitivity:
+            yield _sse("progress", {"stage": "sensitivity", "done": 0, "total": 1, "estimate": uncertainty_results})
+            with stage("sensitivity"):
+                sensitivity_results = await asyncio.to_thread(
+                    _run_sensitivity,
+                    reservoir_input.surface_area, assessed["ch4_ef"], assessed["co2_ef"], assessed["n2o_ef"],
+                    iterations=total
+                )
+        if permit is not None:
+            permit.release()
+        
+        async with AsyncSessionLocal() as db:
+            analysis_id, created_at = await _store_analysis(
+                reservoir_input, assessed, uncertainty_results, sensitivity_results, user_id, db
+            )
+        yield _sse("result", _analysis_response(
+            reservoir_input, assessed, analysis_id, created_at, uncertainty_results, sensitivity_results, degradation
+        ))
+    except Exception as exc:
+        yield _sse("error", {"detail": str(exc)})
+    finally:
+        if permit is not None:
+            permit.release()
+
+
+@app.post("/api/analyze/stream")
+async def analyze_reservoir_stream(
+    reservoir_input: schemas.ReservoirInput,
+    request: Request,
+    user_id: Optional[int] = Depends(optional_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Same analysis as /api/analyze, streamed as server-sent events
+
+    `progress` events carry the running uncertainty estimate as Monte Carlo
+    chunks complete; the last event is `result` (the AnalysisResponse) or
+    `error`. Closing the connection cancels the remaining work.
+    """
+    reservoir_input = await _with_monitoring(reservoir_input, user_id, db)
+    reservoir_input, degradation, permit = await _admit(reservoir_input, request, user_id)
+    return StreamingResponse(
+        _analysis_events(reservoir_input, user_id, degradation, permit),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # The generator's finally never runs if the client disconnects before
+        # its first step; the background task runs after a disconnect too
+        background=BackgroundTask(permit.release) if permit is not None else None
     )
 
 
 @app.get("/api/analyses", response_model=List[schemas.AnalysisListItem])
 async def list_analyses(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    climate_region: Optional[str] = None,
+    trophic_status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get list of all analyses
+    Get the caller's analyses, newest first
+
+    Uses keyset pagination: pass the `X-Next-Cursor` response header of one
+    page as `cursor` to fetch the next. Only summary columns are loaded, and
+    the (user_id, created_at, id) index keeps each page O(limit).
     """
-    analyses = db.query(models.ReservoirAnalysis).order_by(
-        models.ReservoirAnalysis.created_at.desc()
-    ).offset(skip).limit(limit).all()
+    query = select(*pagination.SUMMARY_COLUMNS).filter(
+        models.ReservoirAnalysis.user_id == user_id
+    )
+    
+    if climate_region:
+        query = query.filter(models.ReservoirAnalysis.climate_region == climate_region)
+    if trophic_status:
+        query = query.filter(models.ReservoirAnalysis.trophic_status == trophic_status)
+    if created_after:
+        query = query.filter(models.ReservoirAnalysis.created_at >= created_after)
+    if created_before:
+        query = query.filter(models.ReservoirAnalysis.created_at < created_before)
+    
+    try:
+        query = pagination.apply_keyset(query, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Fetch one extra row to learn whether another page exists
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = pagination.encode_cursor(last.created_at, last.id)
+    
+    return rows
+
+
+@app.get("/api/map/cells", response_model=schemas.MapCells)
+async def get_map_cells(
+    south: float = Query(..., ge=-90, le=90),
+    west: float = Query(..., ge=-540, le=540),
+    north: float = Query(..., ge=-90, le=90),
+    east: float = Query(..., ge=-540, le=540),
+    zoom: int = Query(..., ge=0, le=spatial.MAX_ZOOM),
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    The caller's analyses clustered per map cell in a bounding box
+
+    Each cell carries its count, summed CO2-eq (for a heatmap) and centroid
+    (for a cluster marker). Cells come from the tiles covering the box and
+    are read from the (user_id, quadkey) index, so the response grows with
+    the screen area rather than with the number of analyses.
+    """
+    if south > north or west > east:
+        raise HTTPException(status_code=400, detail="Expected south <= north and west <= east")
+    try:
+        cells = await spatial.cells(db, user_id, south, west, north, east, zoom)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"zoom": zoom, "level": min(zoom + spatial.CELL_BITS, spatial.QUADKEY_LEVEL), "cells": cells}
+
+
+@app.get("/api/aggregates", response_model=List[schemas.AggregateGroup])
+async def get_aggregates(
+    group_by: List[str] = Query([]),
+    climate_region: Optional[str] = None,
+    trophic_status: Optional[str] = None,
+    month_from: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    month_to: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    The caller's portfolio totals grouped by climate_region, trophic_status and/or month
+
+    Read from the incrementally maintained rollup table, so cost scales with
+    the number of groups rather than the number of analyses.
+    """
+    try:
+        return await db.run_sync(
+            rollups.summarize,
+            group_by=group_by,
+            climate_region=climate_region,
+            trophic_status=trophic_status,
+            user_id=user_id,
+            month_from=month_from,
+            month_to=month_to
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/statistics", response_model=schemas.StatisticSummary)
+async def get_statistic_summary(
+    output: str = Query(..., description="e.g. CO2_equivalent, CH4, Surface Area"),
+    stat: str = Query(..., description="e.g. mean, ci_upper, rank_correlation"),
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Distribution of one uncertainty/sensitivity statistic across the caller's analyses
+    """
+    return await db.run_sync(statistics.summarize, output, stat, user_id=user_id)
+
+
+@app.post("/api/monitoring/upload", response_model=schemas.MonitoringIngestSummary)
+async def upload_monitoring(
+    file: UploadFile,
+    period: str = Query("annual", pattern="^(annual|seasonal)$"),
+    user_id: int = Depends(current_user_id)
+):
+    """
+    Ingest a water quality monitoring CSV into the caller's records
+
+    One row per sample: reservoir_id, date and any of total_phosphorus,
+    total_nitrogen, chlorophyll_a, secchi_depth. The file is aggregated in
+    chunks off the event loop; records for the reservoirs and periods it
+    contains are replaced.
+    """
+    from . import monitoring
+    
+    def ingest():
+        db = SessionLocal()
+        try:
+            return monitoring.ingest(db, file.file, user_id, period)
+        finally:
+            db.close()
+    
+    try:
+        return await asyncio.to_thread(ingest)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/monitoring/{reservoir_id}", response_model=List[schemas.WaterQualityRecord])
+async def get_monitoring_records(
+    reservoir_id: str,
+    user_id: Optional[int] = Depends(optional_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Stored water quality records of one reservoir, latest period first
+
+    The caller's own records, plus shared ones for periods they have not
+    uploaded themselves.
+    """
+    from . import monitoring
+    
+    records = {}
+    for record in await db.scalars(monitoring.record_query(reservoir_id, user_id)):
+        records.setdefault(record.period, record)
+    if not records:
+        raise HTTPException(status_code=404, detail="Monitoring record not found")
+    return list(records.values())
+
+
+@app.get("/api/export/analyses")
+async def export_analyses(
+    export_format: str = Query("csv", alias="format", pattern="^(csv|parquet)$"),
+    climate_region: Optional[str] = None,
+    trophic_status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    user_id: int = Depends(current_user_id)
+):
+    """
+    Stream the caller's matching analyses as CSV or Parquet
+
+    The Tier 1 breakdown and uncertainty statistics are flattened into
+    columns. Rows are fetched and encoded in batches, so memory use does not
+    grow with the table.
+    """
+    # Deferred import: pandas/pyarrow are only needed by exports
+    from . import export
+    
+    frames = export.iter_export_frames(
+        user_id=user_id,
+        climate_region=climate_region,
+        trophic_status=trophic_status,
+        created_after=created_after,
+        created_before=created_before
+    )
+    
+    if export_format == "parquet":
+        if not export.parquet_available():
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+        body = export.stream_parquet(frames)
+        media_type = "application/vnd.apache.parquet"
+    else:
+        body = export.stream_csv(frames)
+        media_type = "text/csv; charset=utf-8"
     
-    return analyses
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="reservoir_analyses.{export_format}"'}
+    )
+
 
+@app.get("/api/analyses/nearby", response_model=List[schemas.NearbyAnalysis])
+async def get_nearby_analyses(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(2.0, gt=0, le=50),
+    limit: int = Query(5, ge=1, le=50),
+    user_id: Optional[int] = Depends(optional_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Stored analyses within `radius_km` of a point, nearest first
 
-@app.get("/api/analyses/{analysis_id}", response_model=schemas.AnalysisResponse)
-async def get_analysis(analysis_id: int, db: Session = Depends(get_db)):
+    Lets the dashboard offer an existing result before recomputing. Owned
+    analyses are only visible to their owner; anonymous ones to anyone.
+    Searched in the in-memory KD-tree of app.nearby (loaded on first use).
+    """
+    if nearby.index.stale:
+        await asyncio.to_thread(nearby.index.load, engine)
+    matches = nearby.index.query(latitude, longitude, radius_km, user_id, limit)
+    if not matches:
+        return []
+    
+    distances = dict(matches)
+    rows = await db.execute(
+        select(*pagination.SUMMARY_COLUMNS, models.ReservoirAnalysis.trophic_status)
+        .where(models.ReservoirAnalysis.id.in_(distances))
+    )
+    results = [{**row._mapping, "distance_km": distances[row.id]} for row in rows]
+    return sorted(results, key=lambda result: result["distance_km"])
+
+
+@app.get("/api/analyses/{analysis_id}", response_model=schemas.AnalysisResponse, response_class=responses.AnalysisJSONResponse)
+async def get_analysis(
+    analysis_id: int,
+    fields: Optional[str] = Query(None, description="Comma-separated dotted paths to return, e.g. id,emissions.co2_equivalent"),
+    view: str = Query("full", pattern="^(full|compact)$", description="compact: drop nulls, constants and repeated inputs"),
+    user_id: Optional[int] = Depends(optional_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Get specific analysis by ID
+
+    Owned analyses are only visible to their owner; anonymous ones to anyone.
+    `fields` and `view` trim the response as for POST /api/analyze.
     """
-    analysis = db.query(models.ReservoirAnalysis).filter(
-        models.ReservoirAnalysis.id == analysis_id
-    ).first()
+    analysis = await db.get(models.ReservoirAnalysis, analysis_id)
     
-    if not analysis:
+    if not analysis and persistence.persister is not None:
+        # Queued by the write-behind persister but not committed yet
+        pending = persistence.persister.pending.get(analysis_id)
+        if pending is not None:
+            analysis = models.ReservoirAnalysis(**pending)
+    
+    if not analysis or analysis.user_id not in (None, user_id):
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    emission_results = schemas.EmissionResults(
-        total_ch4_emissions=analysis.total_ch4_emissions,
-        total_co2_emissions=analysis.total_co2_emissions,
-        total_n2o_emissions=analysis.total_n2o_emissions,
-        co2_equivalent=analysis.co2_equivalent,
-        ch4_emission_factor=analysis.ch4_emission_factor,
-        co2_emission_factor=analysis.co2_emission_factor,
-        n2o_emission_factor=analysis.n2o_emission_factor,
-        climate_region=analysis.climate_region,
-        trophic_status=analysis.trophic_status
-    )
+    uncertainty, sensitivity = analysis.uncertainty_analysis, analysis.sensitivity_analysis
+    if analysis.archived_month is not None:
+        # Deferred import: pandas/pyarrow are only needed for archived results
+        from . import archive
+        archived = await asyncio.to_thread(archive.load, analysis.id, analysis.archived_month)
+        if archived is not None:
+            uncertainty, sensitivity = archived["uncertainty_analysis"], archived["sensitivity_analysis"]
     
-    return schemas.AnalysisResponse(
-        id=analysis.id,
-        created_at=analysis.created_at,
-        latitude=analysis.latitude,
-        longitude=analysis.longitude,
-        surface_area=analysis.surface_area,
-        climate_region=analysis.climate_region,
-        trophic_status=analysis.trophic_status,
-        emissions=emission_results,
-        uncertainty=analysis.uncertainty_analysis,
-        sensitivity=analysis.sensitivity_analysis
+    payload = responses.analysis_payload(
+        analysis.id, analysis.created_at,
+        analysis.latitude, analysis.longitude, analysis.surface_area,
+        analysis.climate_region, analysis.trophic_status,
+        {
+            "total_ch4_emissions": analysis.total_ch4_emissions,
+            "total_co2_emissions": analysis.total_co2_emissions,
+            "co2_equivalent": analysis.co2_equivalent,
+            "ch4_emission_factor": analysis.ch4_emission_factor,
+            "co2_emission_factor": analysis.co2_emission_factor,
+            "climate_region": analysis.climate_region,
+            "trophic_status": analysis.trophic_status,
+        },
+        uncertainty, sensitivity
     )
+    return _render_analysis(payload, fields, view)
 
 
 @app.delete("/api/analyses/{analysis_id}")
-async def delete_analysis(analysis_id: int, db: Session = Depends(get_db)):
+async def delete_analysis(
+    analysis_id: int,
+    user_id: int = Depends(current_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Delete specific analysis
+    Delete one of the caller's analyses
     """
-    analysis = db.query(models.ReservoirAnalysis).filter(
-        models.ReservoirAnalysis.id == analysis_id
-    ).first()
+    analysis = await db.scalar(select(models.ReservoirAnalysis).filter(
+        models.ReservoirAnalysis.id == analysis_id,
+        models.ReservoirAnalysis.user_id == user_id
+    ))
     
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
-    db.delete(analysis)
-    db.commit()
+    await db.delete(analysis)
+    await db.commit()
     
     return {"message": "Analysis deleted successfully"}
 
 
+@app.get("/api/admin/profiles/{profile_id}")
+async def download_profile(
+    profile_id: str,
+    profile_format: str = Query("txt", alias="format", pattern="^(txt|prof)$"),
+    username: str = Depends(verify_token)
+):
+    """
+    Download a request profile: `txt` report or `prof` pstats dump
+
+    Profiles are recorded for requests an admin sends with `X-Profile: 1`.
+    """
+    if not profiling.is_admin(username):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+    
+    path = profiling.profile_path(profile_id, profile_format)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    if profile_format == "txt":
+        return FileResponse(path, media_type="text/plain; charset=utf-8")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+
+@app.post("/api/solve", response_model=schemas.InverseResponse, response_class=responses.AnalysisJSONResponse)
+async def solve_inverse(request: schemas.InverseRequest):
+    """
+    Solve the Tier 1 model backwards for many reservoirs at once
+
+    `solve_for=surface_area` gives the largest area, `trophic_status` the
+    most eutrophic state, and `reservoir_age` the age at which
+    co2_equivalent reaches each reservoir's `co2_equivalent_budget`.
+    Only the solved field is set in each solution.
+    """
+    try:
+        result = await asyncio.to_thread(inverse.solve, request.solve_for, request.reservoirs, request.max_age)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return responses.AnalysisJSONResponse(result)
+
+
 @app.get("/api/climate-region/{latitude}")
 async def get_climate_info(latitude: float):
     """
@@ -271,42 +882,35 @@ async def get_climate_info(latitude: float):
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     """Serve login page"""
-    return templates.TemplateResponse("login.html", {"request": request})
+    return assets.get_store().page_response("login.html", request)
 
 @app.get("/register", response_class=HTMLResponse)
 async def register_page(request: Request):
     """Serve register page"""
-    return templates.TemplateResponse("register.html", {"request": request})
+    return assets.get_store().page_response("register.html", request)
 
 @app.get("/profile", response_class=HTMLResponse)
 async def profile_page(request: Request):
     """Serve profile page"""
-    return templates.TemplateResponse("profile.html", {"request": request})
+    return assets.get_store().page_response("profile.html", request)
 
 @app.get("/api/user/profile")
-async def get_user_profile(token: str = Depends(verify_token), db: Session = Depends(get_db)):
+async def get_user_profile(token: str = Depends(verify_token), db: AsyncSession = Depends(get_async_db)):
     """Get current user profile"""
-    user = db.query(models.User).filter(models.User.username == token).first()
-    if not user:
+    profile = await auth.get_user_profile_async(db, token)
+    if not profile:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return {
-        "username": user.username,
-        "email": user.email,
-        "first_name": user.first_name,
-        "last_name": user.last_name,
-        "organization": user.organization,
-        "created_at": user.created_at
-    }
+    return profile
 
 @app.put("/api/user/profile")
 async def update_user_profile(
     profile_data: dict,
     token: str = Depends(verify_token),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update current user profile"""
-    user = db.query(models.User).filter(models.User.username == token).first()
+    user = await auth.get_user_by_username_async(db, token)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -318,8 +922,8 @@ async def update_user_profile(
     if "organization" in profile_data:
         user.organization = profile_data["organization"]
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    auth.invalidate_user_profile(user.username)
     
     return {
         "username": user.username,
@@ -333,36 +937,43 @@ async def update_user_profile(
 @app.get("/settings", response_class=HTMLResponse)
 async def settings_page(request: Request):
     """Serve user settings page"""
-    return templates.TemplateResponse("settings.html", {"request": request})
+    return assets.get_store().page_response("settings.html", request)
 
 @app.get("/projects", response_class=HTMLResponse)
 async def projects_page(request: Request):
     """Serve projects page"""
-    return templates.TemplateResponse("my-projects.html", {"request": request})
+    return assets.get_store().page_response("my-projects.html", request)
 
 @app.get("/methodology", response_class=HTMLResponse)
 async def methodology_page(request: Request):
     """Serve methodology page"""
-    return templates.TemplateResponse("methodology.html", {"request": request})
+    return assets.get_store().page_response("methodology.html", request)
 
 @app.get("/help", response_class=HTMLResponse)
 async def help_page(request: Request):
     """Serve help page"""
-    return templates.TemplateResponse("help.html", {"request": request})
+    return assets.get_store().page_response("help.html", request)
 
 @app.get("/results/{analysis_id}", response_class=HTMLResponse)
 async def results_page(request: Request, analysis_id: int):
-    """Serve results page"""
-    return templates.TemplateResponse("results.html", {
-        "request": request, 
-        "analysis_id": analysis_id
-    })
+    """Serve results page (one shared shell for every analysis id)"""
+    return assets.get_store().page_response("results.html", request)
 
 # User Authentication API
+def _auth_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="认证服务繁忙，请稍后重试",
+        headers={"Retry-After": "1"}
+    )
+
 @app.post("/api/auth/login")
-async def login(credentials: schemas.LoginRequest, db: Session = Depends(get_db)):
+async def login(credentials: schemas.LoginRequest, db: AsyncSession = Depends(get_async_db)):
     """User login"""
-    user = auth.authenticate_user(db, credentials.username, credentials.password)
+    try:
+        user = await auth.authenticate_user_async(db, credentials.username, credentials.password)
+    except auth.HashingBusyError:
+        raise _auth_busy()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -373,12 +984,16 @@ async def login(credentials: schemas.LoginRequest, db: Session = Depends(get_db)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/api/auth/register")
-async def register(user_data: schemas.RegisterRequest, db: Session = Depends(get_db)):
+async def register(user_data: schemas.RegisterRequest, db: AsyncSession = Depends(get_async_db)):
     """User registration"""
     try:
-        user = auth.create_user(db, user_data)
+        await auth.check_registration_available_async(db, user_data)
+        hashed_password = await auth.get_password_hash_async(user_data.password)
+        user = await auth.create_user_async(db, user_data, hashed_password=hashed_password)
         access_token = auth.create_access_token(data={"sub": user.username})
         return {"access_token": access_token, "token_type": "bearer"}
+    except auth.HashingBusyError:
+        raise _auth_busy()
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -389,3 +1004,63 @@ async def register(user_data: schemas.RegisterRequest, db: Session = Depends(get
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "version": "1.0.0"}
+
+
+# Metrics
+_CACHES = {
+    "token": auth.token_cache,
+    "profile": auth.profile_cache,
+    "user_id": auth.user_id_cache,
+    "map_tile": spatial.tile_cache,
+}
+
+def _cache_lookups():
+    for name, cache in _CACHES.items():
+        yield (name, "hit"), cache.hits
+        yield (name, "miss"), cache.misses
+
+def _cache_hit_ratio():
+    for name, cache in _CACHES.items():
+        yield (name,), cache.hit_rate
+
+def _admission_state():
+    controller = admission.controller
+    yield ("in_flight_samples",), controller.in_flight if controller is not None else 0
+    yield ("queued_requests",), controller.queue_depth if controller is not None else 0
+
+def _write_behind_queue_depth():
+    persister = persistence.persister
+    yield (), persister.queue_depth if persister is not None else 0
+
+def _write_behind_dropped():
+    persister = persistence.persister
+    yield (), persister.rows_dropped if persister is not None else 0
+
+metrics.register_gauge(
+    "reservoir_cache_lookups_total", "Cache lookups by cache and result",
+    _cache_lookups, ("cache", "result"), kind="counter"
+)
+metrics.register_gauge("reservoir_cache_hit_ratio", "Hit ratio since start", _cache_hit_ratio, ("cache",))
+metrics.register_gauge(
+    "reservoir_write_behind_queue_depth", "Analyses queued for the next write-behind batch",
+    _write_behind_queue_depth
+)
+metrics.register_gauge(
+    "reservoir_write_behind_dropped_total", "Queued analyses that could not be written, even alone",
+    _write_behind_dropped, kind="counter"
+)
+metrics.register_gauge(
+    "reservoir_auth_hash_pending", "Password hashes running or waiting for a worker",
+    lambda: [((), auth.hash_queue_depth())]
+)
+metrics.register_gauge(
+    "reservoir_admission_load", "Admitted analysis cost in samples and requests waiting for capacity",
+    _admission_state, ("quantity",)
+)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus text exposition of in-process metrics"""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,298 @@
+"""
+Lightweight in-process metrics with a Prometheus text endpoint
+
+Counters and histograms live in this process only, and `/metrics` renders
+them in the Prometheus text format (version 0.0.4). `stage("tier1")` times
+one step of a request. It feeds the stage histogram and the response's
+`Server-Timing` header.
+
+METRICS_ENABLED=0 turns instrumentation off. `stage()` then returns a
+shared no-op context manager, the middleware is not installed and
+`/metrics` answers 404.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+
+# Seconds; covers a cached lookup up to a 10k-iteration Monte Carlo run
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                bucket_labels = _labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class CallbackGauge:
+    """Gauge whose samples are read from a callback at scrape time"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Iterable[Tuple[Sequence[str], float]]],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.callback():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {float(value):g}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        # Re-registering a name replaces it, so reloading a module is harmless
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "reservoir_http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+))
+REQUEST_SECONDS = registry.register(Histogram(
+    "reservoir_http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+))
+STAGE_SECONDS = registry.register(Histogram(
+    "reservoir_stage_duration_seconds", "Time spent in one stage of a request", ("stage",)
+))
+LOOP_LAG_SECONDS = registry.register(Histogram(
+    "reservoir_event_loop_lag_seconds", "How late the event loop ran a timer it was asked to run"
+))
+
+LOOP_LAG_INTERVAL = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.1"))
+
+
+def register_gauge(
+    name: str,
+    documentation: str,
+    callback: Callable[[], Iterable[Tuple[Sequence[str], float]]],
+    labelnames: Sequence[str] = (),
+    kind: str = "gauge",
+) -> None:
+    """Expose values read at scrape time, e.g. a queue depth"""
+    registry.register(CallbackGauge(name, documentation, callback, labelnames, kind))
+
+
+# Stage timings of the request being handled, for the Server-Timing header
+_request_stages: ContextVar[Optional[list]] = ContextVar("request_stages", default=None)
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, self.name)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages.append((self.name, elapsed))
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str):
+    """Context manager timing one named stage of the current request"""
+    if not METRICS_ENABLED:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def server_timing(stages: List[Tuple[str, float]], total: float) -> str:
+    entries = [f"{name};dur={elapsed * 1000:.2f}" for name, elapsed in stages]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+async def watch_event_loop(interval: float = LOOP_LAG_INTERVAL) -> None:
+    """Sample event-loop lag forever: a blocked loop wakes this timer late"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - start - interval))
+
+
+_route_labels: Dict[object, str] = {}
+
+
+def _route_label(scope) -> str:
+    """Route template (not the raw path) so labels stay low-cardinality"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    label = _route_labels.get(endpoint)
+    if label is None:
+        label = "unmatched"
+        for route in getattr(scope.get("app"), "routes", ()):
+            if getattr(route, "endpoint", None) is endpoint:
+                label = route.path
+                break
+        _route_labels[endpoint] = label
+    return label
+
+
+class MetricsMiddleware:
+    """
+    Count and time every HTTP request, and add a Server-Timing header
+
+    Plain ASGI rather than BaseHTTPMiddleware, so streaming responses are
+    passed through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages: list = []
+        token = _request_stages.set(stages)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(stages, time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stages.reset(token)
+            route = _route_label(scope)
+            REQUEST_SECONDS.observe(elapsed, scope["method"], route)
+            REQUESTS.inc(scope["method"], route, str(status_code))
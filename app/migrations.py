@@ -0,0 +1,219 @@
+"""
+Lightweight schema migrations for the Reservoir Emissions Tool
+
+`Base.metadata.create_all` only creates missing tables; it never touches a
+table that already exists. Deployments keep their SQLite file across
+upgrades, so new indexes and nullable columns are added here instead.
+"""
+
+from sqlalchemy import bindparam, delete, inspect, insert, null, or_, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import AddConstraint
+
+from . import models, rollups, spatial, statistics
+
+
+def _add_missing_columns(bind: Engine) -> None:
+    """Add nullable columns that exist on the models but not in the database"""
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=bind.dialect)
+            with bind.begin() as conn:
+                conn.execute(text(
+                    f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'
+                ))
+
+
+def _create_missing_indexes(bind: Engine) -> None:
+    """Create indexes declared on the models that the database lacks"""
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+
+def _create_missing_foreign_keys(bind: Engine) -> None:
+    """
+    Add foreign keys declared on the models to existing tables
+
+    SQLite cannot add a constraint to an existing table; there the key only
+    applies to databases created from scratch.
+    """
+    if bind.dialect.name == "sqlite":
+        return
+
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing = {
+            tuple(fk["constrained_columns"]) for fk in inspector.get_foreign_keys(table.name)
+        }
+        for constraint in table.foreign_key_constraints:
+            if tuple(constraint.column_keys) not in existing:
+                with bind.begin() as conn:
+                    conn.execute(AddConstraint(constraint))
+
+
+def _pack_legacy_results(bind: Engine, batch_size: int = 1000) -> int:
+    """
+    Move results out of the pre-packing JSON columns
+
+    Each batch packs the JSON into the binary columns, fills
+    `analysis_statistics` and nulls the JSON, in one transaction, so an
+    interrupted run resumes where it stopped.
+
+    Returns:
+        Number of analyses converted
+    """
+    table = models.ReservoirAnalysis.__table__
+    legacy = (table.c.uncertainty_analysis, table.c.sensitivity_analysis, table.c.user_inputs)
+    converted = 0
+
+    pack = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(
+            uncertainty_packed=bindparam("b_uncertainty"),
+            sensitivity_packed=bindparam("b_sensitivity"),
+            user_inputs_packed=bindparam("b_user_inputs"),
+            # SQL NULL, not JSON null, so converted rows drop out of the scan
+            uncertainty_analysis=null(),
+            sensitivity_analysis=null(),
+            user_inputs=null(),
+        )
+    )
+
+    while True:
+        with bind.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, *legacy)
+                .where(or_(*(column.isnot(None) for column in legacy)))
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            conn.execute(pack, [
+                {
+                    "b_id": row.id,
+                    "b_uncertainty": row.uncertainty_analysis,
+                    "b_sensitivity": row.sensitivity_analysis,
+                    "b_user_inputs": row.user_inputs,
+                }
+                for row in rows
+            ])
+
+            ids = [row.id for row in rows]
+            stats = models.AnalysisStatistic.__table__
+            conn.execute(delete(stats).where(stats.c.analysis_id.in_(ids)))
+            stat_rows = []
+            for row in rows:
+                stat_rows.extend(statistics.rows_for(row.id, row.uncertainty_analysis, row.sensitivity_analysis))
+            if stat_rows:
+                conn.execute(insert(stats), stat_rows)
+
+            converted += len(rows)
+
+    if converted:
+        # Return the space freed by the JSON text to the filesystem
+        vacuum(bind)
+
+    return converted
+
+
+def vacuum(bind: Engine) -> None:
+    """Rewrite a SQLite file without its free pages (no-op on other databases)"""
+    if bind.dialect.name == "sqlite":
+        with bind.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+
+
+def _fill_quadkeys(bind: Engine, batch_size: int = 1000) -> int:
+    """
+    Compute the map quadkey of analyses stored before it existed
+
+    Batches commit separately, so an interrupted run resumes where it stopped.
+
+    Returns:
+        Number of analyses updated
+    """
+    table = models.ReservoirAnalysis.__table__
+    fill = update(table).where(table.c.id == bindparam("b_id")).values(quadkey=bindparam("b_quadkey"))
+    filled = 0
+
+    while True:
+        with bind.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.latitude, table.c.longitude)
+                .where(table.c.quadkey.is_(None))
+                .order_by(table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            conn.execute(fill, [
+                {"b_id": row.id, "b_quadkey": spatial.quadkey(row.latitude, row.longitude)} for row in rows
+            ])
+            filled += len(rows)
+
+    return filled
+
+
+def _key_rollups(bind: Engine) -> int:
+    """
+    Give rollup rows from before `group_key` existed their key
+
+    Such tables may hold duplicate groups from racing inserts, which every
+    later delta was applied to, so they are rebuilt from the analyses
+    rather than keyed in place.
+
+    Returns:
+        Number of rollup rows written (0 if none lacked a key)
+    """
+    table = models.AnalysisRollup.__table__
+    with bind.connect() as conn:
+        unkeyed = conn.execute(select(table.c.id).where(table.c.group_key.is_(None)).limit(1)).first()
+    if unkeyed is None:
+        return 0
+    with Session(bind) as session:
+        return rollups.rebuild(session)
+
+
+def upgrade(bind: Engine) -> None:
+    """
+    Bring the database schema up to date with the models
+
+    Safe to run repeatedly: every step checks what already exists.
+    """
+    models.Base.metadata.create_all(bind=bind)
+    _add_missing_columns(bind)
+    _create_missing_indexes(bind)
+    _create_missing_foreign_keys(bind)
+    _pack_legacy_results(bind)
+    _fill_quadkeys(bind)
+    _key_rollups(bind)
+
+
+def main() -> None:
+    from .database import engine
+
+    print("🔧 升级数据库结构...")
+    upgrade(engine)
+    print("✅ 数据库结构已是最新")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, JSON, Boolean
+from sqlalchemy import Column, Integer, Float, String, DateTime, JSON, Boolean, Index, ForeignKey
 from datetime import datetime
 from .database import Base
+from .codecs import PackedJSON, PackedSensitivity, PackedUncertainty
 
 class ReservoirAnalysis(Base):
     """Model to store reservoir analysis data"""
@@ -12,6 +13,7 @@ class ReservoirAnalysis(Base):
     # Location data
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
+    quadkey = Column(String(20), nullable=True)  # Web Mercator tile path, see app.spatial
     climate_region = Column(String, nullable=True)
     
     # Water quality parameters
@@ -33,16 +35,38 @@ class ReservoirAnalysis(Base):
     total_ch4_emissions = Column(Float, nullable=True)  # kg CH4/yr
     total_co2_emissions = Column(Float, nullable=True)  # kg CO2/yr
     co2_equivalent = Column(Float, nullable=True)       # kg CO2-eq/yr
+    # Emission factor set the values above were computed with (see
+    # ipcc_tier1.FACTOR_VERSION); NULL for rows stored before versioning
+    factor_version = Column(String(16), nullable=True)
     
-    # Analysis settings
-    uncertainty_analysis = Column(JSON, nullable=True)
-    sensitivity_analysis = Column(JSON, nullable=True)
+    # Analysis results, stored in compact binary form (see app.codecs)
+    uncertainty_analysis = Column("uncertainty_packed", PackedUncertainty, nullable=True)
+    sensitivity_analysis = Column("sensitivity_packed", PackedSensitivity, nullable=True)
     
-    # User inputs (stored as JSON)
-    user_inputs = Column(JSON, nullable=True)
+    # User inputs (zlib-compressed JSON)
+    user_inputs = Column("user_inputs_packed", PackedJSON, nullable=True)
     
-    # User relationship
-    user_id = Column(Integer, nullable=True)  # Will be foreign key to users table
+    # Pre-packing JSON columns; emptied by app.migrations, never written
+    uncertainty_analysis_legacy = Column("uncertainty_analysis", JSON, nullable=True)
+    sensitivity_analysis_legacy = Column("sensitivity_analysis", JSON, nullable=True)
+    user_inputs_legacy = Column("user_inputs", JSON, nullable=True)
+    
+    # Archive partition (YYYY-MM) once the results above moved to Parquet,
+    # leaving this row as a stub (see app.archive)
+    archived_month = Column(String(7), nullable=True)
+    
+    # Owner; NULL for anonymous analyses and rows created before ownership
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    
+    # Keyset pagination indexes: newest-first listing, optionally filtered
+    __table_args__ = (
+        Index("ix_reservoir_analyses_created_at_id", "created_at", "id"),
+        Index("ix_reservoir_analyses_user_created", "user_id", "created_at", "id"),
+        Index("ix_reservoir_analyses_climate_created", "climate_region", "created_at", "id"),
+        Index("ix_reservoir_analyses_trophic_created", "trophic_status", "created_at", "id"),
+        # Map tiles: one index range per owner and tile
+        Index("ix_reservoir_analyses_user_quadkey", "user_id", "quadkey"),
+    )
 
 class User(Base):
     """Model to store user account data"""
@@ -62,3 +86,85 @@ class User(Base):
     
     # User preferences (stored as JSON)
     preferences = Column(JSON, nullable=True)
+
+class AnalysisRollup(Base):
+    """
+    Pre-aggregated analysis totals at (climate region, trophic status, user,
+    month) grain, maintained incrementally by `app.rollups`
+    """
+    __tablename__ = "analysis_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Group key
+    climate_region = Column(String, nullable=True)
+    trophic_status = Column(String, nullable=True)
+    user_id = Column(Integer, nullable=True)
+    month = Column(String(7), nullable=False)  # YYYY-MM of created_at
+    # The four key fields encoded as one string (see rollups.group_key), so
+    # a unique index can treat NULL as a value and deltas can be upserted
+    group_key = Column(String(255), nullable=True)
+    
+    # Running totals
+    analysis_count = Column(Integer, nullable=False, default=0)
+    surface_area_total = Column(Float, nullable=False, default=0.0)      # km²
+    total_ch4_emissions = Column(Float, nullable=False, default=0.0)     # kg CH4/yr
+    total_co2_emissions = Column(Float, nullable=False, default=0.0)     # kg CO2/yr
+    co2_equivalent_total = Column(Float, nullable=False, default=0.0)    # kg CO2-eq/yr
+    
+    __table_args__ = (
+        Index("ix_analysis_rollups_key", "month", "climate_region", "trophic_status", "user_id"),
+        Index("ix_analysis_rollups_user_month", "user_id", "month"),
+        Index("ux_analysis_rollups_group_key", "group_key", unique=True),
+    )
+
+class IdSequence(Base):
+    """
+    Hi/lo id allocator state: processes reserve blocks of ids up front so
+    rows can be given their id before they are written
+    """
+    __tablename__ = "id_sequences"
+    
+    name = Column(String(50), primary_key=True)
+    next_value = Column(Integer, nullable=False)
+
+class AnalysisStatistic(Base):
+    """
+    One queryable result value per row, e.g. (42, "CO2_equivalent", "mean")
+    or (42, "Surface Area", "rank_correlation"), for cross-analysis SQL
+    """
+    __tablename__ = "analysis_statistics"
+    
+    analysis_id = Column(Integer, primary_key=True)
+    output = Column(String(50), primary_key=True)
+    stat = Column(String(50), primary_key=True)
+    value = Column(Float, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_analysis_statistics_output_stat_value", "output", "stat", "value"),
+    )
+
+class WaterQualityAggregate(Base):
+    """
+    Annual or seasonal water quality means of one monitored reservoir,
+    ingested from monitoring time series by `app.monitoring`
+    """
+    __tablename__ = "water_quality_aggregates"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # NULL: shared record
+    reservoir_id = Column(String(100), nullable=False)  # monitoring site / reservoir code
+    period = Column(String(8), nullable=False)          # "2023" or "2023-JJA"
+    
+    sample_count = Column(Integer, nullable=False)
+    total_phosphorus = Column(Float, nullable=True)  # mean, mg/L
+    total_nitrogen = Column(Float, nullable=True)    # mean, mg/L
+    chlorophyll_a = Column(Float, nullable=True)     # mean, μg/L
+    secchi_depth = Column(Float, nullable=True)      # mean, m
+    trophic_status = Column(String, nullable=True)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_water_quality_aggregates_owner_site", "user_id", "reservoir_id", "period"),
+    )
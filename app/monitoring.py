@@ -0,0 +1,218 @@
+"""
+Water quality time-series ingestion
+
+Monitoring programmes sample TP, TN, chlorophyll-a and Secchi depth many
+times a year. `ingest` streams such a CSV in chunks (one row per sample:
+reservoir_id, date and any of the four parameters). It keeps running sums
+and counts per (reservoir, period), so memory grows with the number of
+reservoirs and periods, not with the file. It then stores the mean of
+each parameter and the trophic status derived from those means with the
+`assess_trophic_status` thresholds. All steps are vectorized with
+pandas/NumPy.
+
+Periods are calendar years ("2023") or meteorological seasons
+("2023-JJA"; December counts towards the next year's DJF). Ingesting a file
+replaces the stored records of the (reservoir, period) pairs it contains.
+
+`POST /api/analyze` can then name `monitoring_reservoir_id` (and
+optionally `monitoring_period`) instead of sending water quality values.
+
+Usage:
+    python -m app.monitoring ingest samples.csv [--period annual|seasonal] [--user NAME]
+"""
+
+import argparse
+from datetime import datetime
+from typing import IO, Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, delete, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .ipcc_tier1 import assess_trophic_status_batch
+
+PARAMETERS = ("total_phosphorus", "total_nitrogen", "chlorophyll_a", "secchi_depth")
+GRANULARITIES = ("annual", "seasonal")
+CHUNK_SIZE = 100_000
+
+# Records replaced per executemany round
+_WRITE_BATCH = 10_000
+
+_SEASONS = np.array(["DJF", "DJF", "MAM", "MAM", "MAM", "JJA", "JJA", "JJA", "SON", "SON", "SON", "DJF"])
+
+
+def periods(dates: pd.Series, granularity: str = "annual") -> pd.Series:
+    """Period label of each sample date"""
+    year = dates.dt.year
+    if granularity == "annual":
+        return year.astype(str)
+    month = dates.dt.month
+    year = year + (month == 12)  # December starts the next year's winter
+    return year.astype(str) + "-" + _SEASONS[month.to_numpy() - 1]
+
+
+def aggregate(
+    chunks: Iterable[pd.DataFrame],
+    granularity: str = "annual"
+) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    Mean of each parameter per (reservoir_id, period) over all chunks
+
+    Rows without a reservoir id, a parseable date or any valid measurement
+    are skipped, as are negative or non-numeric values.
+
+    Returns:
+        (one row per reservoir and period, {"samples": used, "skipped": dropped})
+
+    Raises:
+        ValueError: if the reservoir_id/date columns are missing
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+    totals = None
+    samples = skipped = 0
+    for chunk in chunks:
+        missing = [column for column in ("reservoir_id", "date") if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+        values = pd.DataFrame({
+            column: pd.to_numeric(chunk[column], errors="coerce") if column in chunk.columns else np.nan
+            for column in PARAMETERS
+        }, index=chunk.index)
+        values = values.where(values >= 0)
+        dates = pd.to_datetime(chunk["date"], errors="coerce")
+        usable = chunk["reservoir_id"].notna() & dates.notna() & values.notna().any(axis=1)
+
+        skipped += int((~usable).sum())
+        samples += int(usable.sum())
+        if not usable.any():
+            continue
+
+        values = values[usable]
+        keys = [chunk["reservoir_id"][usable].astype(str).rename("reservoir_id"),
+                periods(dates[usable], granularity).rename("period")]
+        grouped = values.groupby(keys)
+        part = pd.concat(
+            [grouped.sum().add_suffix("_sum"), grouped.count().add_suffix("_count"),
+             grouped.size().rename("sample_count")],
+            axis=1
+        )
+        totals = part if totals is None else totals.add(part, fill_value=0)
+
+    stats = {"samples": samples, "skipped": skipped}
+    if totals is None:
+        return pd.DataFrame(columns=["reservoir_id", "period", "sample_count", *PARAMETERS, "trophic_status"]), stats
+
+    records = pd.DataFrame({"sample_count": totals["sample_count"].astype(int)}, index=totals.index)
+    for column in PARAMETERS:
+        counts = totals[f"{column}_count"]
+        records[column] = (totals[f"{column}_sum"] / counts).where(counts > 0)
+    records["trophic_status"] = assess_trophic_status_batch(*(records[column].to_numpy() for column in PARAMETERS))
+    return records.reset_index(), stats
+
+
+def record_query(
+    reservoir_id: str,
+    user_id: Optional[int] = None,
+    period: Optional[str] = None,
+    annual_only: bool = False
+):
+    """
+    SELECT of the records visible to `user_id` for one reservoir, latest first
+
+    Visible means owned by the user or shared (no owner); an owned record
+    sorts before a shared one of the same period. `period` selects one
+    period; `annual_only` drops seasonal records.
+    """
+    table = models.WaterQualityAggregate
+    shared = table.user_id.is_(None)
+    query = select(table).where(
+        table.reservoir_id == reservoir_id,
+        shared if user_id is None else or_(table.user_id == user_id, shared)
+    )
+    if period is not None:
+        query = query.where(table.period == period)
+    if annual_only:
+        query = query.where(func.length(table.period) == 4)  # YYYY, not YYYY-SSS
+    return query.order_by(table.period.desc(), shared)
+
+
+def store(db: Session, records: pd.DataFrame, user_id: Optional[int] = None) -> int:
+    """Replace the owner's stored records for the (reservoir, period) pairs given"""
+    table = models.WaterQualityAggregate
+    owner = table.user_id.is_(None) if user_id is None else table.user_id == user_id
+    # One index seek per pair; a row-value IN list is scanned instead
+    replace = delete(table).where(
+        owner, table.reservoir_id == bindparam("site"), table.period == bindparam("site_period")
+    )
+
+    conn = db.connection()
+    now = datetime.utcnow()
+    for start in range(0, len(records), _WRITE_BATCH):
+        batch = records.iloc[start:start + _WRITE_BATCH]
+        conn.execute(replace, [
+            {"site": site, "site_period": period} for site, period in zip(batch["reservoir_id"], batch["period"])
+        ])
+        columns = {
+            column: batch[column].astype(object).where(batch[column].notna(), None).tolist()
+            for column in batch.columns
+        }
+        conn.execute(insert(table), [
+            {**dict(zip(columns, row)), "user_id": user_id, "updated_at": now} for row in zip(*columns.values())
+        ])
+    db.commit()
+    return len(records)
+
+
+def ingest(
+    db: Session,
+    source: Union[str, IO],
+    user_id: Optional[int] = None,
+    granularity: str = "annual",
+    chunk_size: int = CHUNK_SIZE
+) -> Dict[str, int]:
+    """Stream a monitoring CSV (path or file object) into stored aggregates"""
+    chunks = pd.read_csv(source, chunksize=chunk_size)
+    records, stats = aggregate(chunks, granularity)
+    return {
+        **stats,
+        "reservoirs": int(records["reservoir_id"].nunique()),
+        "records": store(db, records, user_id),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Ingest water quality monitoring time series")
+    parser.add_argument("command", choices=["ingest"])
+    parser.add_argument("path", help="CSV with reservoir_id, date and parameter columns")
+    parser.add_argument("--period", choices=GRANULARITIES, default="annual")
+    parser.add_argument("--user", help="owner username (default: shared records)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    from .database import SessionLocal, engine
+    from . import auth, migrations
+
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        user_id = None
+        if args.user:
+            user_id = auth.get_user_id(db, args.user)
+            if user_id is None:
+                parser.error(f"unknown user {args.user!r}")
+        summary = ingest(db, args.path, user_id, args.period, args.chunk_size)
+        print(
+            f"✅ {summary['samples']:,} samples → {summary['records']:,} {args.period} records "
+            f"for {summary['reservoirs']:,} reservoirs ({summary['skipped']:,} rows skipped)"
+        )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+In-memory nearest-neighbour index over stored analyses
+
+Clicking a few hundred metres away from a reservoir somebody already
+analysed should offer that result instead of recomputing it. Locations
+are kept as unit vectors in a KD-tree (scipy's cKDTree), so a radius
+query is a chord-length ball search: a few tens of microseconds over
+millions of points, with exact great-circle distances and no trouble at
+the poles or the antimeridian.
+
+A KD-tree cannot take inserts, so new analyses go into a small buffer
+that is searched brute force. Once the buffer holds more than
+MERGE_FRACTION of the tree, a background thread builds a new tree from
+both and swaps it in. Deleted ids leave the buffer at once and are
+masked out of the tree until the next merge. The index is loaded from
+the database on first use and reloaded after MAX_AGE_SECONDS, which
+also picks up analyses written by other worker processes.
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models
+
+EARTH_RADIUS_KM = 6371.0088
+MERGE_FRACTION = 0.01
+MIN_BUFFER = 1024
+MAX_AGE_SECONDS = float(os.getenv("NEARBY_INDEX_MAX_AGE_SECONDS", "600"))
+
+# Owner code of anonymous analyses (visible to everyone)
+_SHARED = -1
+
+
+def unit_vectors(latitude, longitude) -> np.ndarray:
+    """(n, 3) points on the unit sphere for degree coordinates"""
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def _chord(distance_km: float) -> float:
+    return 2 * math.sin(min(distance_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def _distance_km(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1.0))
+
+
+def _build(points: np.ndarray):
+    # Deferred import: scipy loads on first use, not at app import
+    from scipy.spatial import cKDTree
+
+    return cKDTree(points, balanced_tree=False, compact_nodes=False)
+
+
+class NearbyIndex:
+    """Radius search over analysis locations, filtered by visibility"""
+
+    def __init__(self, max_age: float = MAX_AGE_SECONDS):
+        self.max_age = max_age
+        self.loaded_at: Optional[float] = None
+        self.merges = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._merging = False
+        self._reset(np.empty(0, dtype=np.int64), np.empty((0, 3)), np.empty(0, dtype=np.int64))
+
+    def _reset(self, ids: np.ndarray, points: np.ndarray, owners: np.ndarray, tree=None) -> None:
+        self._ids, self._points, self._owners, self._tree = ids, points, owners, tree
+        self._buffer: List[Tuple[int, np.ndarray, int]] = []
+        self._buffer_arrays = None
+        self._removed = set()  # ids masked out of the tree
+        self._removed_array = None
+
+    @property
+    def stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.max_age
+
+    def load(self, bind: Engine, batch_size: int = 50_000) -> None:
+        """(Re)build the whole index from the database"""
+        with self._load_lock:
+            if not self.stale:
+                return  # another caller just loaded it
+            table = models.ReservoirAnalysis.__table__
+            started = time.monotonic()
+            chunks = []
+            with bind.connect() as conn:
+                result = conn.execution_options(yield_per=batch_size).execute(
+                    select(table.c.id, table.c.latitude, table.c.longitude, table.c.user_id)
+                )
+                for rows in result.partitions():
+                    chunks.append(np.array(
+                        [(row[0], row[1], row[2], _SHARED if row[3] is None else row[3]) for row in rows]
+                    ).reshape(-1, 4))
+            data = np.concatenate(chunks) if chunks else np.empty((0, 4))
+            ids = data[:, 0].astype(np.int64)
+            points = unit_vectors(data[:, 1], data[:, 2])
+            owners = data[:, 3].astype(np.int64)
+            tree = _build(points) if len(ids) else None
+
+            loaded = set(ids.tolist())
+            with self._lock:
+                # Keep analyses added while the snapshot was read
+                pending = [entry for entry in self._buffer if entry[0] not in loaded]
+                self._reset(ids, points, owners, tree)
+                self._buffer = pending
+                self.loaded_at = started
+
+    def add(self, analysis_id: int, latitude: float, longitude: float, user_id: Optional[int]) -> None:
+        """Index a newly stored analysis (no-op before the first load)"""
+        if self.loaded_at is None:
+            return
+        point = unit_vectors([latitude], [longitude])[0]
+        with self._lock:
+            self._buffer.append((analysis_id, point, _SHARED if user_id is None else user_id))
+            self._buffer_arrays = None
+            merge = self._claim_merge()
+        if merge:
+            threading.Thread(target=self._merge, daemon=True).start()
+
+    def add_rows(self, rows: Iterable[Dict]) -> None:
+        """`add` for analyses written with Core inserts (which skip ORM events)"""
+        for row in rows:
+            self.add(row["id"], row["latitude"], row["longitude"], row.get("user_id"))
+
+    def remove(self, analysis_id: int) -> None:
+        if self.loaded_at is None:
+            return
+        with self._lock:
+            self._removed.add(analysis_id)
+            self._removed_array = None
+            self._buffer = [entry for entry in self._buffer if entry[0] != analysis_id]
+            self._buffer_arrays = None
+            merge = self._claim_merge()
+        if merge:
+            threading.Thread(target=self._merge, daemon=True).start()
+
+    def _claim_merge(self) -> bool:
+        """Whether the caller should start a merge (called under the lock)"""
+        pending = len(self._buffer) + len(self._removed)
+        if self._merging or pending <= max(MIN_BUFFER, MERGE_FRACTION * len(self._ids)):
+            return False
+        self._merging = True
+        return True
+
+    def _merge(self) -> None:
+        """Fold the buffer into a new tree, built outside the lock"""
+        try:
+            with self._lock:
+                buffered = list(self._buffer)
+                removed = set(self._removed)
+                ids, points, owners = self._ids, self._points, self._owners
+            if removed:
+                keep = ~np.isin(ids, np.fromiter(removed, dtype=np.int64, count=len(removed)))
+                ids, points, owners = ids[keep], points[keep], owners[keep]
+            ids = np.concatenate([ids, np.array([entry[0] for entry in buffered], dtype=np.int64)])
+            points = np.concatenate([points, np.array([entry[1] for entry in buffered]).reshape(-1, 3)])
+            owners = np.concatenate([owners, np.array([entry[2] for entry in buffered], dtype=np.int64)])
+            tree = _build(points) if len(ids) else None
+
+            with self._lock:
+                # Entries added during the build stay buffered; ids removed
+                # during it stay masked, now in the new tree
+                merged = {id(entry) for entry in buffered}
+                self._buffer = [entry for entry in self._buffer if id(entry) not in merged]
+                self._buffer_arrays = None
+                self._ids, self._points, self._owners, self._tree = ids, points, owners, tree
+                self._removed -= removed
+                self._removed_array = None
+                self.merges += 1
+        finally:
+            self._merging = False
+
+    def query(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        user_id: Optional[int] = None,
+        limit: int = 10
+    ) -> List[Tuple[int, float]]:
+        """
+        Analyses within `radius_km` visible to `user_id`, nearest first
+
+        Visible means owned by the user or anonymous.
+
+        Returns:
+            [(analysis_id, distance_km), ...]
+        """
+        center = unit_vectors([latitude], [longitude])[0]
+        chord = _chord(radius_km)
+        with self._lock:
+            tree, ids, owners, points = self._tree, self._ids, self._owners, self._points
+            if self._buffer_arrays is None and self._buffer:
+                self._buffer_arrays = (
+                    np.array([entry[0] for entry in self._buffer], dtype=np.int64),
+                    np.array([entry[1] for entry in self._buffer]),
+                    np.array([entry[2] for entry in self._buffer], dtype=np.int64),
+                )
+            buffered = self._buffer_arrays if self._buffer else None
+            if self._removed_array is None:
+                self._removed_array = np.fromiter(self._removed, dtype=np.int64, count=len(self._removed))
+            removed = self._removed_array
+
+        found_ids, found_owners, found_chords = [], [], []
+        if tree is not None:
+            hits = np.asarray(tree.query_ball_point(center, chord), dtype=np.int64)
+            if len(hits) and len(removed):
+                hits = hits[~np.isin(ids[hits], removed)]
+            if len(hits):
+                found_ids.append(ids[hits])
+                found_owners.append(owners[hits])
+                found_chords.append(np.linalg.norm(points[hits] - center, axis=1))
+        if buffered is not None:
+            distances = np.linalg.norm(buffered[1] - center, axis=1)
+            near = distances <= chord
+            found_ids.append(buffered[0][near])
+            found_owners.append(buffered[2][near])
+            found_chords.append(distances[near])
+        if not found_ids:
+            return []
+
+        found_ids = np.concatenate(found_ids)
+        found_owners = np.concatenate(found_owners)
+        found_chords = np.concatenate(found_chords)
+        visible = found_owners == _SHARED
+        if user_id is not None:
+            visible |= found_owners == user_id
+        found_ids, found_chords = found_ids[visible], found_chords[visible]
+
+        order = np.argsort(found_chords, kind="stable")[:limit]
+        return list(zip(found_ids[order].tolist(), _distance_km(found_chords[order]).tolist()))
+
+
+# Process-wide index, loaded on first query
+index = NearbyIndex()
+
+
+def _moved(obj: models.ReservoirAnalysis) -> bool:
+    attrs = obj._sa_instance_state.attrs
+    return any(attrs[attr].history.has_changes() for attr in ("latitude", "longitude", "user_id"))
+
+
+@event.listens_for(Session, "after_flush")
+def _track_analyses(session: Session, flush_context) -> None:
+    """Mirror flushed inserts, moves and deletes of analyses into the index"""
+    for obj in session.new:
+        if isinstance(obj, models.ReservoirAnalysis):
+            index.add(obj.id, obj.latitude, obj.longitude, obj.user_id)
+
+    for obj in session.dirty:
+        if isinstance(obj, models.ReservoirAnalysis) and _moved(obj):
+            index.remove(obj.id)
+            index.add(obj.id, obj.latitude, obj.longitude, obj.user_id)
+
+    for obj in session.deleted:
+        if isinstance(obj, models.ReservoirAnalysis):
+            index.remove(obj.id)
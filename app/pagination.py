@@ -0,0 +1,61 @@
+"""
+Keyset (cursor) pagination helpers
+
+Analyses are listed newest first, ordered by (created_at, id). A cursor is
+the sort key of the last row on the previous page, so the next page is a
+range scan on the composite index instead of an OFFSET that re-reads every
+skipped row.
+"""
+
+import base64
+from datetime import datetime
+from typing import Tuple
+
+from sqlalchemy import tuple_
+
+from . import models
+
+# Columns returned by the analysis list endpoint; the JSON blobs are never loaded
+SUMMARY_COLUMNS = (
+    models.ReservoirAnalysis.id,
+    models.ReservoirAnalysis.created_at,
+    models.ReservoirAnalysis.latitude,
+    models.ReservoirAnalysis.longitude,
+    models.ReservoirAnalysis.surface_area,
+    models.ReservoirAnalysis.climate_region,
+    models.ReservoirAnalysis.co2_equivalent,
+)
+
+
+def encode_cursor(created_at: datetime, analysis_id: int) -> str:
+    """Encode a (created_at, id) sort key as an opaque URL-safe cursor"""
+    raw = f"{created_at.isoformat()}|{analysis_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by `encode_cursor`
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        created_at, analysis_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(analysis_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def apply_keyset(query, cursor: str = None):
+    """Order a ReservoirAnalysis query newest first and seek past `cursor`"""
+    sort_key = tuple_(models.ReservoirAnalysis.created_at, models.ReservoirAnalysis.id)
+    if cursor:
+        created_at, analysis_id = decode_cursor(cursor)
+        query = query.filter(sort_key < tuple_(created_at, analysis_id))
+    return query.order_by(
+        models.ReservoirAnalysis.created_at.desc(),
+        models.ReservoirAnalysis.id.desc()
+    )
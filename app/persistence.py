@@ -0,0 +1,290 @@
+"""
+Group-commit write-behind persistence for analysis results
+
+With WRITE_BEHIND=1, `/api/analyze` no longer commits its own row. The
+analysis gets an id from a hi/lo block allocator, is queued, and a
+background task writes queued rows in one batched insert per transaction
+every WRITE_BEHIND_INTERVAL_MS or every WRITE_BEHIND_MAX_BATCH rows.
+
+Durability (WRITE_BEHIND_DURABILITY):
+  * "group" (default): the request waits until its batch has committed, so
+    a 200 still means the row is on disk; concurrent requests share one
+    commit.
+  * "async": the request returns as soon as the row is queued. Rows still
+    queued are lost if the process dies; on graceful shutdown the queue is
+    drained.
+
+A batch that fails with a transient error (database locked or
+unreachable) stays queued in `pending` and is retried up to
+WRITE_BEHIND_RETRIES times with doubling backoff from
+WRITE_BEHIND_RETRY_MS. If it still fails, or fails for any other reason,
+its rows are written one at a time, so a bad row only fails itself. A
+row that fails on its own is dropped: its request gets the error in
+"group" mode, but in "async" mode the client already has its id, and the
+loss is only logged. This happens to an invalid row, or to every row when
+the database stays unavailable beyond the retry window (about 1.5 s with
+the defaults).
+
+While write-behind is enabled, analysis rows should only be inserted
+through the persister: plain ORM inserts take max(id) + 1 and may collide
+with ids that are reserved but not yet written.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker
+
+from . import models, nearby, profiling, rollups, spatial, statistics
+
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0").lower() in ("1", "true", "yes")
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "500"))
+WRITE_BEHIND_INTERVAL_MS = float(os.getenv("WRITE_BEHIND_INTERVAL_MS", "5"))
+WRITE_BEHIND_DURABILITY = os.getenv("WRITE_BEHIND_DURABILITY", "group")
+ID_BLOCK_SIZE = int(os.getenv("WRITE_BEHIND_ID_BLOCK", "1000"))
+WRITE_BEHIND_RETRIES = int(os.getenv("WRITE_BEHIND_RETRIES", "5"))
+WRITE_BEHIND_RETRY_MS = float(os.getenv("WRITE_BEHIND_RETRY_MS", "50"))
+
+DURABILITY_MODES = ("group", "async")
+
+logger = logging.getLogger(__name__)
+
+
+def _is_transient(error: Exception) -> bool:
+    """Whether retrying the same write may succeed (locks, lost connections, pool exhaustion)"""
+    return isinstance(error, (OperationalError, InterfaceError, PoolTimeoutError)) or bool(
+        getattr(error, "connection_invalidated", False)
+    )
+
+
+class IdAllocator:
+    """
+    Reserve primary keys in blocks (hi/lo)
+
+    Each block reservation is one short transaction on `id_sequences`, so
+    several worker processes can allocate without colliding.
+    """
+
+    def __init__(self, engine: Engine, table=models.ReservoirAnalysis.__table__, block_size: int = ID_BLOCK_SIZE):
+        self.engine = engine
+        self.table = table
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def _reserve_block(self) -> Tuple[int, int]:
+        sequence = models.IdSequence
+        for _ in range(3):
+            with self.engine.begin() as conn:
+                result = conn.execute(
+                    update(sequence)
+                    .where(sequence.name == self.table.name)
+                    .values(next_value=sequence.next_value + self.block_size)
+                )
+                if result.rowcount:
+                    end = conn.execute(
+                        select(sequence.next_value).where(sequence.name == self.table.name)
+                    ).scalar_one()
+                    return end - self.block_size, end
+
+            # First reservation ever: start after the highest existing id
+            try:
+                with self.engine.begin() as conn:
+                    start = (conn.execute(select(func.max(self.table.c.id))).scalar() or 0) + 1
+                    conn.execute(insert(sequence).values(
+                        name=self.table.name, next_value=start + self.block_size
+                    ))
+                    return start, start + self.block_size
+            except IntegrityError:
+                continue  # another process initialised it first; retry the update
+        raise RuntimeError(f"Could not reserve ids for {self.table.name}")
+
+    def next_id(self) -> int:
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = self._reserve_block()
+            value = self._next
+            self._next += 1
+            return value
+
+
+class WriteBehindPersister:
+    """Queue analysis rows and write them in batches from a background task"""
+
+    def __init__(
+        self,
+        engine: Engine,
+        max_batch: int = WRITE_BEHIND_MAX_BATCH,
+        interval_ms: float = WRITE_BEHIND_INTERVAL_MS,
+        durability: str = WRITE_BEHIND_DURABILITY,
+        retries: int = WRITE_BEHIND_RETRIES,
+        retry_ms: float = WRITE_BEHIND_RETRY_MS,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}")
+        self.engine = engine
+        self.max_batch = max_batch
+        self.interval = interval_ms / 1000
+        self.durability = durability
+        self.retries = retries
+        self.retry_delay = retry_ms / 1000
+        self.ids = IdAllocator(engine)
+        self.pending: Dict[int, Dict] = {}  # id -> row, until committed
+        self.batches_written = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self._Session = sessionmaker(bind=engine)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush everything still queued, then stop the background task"""
+        if self._task is None:
+            return
+        await self._queue.put(None)  # sentinel: drain and exit
+        await self._task
+        self._task = None
+
+    async def submit(self, values: Dict) -> Tuple[int, datetime]:
+        """
+        Assign an id and queue a ReservoirAnalysis row
+
+        Returns:
+            (id, created_at) of the queued row
+        """
+        if self._task is None:
+            raise RuntimeError("Write-behind persister is not running")
+
+        row = dict(values)
+        if row.get("id") is None:
+            row["id"] = await asyncio.to_thread(self.ids.next_id)
+        row.setdefault("created_at", datetime.utcnow())
+        self.pending[row["id"]] = row
+
+        done = asyncio.get_running_loop().create_future() if self.durability == "group" else None
+        await self._queue.put((row, done, profiling.current()))
+        if done is not None:
+            await done
+        return row["id"], row["created_at"]
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = []
+            first = await self._queue.get()
+            if first is None:
+                stopping = True
+            else:
+                batch.append(first)
+                if self._queue.qsize() < self.max_batch - 1:
+                    # Let concurrent requests join this commit
+                    await asyncio.sleep(self.interval)
+
+            # Take what has queued up; on shutdown take everything
+            while stopping or len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+
+            for offset in range(0, len(batch), self.max_batch):
+                await self._flush(batch[offset:offset + self.max_batch])
+
+    async def _flush(self, batch: List) -> None:
+        if not batch:
+            return
+        rows = [row for row, _, _ in batch]
+        profiles = [profile for _, _, profile in batch if profile is not None]
+        for attempt in range(self.retries + 1):
+            try:
+                await asyncio.to_thread(self._write, rows, profiles)
+                break
+            except Exception as e:
+                if not _is_transient(e) or attempt == self.retries:
+                    logger.warning(
+                        "Write-behind flush of %d analyses failed (%s); writing them one by one", len(rows), e
+                    )
+                    await self._flush_rows(batch)
+                    return
+                logger.warning("Write-behind flush of %d analyses failed (%s); retrying", len(rows), e)
+                await asyncio.sleep(self.retry_delay * 2 ** attempt)
+
+        self.batches_written += 1
+        self.rows_written += len(rows)
+        for row, done, _ in batch:
+            self.pending.pop(row["id"], None)
+            if done is not None and not done.done():
+                done.set_result(None)
+
+    async def _flush_rows(self, batch: List) -> None:
+        """Write rows of a failed batch separately; drop only those that fail alone"""
+        for row, done, profile in batch:
+            try:
+                await asyncio.to_thread(self._write, [row], [profile] if profile is not None else [])
+            except Exception as e:
+                logger.exception("Write-behind dropped analysis %s", row["id"])
+                self.rows_dropped += 1
+                self.pending.pop(row["id"], None)
+                if done is not None and not done.done():
+                    done.set_exception(e)
+                continue
+            self.batches_written += 1
+            self.rows_written += 1
+            self.pending.pop(row["id"], None)
+            if done is not None and not done.done():
+                done.set_result(None)
+
+    def _write(self, rows: List[Dict], profiles: Sequence = ()) -> None:
+        """One transaction: batched insert plus matching rollups and statistics"""
+        with profiling.profile_segment(profiles, f"write-behind flush ({len(rows)} rows)"):
+            session = self._Session()
+            try:
+                session.execute(insert(models.ReservoirAnalysis), rows)
+                rollups.apply_inserted(session, rows)
+                statistics.insert_for_rows(session, rows)
+                session.commit()
+                spatial.invalidate_rows(rows)
+                nearby.index.add_rows(rows)
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+
+
+# Process-wide persister, created at startup when WRITE_BEHIND is enabled
+persister: Optional[WriteBehindPersister] = None
+
+
+async def start(engine: Engine) -> None:
+    global persister
+    if WRITE_BEHIND and persister is None:
+        persister = WriteBehindPersister(engine)
+        await persister.start()
+
+
+async def stop() -> None:
+    global persister
+    if persister is not None:
+        await persister.stop()
+        persister = None
@@ -0,0 +1,270 @@
+"""
+Opt-in profiling of single requests
+
+An admin (a username listed in PROFILING_ADMINS) sends `X-Profile: 1` or
+`?profile=1` with a normal, authenticated request. That one request then
+runs under cProfile and tracemalloc. If the request also queues a row on
+the write-behind persister, the batch write that stores it is profiled as
+a separate segment. Requests without the flag, or from non-admins, take
+the normal path untouched.
+
+The profiler is switched on only while the profiled request's coroutine is
+running, so other requests interleaved on the event loop do not show up
+in its profile. tracemalloc is process-wide: while a profiled request
+runs, allocations of concurrent requests are traced (and slowed) too.
+
+Each profile is saved as PROFILE_DIR/<id>.txt (readable report: top
+functions, callees of the hottest ones, allocation growth by line) and
+PROFILE_DIR/<id>.prof (pstats dump for snakeviz etc.). The response carries
+`X-Profile-Id`, and the files are served by GET /api/admin/profiles/{id}.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from starlette.datastructures import MutableHeaders
+
+from . import auth
+
+PROFILING_ADMINS = {
+    name.strip() for name in os.getenv("PROFILING_ADMINS", "").split(",") if name.strip()
+}
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./data/profiles")
+PROFILE_TOP_FUNCTIONS = int(os.getenv("PROFILE_TOP_FUNCTIONS", "30"))
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "1"))
+
+PROFILE_HEADER = b"x-profile"
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+# tracemalloc is shared by all profiled requests in flight
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started_here = False
+
+
+def current() -> Optional["RequestProfile"]:
+    """Profile of the request being handled, if it asked for one"""
+    return _current.get()
+
+
+def is_admin(username: Optional[str]) -> bool:
+    return username is not None and username in PROFILING_ADMINS
+
+
+def profile_path(profile_id: str, extension: str) -> Optional[str]:
+    """Artifact path for `profile_id`, or None for a malformed id"""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    return os.path.join(PROFILE_DIR, f"{profile_id}.{extension}")
+
+
+def _start_tracing() -> None:
+    global _tracing_users, _tracing_started_here
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            _tracing_started_here = True
+        _tracing_users += 1
+
+
+def _stop_tracing() -> None:
+    global _tracing_users, _tracing_started_here
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started_here:
+            tracemalloc.stop()
+            _tracing_started_here = False
+
+
+class RequestProfile:
+    """cProfile segments and an allocation summary for one request"""
+
+    def __init__(self, label: str, username: str):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.username = username
+        self.started_at = datetime.utcnow()
+        self.profiler = cProfile.Profile()
+        self.segments: List[Tuple[str, cProfile.Profile]] = [("request", self.profiler)]
+        self.allocations: List[str] = []
+        self.peak_bytes = 0
+        self.elapsed: Optional[float] = None
+        self._start = 0.0
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        _start_tracing()
+        self._snapshot = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        self._start = time.perf_counter()
+
+    def finish(self) -> None:
+        self.elapsed = time.perf_counter() - self._start
+        try:
+            end = tracemalloc.take_snapshot()
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            self.allocations = [str(stat) for stat in end.compare_to(self._snapshot, "lineno")[:20]]
+        finally:
+            self._snapshot = None
+            _stop_tracing()
+        self.save()
+
+    def add_segment(self, name: str, profiler: cProfile.Profile) -> None:
+        """Attach work profiled elsewhere (e.g. a background thread)"""
+        with self._lock:
+            self.segments.append((name, profiler))
+        if self.elapsed is not None:
+            self.save()  # finished already (async write-behind): rewrite the artifacts
+
+    def report(self) -> str:
+        out = io.StringIO()
+        elapsed = f"{self.elapsed * 1000:.1f} ms" if self.elapsed is not None else "running"
+        out.write(f"Profile {self.id}\n{self.label} by {self.username} at {self.started_at.isoformat()}Z, {elapsed}\n")
+
+        # Segments sharing a name (e.g. one per streamed chunk) are reported together
+        segments: Dict[str, pstats.Stats] = {}
+        with self._lock:
+            for name, profiler in self.segments:
+                if name in segments:
+                    segments[name].add(profiler)
+                else:
+                    segments[name] = pstats.Stats(profiler, stream=out)
+        for name, stats in segments.items():
+            out.write(f"\n== {name}: top functions by cumulative time ==\n")
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+            out.write(f"\n== {name}: call tree (callees of the 10 hottest functions) ==\n")
+            stats.print_callees(10)
+
+        out.write(f"\n== allocations: net growth by line (peak traced {self.peak_bytes / 1024:.0f} KiB) ==\n")
+        out.write("\n".join(self.allocations) + "\n")
+        return out.getvalue()
+
+    def save(self) -> None:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with self._lock:
+            profilers = [profiler for _, profiler in self.segments]
+        combined = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            combined.add(profiler)
+        combined.dump_stats(profile_path(self.id, "prof"))
+        with open(profile_path(self.id, "txt"), "w", encoding="utf-8") as f:
+            f.write(self.report())
+
+
+@contextmanager
+def profile_segment(profiles: Iterable[RequestProfile], name: str):
+    """Profile the enclosed block in this thread and attach it to `profiles`"""
+    profiles = [profile for profile in profiles if profile is not None]
+    if not profiles:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        for profile in profiles:
+            profile.add_segment(name, profiler)
+
+
+class _Profiled:
+    """Drive a coroutine with `profiler` enabled only while it is running"""
+
+    def __init__(self, coro, profiler: cProfile.Profile):
+        self.coro = coro
+        self.profiler = profiler
+
+    def __await__(self):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.send(None)
+
+    def send(self, value):
+        self.profiler.enable()
+        try:
+            return self.coro.send(value)
+        finally:
+            self.profiler.disable()
+
+    def throw(self, *args):
+        self.profiler.enable()
+        try:
+            return self.coro.throw(*args)
+        finally:
+            self.profiler.disable()
+
+    def close(self):
+        self.coro.close()
+
+
+def _requested(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return value.strip() not in (b"", b"0", b"false")
+    query = scope.get("query_string", b"")
+    if b"profile=" in query:
+        values = parse_qs(query.decode("latin-1")).get("profile", [])
+        return any(value not in ("", "0", "false") for value in values)
+    return False
+
+
+def _username(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return auth.verify_token(token.strip())
+    return None
+
+
+class ProfilingMiddleware:
+    """Profile requests flagged by an admin; pass everything else through"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILING_ADMINS or not _requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        username = _username(scope)
+        if not is_admin(username):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(f"{scope['method']} {scope['path']}", username)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Profile-Id", profile.id)
+            await send(message)
+
+        token = _current.set(profile)
+        profile.start()
+        try:
+            await _Profiled(self.app(scope, receive, send_with_profile_id), profile.profiler)
+        finally:
+            _current.reset(token)
+            profile.finish()
@@ -0,0 +1,131 @@
+"""
+Analysis response payloads: sparse fields, compact view, fast JSON
+
+Analysis responses are built as plain dicts in the shape of
+schemas.AnalysisResponse and rendered directly, skipping pydantic
+validation and `jsonable_encoder` (the schema still documents the routes).
+They are encoded with orjson when it is installed and with the standard
+json encoder otherwise.
+
+`fields=` keeps only the listed dotted paths, e.g.
+`id,emissions.co2_equivalent,uncertainty.CO2_equivalent.mean`; a path
+into a list (`sensitivity.parameter`) applies to every item. The
+`view=compact` response drops null fields and the parts of `ipcc_tier1_results`
+that repeat the inputs or are constants (`M_CO2`, `GWP_100yr_CH4`, ...).
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi.responses import JSONResponse
+
+from . import schemas
+
+try:
+    import orjson
+except ImportError:  # optional: the standard encoder still works
+    orjson = None
+
+# ipcc_tier1_results keys left out of the compact view
+COMPACT_OMITTED = frozenset({
+    "M_CO2", "M_C", "R_d_i", "GWP_100yr_CH4",  # constants
+    "climate_region", "trophic_status", "surface_area_ha",  # repeated at the top level
+})
+
+
+class AnalysisJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when available"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+        return orjson.dumps(content)
+
+
+def analysis_payload(
+    analysis_id: int,
+    created_at: datetime,
+    latitude: float,
+    longitude: float,
+    surface_area: float,
+    climate_region: str,
+    trophic_status: Optional[str],
+    emissions: Dict[str, Any],
+    uncertainty: Optional[Dict] = None,
+    sensitivity: Optional[list] = None,
+    degraded: Optional[schemas.Degradation] = None
+) -> Dict[str, Any]:
+    """The AnalysisResponse document as JSON-ready values"""
+    return {
+        "id": analysis_id,
+        "created_at": created_at.isoformat(),
+        "latitude": latitude,
+        "longitude": longitude,
+        "surface_area": surface_area,
+        "climate_region": climate_region,
+        "trophic_status": trophic_status,
+        "emissions": {
+            "total_ch4_emissions": emissions["total_ch4_emissions"],
+            "total_co2_emissions": emissions["total_co2_emissions"],
+            "co2_equivalent": emissions["co2_equivalent"],
+            "ch4_emission_factor": emissions["ch4_emission_factor"],
+            "co2_emission_factor": emissions["co2_emission_factor"],
+            "climate_region": emissions["climate_region"],
+            "trophic_status": emissions.get("trophic_status"),
+            "ipcc_tier1_results": emissions.get("ipcc_tier1_results"),
+        },
+        "uncertainty": uncertainty,
+        "sensitivity": sensitivity,
+        "degraded": degraded.model_dump() if degraded is not None else None,
+    }
+
+
+def compact(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload without null fields, constants and repeated inputs"""
+    emissions = {key: value for key, value in payload["emissions"].items() if value is not None}
+    ipcc = emissions.get("ipcc_tier1_results")
+    if ipcc is not None:
+        emissions["ipcc_tier1_results"] = {key: value for key, value in ipcc.items() if key not in COMPACT_OMITTED}
+    result = {key: value for key, value in payload.items() if value is not None}
+    result["emissions"] = emissions
+    return result
+
+
+def parse_fields(fields: str) -> Dict[str, Any]:
+    """'a,b.c,b.d' -> {"a": {}, "b": {"c": {}, "d": {}}}; raises ValueError on unknown top-level fields"""
+    tree: Dict[str, Any] = {}
+    for path in fields.split(","):
+        parts = [part.strip() for part in path.split(".")]
+        if not all(parts):
+            raise ValueError(f"Invalid field path: {path.strip()!r}")
+        if parts[0] not in schemas.AnalysisResponse.model_fields:
+            raise ValueError(f"Unknown field: {parts[0]!r}")
+        node = tree
+        for part in parts:
+            if part in node and not node[part]:
+                break  # a shorter path already selects the whole subtree
+            node = node.setdefault(part, {})
+        else:
+            node.clear()
+    return tree
+
+
+def select(value: Any, tree: Dict[str, Any]) -> Any:
+    """Keep only the `tree` paths of `value`; missing keys are left out"""
+    if not tree or value is None:
+        return value
+    if isinstance(value, list):
+        return [select(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {key: select(value[key], subtree) for key, subtree in tree.items() if key in value}
+
+
+def shape(payload: Dict[str, Any], fields: Optional[str] = None, view: str = "full") -> Dict[str, Any]:
+    """Apply the view, then the field selection"""
+    if view == "compact":
+        payload = compact(payload)
+    if fields:
+        payload = select(payload, parse_fields(fields))
+    return payload
@@ -0,0 +1,382 @@
+"""
+Incremental portfolio rollups for reservoir analyses
+
+Every flush that inserts, updates or deletes a `ReservoirAnalysis` applies
+the matching +/- delta to `AnalysisRollup` in the same transaction, so
+dashboard totals are read from O(groups) rollup rows instead of scanning
+every analysis. Bulk `query.delete()` / `query.update()` calls bypass ORM
+events: jobs that write with Core apply their own deltas (`apply_inserted`,
+`apply_updated`); otherwise run `python -m app.rollups rebuild` after such
+maintenance.
+"""
+
+import argparse
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, delete, event, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Dimensions the rollup table can be grouped by
+GROUP_BY_FIELDS = ("climate_region", "trophic_status", "user_id", "month")
+
+# Analysis attributes that feed a rollup key or total
+_TRACKED_ATTRIBUTES = (
+    "climate_region", "trophic_status", "user_id", "created_at",
+    "surface_area", "total_ch4_emissions", "total_co2_emissions", "co2_equivalent",
+)
+
+# Rollup total column <- analysis attribute
+_TOTALS = {
+    "surface_area_total": "surface_area",
+    "total_ch4_emissions": "total_ch4_emissions",
+    "total_co2_emissions": "total_co2_emissions",
+    "co2_equivalent_total": "co2_equivalent",
+}
+
+RollupKey = Tuple[Optional[str], Optional[str], Optional[int], str]
+
+
+def month_of(created_at: datetime) -> str:
+    """Rollup month bucket (YYYY-MM) for a timestamp"""
+    return created_at.strftime("%Y-%m")
+
+
+def _key_and_totals(values: Dict) -> Tuple[RollupKey, Dict[str, float]]:
+    """Split an analysis' attribute values into its rollup key and totals"""
+    key = (
+        values["climate_region"],
+        values["trophic_status"],
+        values["user_id"],
+        month_of(values["created_at"]),
+    )
+    totals = {column: float(values[attr] or 0.0) for column, attr in _TOTALS.items()}
+    return key, totals
+
+
+def group_key(key: RollupKey) -> str:
+    """Unique, NULL-safe encoding of a rollup key for `AnalysisRollup.group_key`"""
+    region, trophic_status, user_id, month = key
+    return json.dumps([month, region, trophic_status, user_id], ensure_ascii=False)
+
+
+def _row(key: RollupKey, group: Dict[str, float]) -> Dict:
+    return dict(zip(GROUP_BY_FIELDS, key), group_key=group_key(key), **group)
+
+
+def _upsert_statement(table, deltas: List[str], dialect: str):
+    """Native INSERT ... ON CONFLICT/DUPLICATE KEY UPDATE, or None if the dialect has none"""
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(table)
+        return statement.on_conflict_do_update(
+            index_elements=[table.c.group_key],
+            set_={column: table.c[column] + statement.excluded[column] for column in deltas},
+        )
+    if dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+
+        statement = dialect_insert(table)
+        return statement.on_duplicate_key_update(
+            {column: table.c[column] + statement.inserted[column] for column in deltas}
+        )
+    return None
+
+
+def _update_or_insert(conn, table, deltas: List[str], rows: List[Dict], attempts: int = 3) -> None:
+    """
+    Portable upsert: UPDATE the row with the group key, INSERT it if none
+    matched. An INSERT that loses a race to another transaction hits the
+    unique group_key index; it is rolled back to its savepoint and the
+    UPDATE retried.
+    """
+    add = update(table).where(table.c.group_key == bindparam("k_group_key")).values(
+        **{column: table.c[column] + bindparam(f"d_{column}") for column in deltas}
+    )
+    for row in rows:
+        params = {"k_group_key": row["group_key"], **{f"d_{column}": row[column] for column in deltas}}
+        for _ in range(attempts):
+            if conn.execute(add, params).rowcount:
+                break
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert(table).values(**row))
+                break
+            except IntegrityError:
+                continue
+        else:
+            raise RuntimeError(f"Could not upsert rollup group {row['group_key']}")
+
+
+def _upsert(conn, rows: List[Dict]) -> None:
+    """
+    Insert rollup rows, adding their count and totals to any existing row
+    with the same group key
+
+    Where the dialect supports it, one atomic statement per batch:
+    concurrent transactions creating the same group meet on the unique
+    group_key index instead of both inserting. Other dialects fall back to
+    `_update_or_insert`, one row at a time.
+    """
+    table = models.AnalysisRollup.__table__
+    deltas = [column for column in rows[0] if column == "analysis_count" or column in _TOTALS]
+    statement = _upsert_statement(table, deltas, conn.dialect.name)
+    if statement is None:
+        _update_or_insert(conn, table, deltas, rows)
+    else:
+        conn.execute(statement, rows)
+
+
+def _apply_delta(session: Session, key: RollupKey, sign: int, totals: Dict[str, float]) -> None:
+    """Add (sign=+1) or subtract (sign=-1) one analysis from its rollup row"""
+    table = models.AnalysisRollup
+    # Core statements on the session's connection: no autoflush recursion
+    conn = session.connection()
+    _upsert(conn, [_row(key, {"analysis_count": sign, **{column: sign * value for column, value in totals.items()}})])
+    if sign < 0:
+        conn.execute(
+            delete(table).where(table.group_key == group_key(key), table.analysis_count <= 0)
+        )
+
+
+def _current_values(obj: models.ReservoirAnalysis) -> Dict:
+    return {attr: getattr(obj, attr) for attr in _TRACKED_ATTRIBUTES}
+
+
+def _previous_values(obj: models.ReservoirAnalysis) -> Optional[Dict]:
+    """Pre-change values of a dirty analysis, or None if nothing tracked changed"""
+    state = obj._sa_instance_state
+    values = {}
+    changed = False
+    for attr in _TRACKED_ATTRIBUTES:
+        history = state.attrs[attr].history
+        if history.has_changes():
+            changed = True
+            values[attr] = history.deleted[0] if history.deleted else None
+        else:
+            values[attr] = getattr(obj, attr)
+    return values if changed else None
+
+
+def _load_previous_on_set(target, value, oldvalue, initiator):
+    pass
+
+
+# Make assignments to expired attributes load the old value first, so the
+# delta for an update can subtract it from the right rollup row
+for _attr in _TRACKED_ATTRIBUTES:
+    event.listen(
+        getattr(models.ReservoirAnalysis, _attr), "set", _load_previous_on_set, active_history=True
+    )
+
+
+def _signed(values: Dict, sign: int):
+    key, totals = _key_and_totals(values)
+    return key, sign, totals
+
+
+@event.listens_for(Session, "before_flush")
+def _maintain_rollups(session: Session, flush_context, instances) -> None:
+    """Apply rollup deltas for analyses about to be flushed"""
+    for obj in session.new:
+        if isinstance(obj, models.ReservoirAnalysis):
+            # The column default fires too late for the month bucket
+            if obj.created_at is None:
+                obj.created_at = datetime.utcnow()
+            _apply_delta(session, *_signed(_current_values(obj), +1))
+
+    for obj in session.dirty:
+        if isinstance(obj, models.ReservoirAnalysis) and session.is_modified(obj):
+            previous = _previous_values(obj)
+            if previous is None or previous["created_at"] is None:
+                continue
+            _apply_delta(session, *_signed(previous, -1))
+            _apply_delta(session, *_signed(_current_values(obj), +1))
+
+    for obj in session.deleted:
+        if isinstance(obj, models.ReservoirAnalysis) and obj.created_at is not None:
+            _apply_delta(session, *_signed(_current_values(obj), -1))
+
+
+def _merge(rows) -> Dict[RollupKey, Dict[str, float]]:
+    """Sum analyses (mappings of tracked attributes) into per-group totals"""
+    groups: Dict[RollupKey, Dict[str, float]] = {}
+    for values in rows:
+        key, totals = _key_and_totals({attr: values.get(attr) for attr in _TRACKED_ATTRIBUTES})
+        group = groups.setdefault(key, dict.fromkeys(_TOTALS, 0.0) | {"analysis_count": 0})
+        group["analysis_count"] += 1
+        for column, value in totals.items():
+            group[column] += value
+    return groups
+
+
+def apply_inserted(session: Session, rows: Sequence[Dict]) -> None:
+    """
+    Add analyses written with Core bulk inserts (which skip ORM events)
+
+    Deltas are merged per group first, so a batch costs one statement per
+    group rather than one per row.
+    """
+    _apply_groups(session, _merge(rows))
+
+
+def apply_updated(session: Session, before, after) -> None:
+    """
+    Move analyses changed with Core bulk updates between rollup rows
+
+    `before` and `after` are DataFrames of the tracked attributes of the
+    same analyses before and after the update. Deltas are grouped with
+    pandas, and only the net change per group is applied.
+    """
+    groups = _merge_frame(after)
+    for key, group in _merge_frame(before).items():
+        net = groups.setdefault(key, dict.fromkeys(group, 0))
+        for column, value in group.items():
+            net[column] -= value
+    _apply_groups(session, groups)
+
+
+def _merge_frame(frame) -> Dict[RollupKey, Dict[str, float]]:
+    """`_merge` for a DataFrame of analyses, grouped in pandas"""
+    # Deferred import: pandas is only needed by bulk maintenance jobs
+    import pandas as pd
+
+    frame = frame[frame["created_at"].notna()]
+    if frame.empty:
+        return {}
+    columns = {field: frame[field] for field in GROUP_BY_FIELDS if field != "month"}
+    created_at = pd.to_datetime(frame["created_at"])
+    # Format each distinct month once; strftime per row dominates otherwise
+    year_month = created_at.dt.year * 100 + created_at.dt.month
+    columns["month"] = year_month.map({value: f"{value // 100:04d}-{value % 100:02d}" for value in year_month.unique()})
+    columns.update({column: frame[attr].astype(float).fillna(0.0) for column, attr in _TOTALS.items()})
+    grouped = pd.DataFrame(columns).assign(analysis_count=1).groupby(list(GROUP_BY_FIELDS), dropna=False).sum()
+
+    groups = {}
+    for key, totals in zip(grouped.index, grouped.to_dict("records")):
+        region, trophic_status, user_id, month = (None if pd.isna(value) else value for value in key)
+        key = (region, trophic_status, None if user_id is None else int(user_id), month)
+        groups[key] = {column: float(value) for column, value in totals.items()}
+        groups[key]["analysis_count"] = int(totals["analysis_count"])
+    return groups
+
+
+def _apply_groups(session: Session, groups: Dict[RollupKey, Dict[str, float]]) -> None:
+    """
+    Add per-group deltas (analysis_count and totals) to the rollup table
+
+    All groups, new or existing, are upserted with one executemany
+    statement, whatever their number.
+    """
+    groups = {key: group for key, group in groups.items() if any(group.values())}
+    if not groups:
+        return
+    table = models.AnalysisRollup.__table__
+    conn = session.connection()
+    _upsert(conn, [_row(key, group) for key, group in groups.items()])
+    if any(group["analysis_count"] <= 0 for group in groups.values()):
+        months = {key[3] for key in groups}
+        conn.execute(delete(table).where(table.c.month.in_(months), table.c.analysis_count <= 0))
+
+
+def summarize(
+    db: Session,
+    group_by: Sequence[str] = (),
+    climate_region: Optional[str] = None,
+    trophic_status: Optional[str] = None,
+    user_id: Optional[int] = None,
+    month_from: Optional[str] = None,
+    month_to: Optional[str] = None,
+) -> List[Dict]:
+    """
+    Aggregate rollup rows by the requested dimensions
+
+    Args:
+        group_by: Subset of GROUP_BY_FIELDS; empty for a grand total
+        month_from / month_to: Inclusive YYYY-MM bounds
+
+    Returns:
+        One dict per group with the group key and summed totals
+    """
+    unknown = [field for field in group_by if field not in GROUP_BY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown group_by field(s): {', '.join(unknown)}")
+
+    table = models.AnalysisRollup
+    group_columns = [getattr(table, field) for field in group_by]
+    query = db.query(
+        *group_columns,
+        func.coalesce(func.sum(table.analysis_count), 0).label("analysis_count"),
+        *[
+            func.coalesce(func.sum(getattr(table, column)), 0.0).label(column)
+            for column in _TOTALS
+        ],
+    )
+
+    if climate_region is not None:
+        query = query.filter(table.climate_region == climate_region)
+    if trophic_status is not None:
+        query = query.filter(table.trophic_status == trophic_status)
+    if user_id is not None:
+        query = query.filter(table.user_id == user_id)
+    if month_from is not None:
+        query = query.filter(table.month >= month_from)
+    if month_to is not None:
+        query = query.filter(table.month <= month_to)
+
+    if group_columns:
+        query = query.group_by(*group_columns).order_by(*group_columns)
+
+    return [dict(row._mapping) for row in query.all()]
+
+
+def rebuild(db: Session, batch_size: int = 5000) -> int:
+    """
+    Recompute the rollup table from scratch
+
+    Streams analyses in batches, so memory grows with the number of groups
+    rather than the number of analyses.
+
+    Returns:
+        Number of rollup rows written
+    """
+    columns = [getattr(models.ReservoirAnalysis, attr) for attr in _TRACKED_ATTRIBUTES]
+    rows = db.query(*columns).filter(
+        models.ReservoirAnalysis.created_at.isnot(None)
+    ).yield_per(batch_size)
+    groups = _merge(row._asdict() for row in rows)
+
+    db.execute(delete(models.AnalysisRollup))
+    if groups:
+        db.execute(insert(models.AnalysisRollup), [_row(key, totals) for key, totals in groups.items()])
+    db.commit()
+    return len(groups)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain analysis rollup tables")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: recompute all rollups")
+    args = parser.parse_args(argv)
+
+    from .database import SessionLocal, engine
+    from . import migrations
+
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            count = rebuild(db)
+            print(f"✅ Rebuilt {count} rollup groups")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, Dict, List
 from datetime import datetime
 
@@ -23,6 +23,11 @@ class ReservoirInput(BaseModel):
     surface_area: float = Field(..., gt=0, description="Surface area (km²)")
     reservoir_age: Optional[float] = Field(None, ge=0, description="Reservoir age (years)")
     
+    # Stored monitoring record (see /api/monitoring), instead of
+    # trophic_status or water_quality
+    monitoring_reservoir_id: Optional[str] = Field(None, max_length=100, description="Reservoir id of an ingested monitoring record")
+    monitoring_period: Optional[str] = Field(None, pattern=r"^\d{4}(-(DJF|MAM|JJA|SON))?$", description="Record period, e.g. 2023 or 2023-JJA (default: latest year)")
+    
     # Custom emission factors (optional)
     custom_ch4_ef: Optional[float] = Field(None, description="Custom CH4 emission factor (kg/km²/yr)")
     custom_co2_ef: Optional[float] = Field(None, description="Custom CO2 emission factor (kg/km²/yr)")
@@ -31,6 +36,13 @@ class ReservoirInput(BaseModel):
     run_uncertainty: bool = Field(True, description="Run uncertainty analysis")
     run_sensitivity: bool = Field(True, description="Run sensitivity analysis")
     uncertainty_iterations: int = Field(1000, ge=100, le=10000, description="Monte Carlo iterations")
+    allow_degraded: bool = Field(True, description="Under load, accept fewer iterations or skipped analyses instead of a 429/503")
+    
+    @model_validator(mode="after")
+    def _one_water_quality_source(self):
+        if self.monitoring_reservoir_id and (self.trophic_status or self.water_quality):
+            raise ValueError("monitoring_reservoir_id cannot be combined with trophic_status or water_quality")
+        return self
 
 class EmissionResults(BaseModel):
     """Emission calculation results"""
@@ -65,6 +77,14 @@ class SensitivityResults(BaseModel):
     correlation: float
     rank_correlation: float
 
+class Degradation(BaseModel):
+    """How an analysis was scaled down by admission control"""
+    reason: str
+    requested_iterations: int
+    iterations: Optional[int] = Field(None, description="Iterations actually run (None: deterministic only)")
+    uncertainty_skipped: bool = False
+    sensitivity_skipped: bool = False
+
 class AnalysisResponse(BaseModel):
     """Complete analysis response"""
     id: int
@@ -85,6 +105,9 @@ class AnalysisResponse(BaseModel):
     
     # Sensitivity analysis
     sensitivity: Optional[List[SensitivityResults]] = None
+    
+    # Set when the server was overloaded and ran less than requested
+    degraded: Optional[Degradation] = None
 
 class AnalysisListItem(BaseModel):
     """Summary item for analysis list"""
@@ -99,6 +122,107 @@ class AnalysisListItem(BaseModel):
     class Config:
         from_attributes = True
 
+class NearbyAnalysis(AnalysisListItem):
+    """Stored analysis near a requested location"""
+    trophic_status: Optional[str] = None
+    distance_km: float
+
+class AggregateGroup(BaseModel):
+    """Totals for one group of analyses from the rollup table"""
+    climate_region: Optional[str] = None
+    trophic_status: Optional[str] = None
+    user_id: Optional[int] = None
+    month: Optional[str] = None  # YYYY-MM
+    
+    analysis_count: int
+    surface_area_total: float = Field(..., description="Summed surface area (km²)")
+    total_ch4_emissions: float = Field(..., description="Summed CH4 emissions (kg/yr)")
+    total_co2_emissions: float = Field(..., description="Summed CO2 emissions (kg/yr)")
+    co2_equivalent_total: float = Field(..., description="Summed CO2 equivalent (kg CO2-eq/yr)")
+
+class MapCell(BaseModel):
+    """Analyses summarised over one map cell (a quadkey tile)"""
+    quadkey: str
+    count: int
+    co2_equivalent: float = Field(..., description="Summed CO2 equivalent (kg CO2-eq/yr)")
+    latitude: float = Field(..., description="Centroid of the cell's analyses")
+    longitude: float
+    south: float
+    west: float
+    north: float
+    east: float
+    analysis_id: Optional[int] = Field(None, description="Set when the cell holds one analysis")
+
+class MapCells(BaseModel):
+    """Cell summaries for the tiles covering a bounding box"""
+    zoom: int
+    level: int = Field(..., description="Quadkey length of the cells")
+    cells: List[MapCell]
+
+class StatisticSummary(BaseModel):
+    """One result statistic summarized across analyses"""
+    output: str
+    stat: str
+    count: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+
+class WaterQualityRecord(BaseModel):
+    """Stored water quality means of one reservoir for one period"""
+    reservoir_id: str
+    period: str  # YYYY or YYYY-DJF/MAM/JJA/SON
+    sample_count: int
+    total_phosphorus: Optional[float] = None
+    total_nitrogen: Optional[float] = None
+    chlorophyll_a: Optional[float] = None
+    secchi_depth: Optional[float] = None
+    trophic_status: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+class MonitoringIngestSummary(BaseModel):
+    """Outcome of one monitoring file ingestion"""
+    samples: int
+    skipped: int
+    reservoirs: int
+    records: int
+
+class InverseReservoir(BaseModel):
+    """One reservoir of an inverse solve; the solved-for input is left out"""
+    latitude: float = Field(..., ge=-90, le=90)
+    surface_area: Optional[float] = Field(None, gt=0, description="Surface area (km²)")
+    trophic_status: Optional[str] = Field(None, description="Trophic status (unknown or missing: Mesotrophic factor)")
+    reservoir_age: Optional[float] = Field(None, gt=0, description="Reservoir age (years)")
+    co2_equivalent_budget: float = Field(..., gt=0, description="Limit on co2_equivalent as reported by /api/analyze (kg CO2-eq)")
+
+class InverseRequest(BaseModel):
+    """Solve the Tier 1 model for one input per reservoir"""
+    solve_for: str = Field(..., pattern="^(surface_area|trophic_status|reservoir_age)$")
+    reservoirs: List[InverseReservoir] = Field(..., min_length=1, max_length=100_000)
+    max_age: float = Field(500, gt=0, description="Search horizon for reservoir_age (years)")
+
+class InverseSolution(BaseModel):
+    """
+    Solved input of one reservoir
+
+    surface_area: largest area within the budget. trophic_status: most
+    eutrophic state within it (max_trophic_factor is the exact limit).
+    reservoir_age: age at which co2_equivalent reaches the budget.
+    feasible is False when no value within the model's range qualifies.
+    """
+    feasible: bool
+    surface_area: Optional[float] = None
+    trophic_status: Optional[str] = None
+    max_trophic_factor: Optional[float] = None
+    reservoir_age: Optional[float] = None
+
+class InverseResponse(BaseModel):
+    """Solutions in request order"""
+    solve_for: str
+    solutions: List[InverseSolution]
+
 # User Authentication Schemas
 class LoginRequest(BaseModel):
     """User login request"""
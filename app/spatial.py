@@ -0,0 +1,219 @@
+"""
+Spatial aggregation of stored analyses for the map view
+
+Every analysis stores the quadkey of its location: the Web Mercator tile
+path (one digit 0-3 per zoom level) that Leaflet's tiles use. The
+analyses in a map tile share a quadkey prefix, so they form one range of
+the (user_id, quadkey) index. A tile at zoom z is split into cells at
+level z + CELL_BITS and summarised per cell: count, summed CO2-eq and
+centroid. This gives clusters and a heatmap grid whose size depends on
+the tiles on screen, not on how many analyses exist.
+
+Tile summaries are cached per owner. A write evicts the tiles that
+contain the changed analysis at every zoom.
+"""
+
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, event, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import TTLCache
+
+# Stored precision: level 20 cells are ~38 m wide at the equator
+QUADKEY_LEVEL = 20
+# Cells per tile side = 2 ** CELL_BITS (64 px cells on 256 px tiles)
+CELL_BITS = 2
+MAX_ZOOM = QUADKEY_LEVEL - CELL_BITS
+# Bounding boxes needing more tiles than this are rejected (a 4K screen needs ~160)
+MAX_TILES = 256
+
+# Web Mercator stops short of the poles
+_MAX_LATITUDE = 85.05112878
+
+tile_cache = TTLCache(
+    maxsize=int(os.getenv("MAP_TILE_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("MAP_TILE_CACHE_TTL_SECONDS", "300"))
+)
+
+
+def _tile_fraction(latitude: float, longitude: float) -> Tuple[float, float]:
+    """Position on the Web Mercator square, both axes in [0, 1) for in-range input"""
+    latitude = min(max(latitude, -_MAX_LATITUDE), _MAX_LATITUDE)
+    sin_lat = math.sin(math.radians(latitude))
+    x = (longitude + 180.0) / 360.0
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+
+def quadkey(latitude: float, longitude: float, level: int = QUADKEY_LEVEL) -> str:
+    """Quadkey of the level-`level` tile containing a point"""
+    x, y = _tile_fraction(latitude, longitude)
+    size = 1 << level
+    tile_x = min(max(int(x * size), 0), size - 1)
+    tile_y = min(max(int(y * size), 0), size - 1)
+    return _encode(tile_x, tile_y, level)
+
+
+def _encode(tile_x: int, tile_y: int, level: int) -> str:
+    digits = []
+    for bit in range(level - 1, -1, -1):
+        digits.append(str(((tile_x >> bit) & 1) | (((tile_y >> bit) & 1) << 1)))
+    return "".join(digits)
+
+
+def bounds(key: str) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) of the tile with quadkey `key`"""
+    tile_x = tile_y = 0
+    for digit in key:
+        value = int(digit)
+        tile_x = (tile_x << 1) | (value & 1)
+        tile_y = (tile_y << 1) | (value >> 1)
+    size = 1 << len(key)
+
+    def latitude(y: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / size))))
+
+    return latitude(tile_y + 1), tile_x / size * 360 - 180, latitude(tile_y), (tile_x + 1) / size * 360 - 180
+
+
+def tiles(south: float, west: float, north: float, east: float, zoom: int) -> List[str]:
+    """
+    Quadkeys of the zoom-`zoom` tiles covering a bounding box
+
+    Longitudes may run past ±180 (as Leaflet reports after panning across the
+    antimeridian); they wrap around.
+
+    Raises:
+        ValueError: if more than MAX_TILES tiles are needed
+    """
+    size = 1 << zoom
+    x_west, y_north = _tile_fraction(north, west)
+    x_east, y_south = _tile_fraction(south, east)
+    if east - west >= 360:
+        columns = range(size)
+    else:
+        columns = sorted({x % size for x in range(math.floor(x_west * size), math.floor(x_east * size) + 1)})
+    rows = range(min(int(y_north * size), size - 1), min(int(y_south * size), size - 1) + 1)
+
+    if len(columns) * len(rows) > MAX_TILES:
+        raise ValueError(f"Bounding box spans more than {MAX_TILES} tiles at zoom {zoom}; zoom in")
+    return [_encode(x, y, zoom) for y in rows for x in columns]
+
+
+def _owner(user_id: Optional[int]):
+    column = models.ReservoirAnalysis.user_id
+    return column.is_(None) if user_id is None else column == user_id
+
+
+def _summary_query(user_id: Optional[int], keys: Sequence[str], level: int):
+    """Per-cell summary of the analyses in the given tiles (one index range each)"""
+    table = models.ReservoirAnalysis
+    cell = func.substr(table.quadkey, 1, level).label("cell")
+    return select(
+        cell,
+        func.count().label("count"),
+        func.coalesce(func.sum(table.co2_equivalent), 0.0).label("co2_equivalent"),
+        func.avg(table.latitude).label("latitude"),
+        func.avg(table.longitude).label("longitude"),
+        func.min(table.id).label("analysis_id"),
+    ).where(
+        # Digits are 0-3, so "<prefix>4" bounds every key under a prefix. The
+        # owner is repeated per range so SQLite searches the index per tile.
+        or_(*(and_(_owner(user_id), table.quadkey.between(key, key + "4")) for key in keys)),
+    ).group_by(cell)
+
+
+def _cell(row) -> Dict:
+    south, west, north, east = bounds(row.cell)
+    return {
+        "quadkey": row.cell,
+        "count": row.count,
+        "co2_equivalent": float(row.co2_equivalent),
+        "latitude": row.latitude,
+        "longitude": row.longitude,
+        "south": south,
+        "west": west,
+        "north": north,
+        "east": east,
+        "analysis_id": row.analysis_id if row.count == 1 else None,
+    }
+
+
+async def cells(
+    db: AsyncSession,
+    user_id: Optional[int],
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+    zoom: int
+) -> List[Dict]:
+    """
+    Cell summaries of `user_id`'s analyses in the tiles covering a bounding box
+
+    Cached tiles are reused; the missing ones are summarised in one query.
+    """
+    keys = tiles(south, west, north, east, zoom)
+    summaries = {}
+    missing = []
+    for key in keys:
+        cached = tile_cache.get((user_id, key))
+        if cached is None:
+            missing.append(key)
+        else:
+            summaries[key] = cached
+
+    if missing:
+        fetched = {key: [] for key in missing}
+        rows = await db.execute(_summary_query(user_id, missing, min(zoom + CELL_BITS, QUADKEY_LEVEL)))
+        for row in rows:
+            fetched[row.cell[:zoom]].append(_cell(row))
+        for key, tile_cells in fetched.items():
+            tile_cache.set((user_id, key), tile_cells)
+        summaries.update(fetched)
+
+    return [cell for key in keys for cell in summaries[key]]
+
+
+def invalidate(user_id: Optional[int], key: Optional[str]) -> None:
+    """Evict the cached tiles containing one analysis, at every zoom"""
+    if key is None:
+        return
+    for zoom in range(MAX_ZOOM + 1):
+        tile_cache.pop((user_id, key[:zoom]))
+
+
+def invalidate_rows(rows: Iterable[Dict]) -> None:
+    """`invalidate` for analyses written with Core inserts (which skip ORM events)"""
+    for row in rows:
+        invalidate(row.get("user_id"), row.get("quadkey"))
+
+
+def _previous(obj: models.ReservoirAnalysis, attr: str):
+    history = obj._sa_instance_state.attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(obj, attr)
+
+
+@event.listens_for(Session, "before_flush")
+def _maintain_quadkeys(session: Session, flush_context, instances) -> None:
+    """Keep quadkeys in step with locations and evict the affected tiles"""
+    for obj in session.new:
+        if isinstance(obj, models.ReservoirAnalysis):
+            if obj.quadkey is None and obj.latitude is not None and obj.longitude is not None:
+                obj.quadkey = quadkey(obj.latitude, obj.longitude)
+            invalidate(obj.user_id, obj.quadkey)
+
+    for obj in session.dirty:
+        if isinstance(obj, models.ReservoirAnalysis) and session.is_modified(obj):
+            invalidate(_previous(obj, "user_id"), _previous(obj, "quadkey"))
+            obj.quadkey = quadkey(obj.latitude, obj.longitude)
+            invalidate(obj.user_id, obj.quadkey)
+
+    for obj in session.deleted:
+        if isinstance(obj, models.ReservoirAnalysis):
+            invalidate(obj.user_id, obj.quadkey)
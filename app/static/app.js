@@ -2,6 +2,8 @@
 let currentAnalysis = null;
 let map = null;
 let marker = null;
+let analysisLayer = null;
+let analysisCellsRequest = 0;
 
 // DOM加载完成后初始化
 document.addEventListener('DOMContentLoaded', function() {
@@ -194,7 +196,13 @@ function updateTrophicStatus() {
     statusDiv.style.display = 'inline-block';
 }
 
-// 处理计算
+// 已登录时附带令牌，分析结果归属当前用户
+function authHeaders(headers = {}) {
+    const token = localStorage.getItem('access_token');
+    return token ? { ...headers, 'Authorization': `Bearer ${token}` } : headers;
+}
+
+// 处理计算：通过事件流接收蒙特卡洛进度，逐步显示估计值
 async function handleCalculate() {
     if (!validateForm()) {
         return;
@@ -204,11 +212,12 @@ async function handleCalculate() {
     
     try {
         const formData = collectFormData();
-        const response = await fetch('/api/analyze', {
+        const response = await fetch('/api/analyze/stream', {
             method: 'POST',
-            headers: {
+            headers: authHeaders({
                 'Content-Type': 'application/json',
-            },
+                'Accept': 'text/event-stream',
+            }),
             body: JSON.stringify(formData)
         });
         
@@ -216,9 +225,10 @@ async function handleCalculate() {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         
-        const result = await response.json();
+        const result = await readAnalysisStream(response);
         currentAnalysis = result;
         displayResults(result);
+        loadAnalysisCells();
         
     } catch (error) {
         console.error('Error:', error);
@@ -228,6 +238,66 @@ async function handleCalculate() {
     }
 }
 
+// 读取服务器推送事件，返回最终分析结果
+async function readAnalysisStream(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) {
+            throw new Error('分析流意外结束');
+        }
+        buffer += decoder.decode(value, { stream: true });
+        
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            frame.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            
+            if (event === 'progress') {
+                showProgress(JSON.parse(data));
+            } else if (event === 'result') {
+                reader.cancel();
+                return JSON.parse(data);
+            } else if (event === 'error') {
+                throw new Error(JSON.parse(data).detail);
+            }
+        }
+    }
+}
+
+// 显示计算进度和当前的CO2当量估计（均值与95%置信区间）
+function showProgress(progress) {
+    const bar = document.getElementById('progressBar');
+    const text = document.getElementById('progressText');
+    const estimateText = document.getElementById('progressEstimate');
+    
+    if (progress.stage === 'sensitivity') {
+        bar.style.width = '100%';
+        text.textContent = '正在进行敏感性分析...';
+    } else {
+        const percent = Math.round(progress.done / progress.total * 100);
+        bar.style.width = `${percent}%`;
+        text.textContent = `不确定性分析 ${progress.done} / ${progress.total} 次迭代（${percent}%）`;
+    }
+    
+    const estimate = progress.estimate && progress.estimate.CO2_equivalent;
+    if (estimate) {
+        estimateText.textContent =
+            `CO₂当量当前估计：${formatNumber(estimate.mean)} kg/年 ` +
+            `（95%置信区间 ${formatNumber(estimate.ci_lower)} – ${formatNumber(estimate.ci_upper)}）`;
+    }
+}
+
 // 处理保存草稿
 function handleSaveDraft() {
     if (!validateForm()) {
@@ -834,6 +904,9 @@ function formatNumber(num) {
 
 // 显示加载状态
 function showLoading() {
+    document.getElementById('progressBar').style.width = '0%';
+    document.getElementById('progressText').textContent = '正在计算中，请稍候...';
+    document.getElementById('progressEstimate').textContent = '';
     document.getElementById('loadingContainer').style.display = 'block';
     document.getElementById('calculateBtn').disabled = true;
 }
@@ -943,6 +1016,11 @@ function initializeMap() {
         
         console.log('Tile layer added');
         
+        // 已保存分析的聚合图层，视野变化时按需加载
+        analysisLayer = L.layerGroup().addTo(map);
+        map.on('moveend', loadAnalysisCells);
+        loadAnalysisCells();
+        
         // 地图点击事件
         map.on('click', function(e) {
             const lat = e.latlng.lat;
@@ -964,6 +1042,9 @@ function initializeMap() {
             
             // 更新气候区域
             updateClimateRegion();
+            
+            // 附近已有分析时提示直接查看，避免重复计算
+            showNearbyAnalyses(marker, lat, lng);
         });
         
         // 添加默认标记（北京）
@@ -983,6 +1064,98 @@ function initializeMap() {
     }
 }
 
+// 加载当前视野内已保存分析的网格聚合：圆点位于质心，大小表示数量，颜色表示CO2当量
+async function loadAnalysisCells() {
+    if (!map || !analysisLayer || !localStorage.getItem('access_token')) {
+        return;
+    }
+    
+    const bounds = map.getBounds();
+    const params = new URLSearchParams({
+        south: Math.max(bounds.getSouth(), -90),
+        west: bounds.getWest(),
+        north: Math.min(bounds.getNorth(), 90),
+        east: bounds.getEast(),
+        zoom: Math.round(map.getZoom())
+    });
+    const request = ++analysisCellsRequest;
+    
+    try {
+        const response = await fetch(`/api/map/cells?${params}`, { headers: authHeaders() });
+        if (!response.ok || request !== analysisCellsRequest) {
+            return;
+        }
+        const data = await response.json();
+        if (request !== analysisCellsRequest) {
+            return;
+        }
+        
+        const maxEmissions = Math.max(1, ...data.cells.map(cell => cell.co2_equivalent));
+        analysisLayer.clearLayers();
+        data.cells.forEach(cell => {
+            const intensity = Math.sqrt(cell.co2_equivalent / maxEmissions);
+            const circle = L.circleMarker([cell.latitude, cell.longitude], {
+                radius: 6 + 4 * Math.log10(cell.count),
+                color: '#ffffff',
+                weight: 1,
+                fillColor: `hsl(${Math.round(120 - 120 * intensity)}, 70%, 45%)`,
+                fillOpacity: 0.8,
+                bubblingMouseEvents: false
+            });
+            const label = cell.count === 1 ? `分析 #${cell.analysis_id}` : `${cell.count} 个分析`;
+            circle.bindPopup(`${label}<br>CO2当量: ${formatNumber(cell.co2_equivalent)} kg/年`);
+            analysisLayer.addLayer(circle);
+        });
+    } catch (error) {
+        console.error('Error loading analysis cells:', error);
+    }
+}
+
+// 在标记弹窗中列出附近已保存的分析结果
+async function showNearbyAnalyses(target, lat, lng) {
+    try {
+        const params = new URLSearchParams({ latitude: lat, longitude: lng });
+        const response = await fetch(`/api/analyses/nearby?${params}`, { headers: authHeaders() });
+        if (!response.ok) {
+            return;
+        }
+        const analyses = await response.json();
+        if (!analyses.length || target !== marker) {
+            return;
+        }
+        
+        const items = analyses.map(analysis => `
+            <li>
+                <a href="#" onclick="loadExistingAnalysis(${analysis.id}); return false;">#${analysis.id}</a>
+                ${analysis.distance_km.toFixed(2)} km · ${formatNumber(analysis.co2_equivalent)} kg CO2当量/年
+            </li>
+        `).join('');
+        target.setPopupContent(`
+            位置: ${lat.toFixed(4)}, ${lng.toFixed(4)}<br>
+            附近已有 ${analyses.length} 个分析结果，可直接查看：
+            <ul class="nearby-list">${items}</ul>
+        `);
+    } catch (error) {
+        console.error('Error loading nearby analyses:', error);
+    }
+}
+
+// 显示已保存的分析结果，无需重新计算
+async function loadExistingAnalysis(analysisId) {
+    try {
+        const response = await fetch(`/api/analyses/${analysisId}`, { headers: authHeaders() });
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const result = await response.json();
+        currentAnalysis = result;
+        displayResults(result);
+    } catch (error) {
+        console.error('Error:', error);
+        showError('无法加载已有分析结果');
+    }
+}
+
 // 从坐标输入框更新地图标记
 function updateMapFromCoordinates() {
     const lat = parseFloat(document.getElementById('latitude').value);
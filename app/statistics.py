@@ -0,0 +1,105 @@
+"""
+Normalized, queryable copy of analysis result statistics
+
+The packed uncertainty/sensitivity blobs are opaque to SQL. Every stored
+analysis also gets one `AnalysisStatistic` row per value, e.g.
+(analysis_id, "CO2_equivalent", "ci_upper", 1.2e6), kept in sync by an
+after_flush listener, so cross-analysis questions are plain indexed SQL.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import delete, event, func, insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .codecs import SENSITIVITY_STATS
+
+
+def rows_for(analysis_id: int, uncertainty: Optional[Dict], sensitivity: Optional[List]) -> List[Dict]:
+    """Statistic rows for one analysis' uncertainty and sensitivity results"""
+    rows = []
+    for output, stats in (uncertainty or {}).items():
+        if isinstance(stats, dict):
+            for stat, value in stats.items():
+                rows.append({"analysis_id": analysis_id, "output": output, "stat": stat, "value": value})
+    for entry in sensitivity or []:
+        for stat in SENSITIVITY_STATS:
+            if stat in entry:
+                rows.append({
+                    "analysis_id": analysis_id,
+                    "output": entry["parameter"],
+                    "stat": stat,
+                    "value": entry[stat],
+                })
+    return rows
+
+
+def insert_for_rows(session: Session, analyses: Sequence[Dict]) -> None:
+    """Add statistic rows for analyses written with Core bulk inserts"""
+    table = models.AnalysisStatistic
+    conn = session.connection()
+    conn.execute(delete(table).where(table.analysis_id.in_([values["id"] for values in analyses])))
+
+    rows = []
+    for values in analyses:
+        rows.extend(rows_for(
+            values["id"], values.get("uncertainty_analysis"), values.get("sensitivity_analysis")
+        ))
+    if rows:
+        conn.execute(insert(table), rows)
+
+
+def _results_changed(obj: models.ReservoirAnalysis) -> bool:
+    state = obj._sa_instance_state
+    return any(
+        state.attrs[attr].history.has_changes()
+        for attr in ("uncertainty_analysis", "sensitivity_analysis")
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _maintain_statistics(session: Session, flush_context) -> None:
+    """Mirror inserted, changed and deleted analysis results into the table"""
+    stale_ids = []
+    fresh = []
+
+    for obj in session.new:
+        if isinstance(obj, models.ReservoirAnalysis):
+            # A reused id may still have rows left behind by a bulk delete
+            stale_ids.append(obj.id)
+            fresh.append(obj)
+    for obj in session.dirty:
+        if isinstance(obj, models.ReservoirAnalysis) and _results_changed(obj):
+            stale_ids.append(obj.id)
+            fresh.append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, models.ReservoirAnalysis):
+            stale_ids.append(obj.id)
+
+    conn = session.connection()
+    table = models.AnalysisStatistic
+    if stale_ids:
+        conn.execute(delete(table).where(table.analysis_id.in_(stale_ids)))
+
+    rows = []
+    for obj in fresh:
+        rows.extend(rows_for(obj.id, obj.uncertainty_analysis, obj.sensitivity_analysis))
+    if rows:
+        conn.execute(insert(table), rows)
+
+
+def summarize(db: Session, output: str, stat: str, user_id: Optional[int] = None) -> Dict:
+    """Count, min, max and mean of one statistic across all analyses, or only `user_id`'s"""
+    table = models.AnalysisStatistic
+    query = db.query(
+        func.count(table.value).label("count"),
+        func.min(table.value).label("min"),
+        func.max(table.value).label("max"),
+        func.avg(table.value).label("mean"),
+    ).filter(table.output == output, table.stat == stat)
+    if user_id is not None:
+        analyses = models.ReservoirAnalysis
+        query = query.join(analyses, analyses.id == table.analysis_id).filter(analyses.user_id == user_id)
+    row = query.one()
+    return {"output": output, "stat": stat, **row._asdict()}
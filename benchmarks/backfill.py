@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Backfill throughput benchmark: recompute N stored analyses after a factor change
+
+Seeds a throwaway SQLite database with N analyses (random locations,
+areas, ages, trophic states, 10 users, 12 months) and consistent rollups,
+changes GWP_100yr_CH4, then times `app.backfill.backfill` over all rows.
+
+Usage:
+    python -m benchmarks.backfill [--rows 1000000] [--chunk-size 50000]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app import backfill, ipcc_tier1, migrations, models, rollups
+from app.database import build_engine
+
+TROPHIC_STATES = np.array(["Oligotrophic", "Mesotrophic", "Eutrophic", "Hypereutrophic", None], dtype=object)
+
+
+def _seed(engine, rows: int, batch: int = 50_000) -> None:
+    rng = np.random.default_rng(0)
+    table = models.ReservoirAnalysis.__table__
+    for start in range(0, rows, batch):
+        size = min(batch, rows - start)
+        latitude = rng.uniform(-60, 60, size).tolist()
+        area = rng.uniform(0.1, 500, size).tolist()
+        age = rng.uniform(1, 80, size).tolist()
+        trophic = TROPHIC_STATES[rng.integers(0, len(TROPHIC_STATES), size)].tolist()
+        with engine.begin() as conn:
+            conn.execute(insert(table), [
+                {
+                    "latitude": latitude[i], "longitude": 0.0, "surface_area": area[i], "reservoir_age": age[i],
+                    "trophic_status": trophic[i], "user_id": i % 10, "created_at": datetime(2024, 1 + i % 12, 1),
+                }
+                for i in range(size)
+            ])
+    with Session(engine) as session:
+        rollups.rebuild(session)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=backfill.DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    engine = build_engine("sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+    migrations.upgrade(engine)
+    start = time.perf_counter()
+    _seed(engine, args.rows)
+    print(f"seeded {args.rows:,} analyses in {time.perf_counter() - start:.1f}s")
+
+    ipcc_tier1.GWP_100yr_CH4 = 29.8
+    ipcc_tier1.FACTOR_VERSION = ipcc_tier1.factor_fingerprint()
+    summary = backfill.backfill(engine, args.chunk_size, progress=None)
+    print(
+        f"backfill: {summary['rows']:,} rows in {summary['seconds']:.1f}s "
+        f"({summary['rows_per_second']:,.0f} rows/s, chunks of {args.chunk_size:,})"
+    )
+
+
+if __name__ == "__main__":
+    main()
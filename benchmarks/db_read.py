@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Concurrent read-throughput benchmark for the sync and asyncio engines
+
+Seeds one SQLite file with analyses, then runs the request handlers' read
+pattern (a 50-row listing page plus a lookup by id) from concurrent
+readers:
+  * sync: `build_engine`, one thread per reader (the threadpool path)
+  * async, unpooled: `build_async_engine` with NullPool, the previous
+    SQLite setting (a new connection and pragmas per session)
+  * async, pooled: `build_async_engine` as configured now
+
+Usage:
+    python -m benchmarks.db_read [--readers 16] [--reads 200] [--rows 20000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app import migrations, models, pagination
+from app.database import build_async_engine, build_engine
+
+
+def _seed(engine, rows: int) -> None:
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.ReservoirAnalysis), [
+            {
+                "created_at": start + timedelta(minutes=i), "latitude": 30.0, "longitude": 110.0,
+                "climate_region": "温暖湿润区", "trophic_status": "Mesotrophic", "surface_area": 10.0,
+                "co2_equivalent": float(i), "user_id": i % 10,
+            }
+            for i in range(rows)
+        ])
+
+
+def _page(user_id: int):
+    table = models.ReservoirAnalysis
+    return (
+        select(*pagination.SUMMARY_COLUMNS).where(table.user_id == user_id)
+        .order_by(table.created_at.desc(), table.id.desc()).limit(50)
+    )
+
+
+def run_sync(engine, readers: int, reads: int, rows: int) -> float:
+    Session = sessionmaker(bind=engine)
+
+    def reader(seed: int):
+        rng = random.Random(seed)
+        for _ in range(reads):
+            with Session() as session:
+                session.execute(_page(rng.randrange(10))).all()
+                session.get(models.ReservoirAnalysis, rng.randrange(1, rows + 1))
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+async def run_async(engine, readers: int, reads: int, rows: int) -> float:
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def reader(seed: int):
+        rng = random.Random(seed)
+        for _ in range(reads):
+            # One session per read, as one request dependency gets
+            async with Session() as session:
+                (await session.execute(_page(rng.randrange(10)))).all()
+                await session.get(models.ReservoirAnalysis, rng.randrange(1, rows + 1))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(reader(n) for n in range(readers)))
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return elapsed
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--reads", type=int, default=200, help="page + lookup pairs per reader")
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = build_engine("sqlite:///" + path)
+    migrations.upgrade(engine)
+    _seed(engine, args.rows)
+
+    async_url = "sqlite+aiosqlite:///" + path
+    results = {
+        "sync": run_sync(engine, args.readers, args.reads, args.rows),
+        "async, unpooled": asyncio.run(run_async(
+            build_async_engine(async_url, poolclass=NullPool), args.readers, args.reads, args.rows
+        )),
+        "async, pooled": asyncio.run(run_async(build_async_engine(async_url), args.readers, args.reads, args.rows)),
+    }
+    engine.dispose()
+
+    total = args.readers * args.reads
+    for name, seconds in results.items():
+        print(f"{name:>15}: {total / seconds:8.1f} reads/s  ({total} page + lookup pairs, {seconds:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Concurrent write-throughput benchmark for the database engine profiles
+
+Each writer thread inserts analyses one per transaction, as /api/analyze
+does, against a bare engine (the previous default) and the tuned profile
+from `app.database.build_engine`.
+
+Usage:
+    python -m benchmarks.db_write [--writers 8] [--rows 200] [--url sqlite:///bench.db]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import migrations, models
+from app.database import build_engine
+
+
+def _row(i: int) -> models.ReservoirAnalysis:
+    return models.ReservoirAnalysis(
+        created_at=datetime.utcnow(),
+        latitude=30.0 + (i % 100) / 100,
+        longitude=110.0,
+        climate_region="温暖湿润区",
+        trophic_status="Mesotrophic",
+        surface_area=10.0,
+        reservoir_age=20.0,
+        co2_equivalent=1000.0 + i,
+        uncertainty_analysis={"CO2": {"mean": 1.0}},
+    )
+
+
+def run_profile(engine, writers: int, rows: int) -> dict:
+    """Insert writers * rows analyses concurrently; return throughput stats"""
+    migrations.upgrade(engine)
+    Session = sessionmaker(bind=engine)
+    errors = []
+    lock = threading.Lock()
+
+    def writer(offset: int):
+        session = Session()
+        try:
+            for i in range(rows):
+                try:
+                    session.add(_row(offset + i))
+                    session.commit()
+                except OperationalError as e:
+                    session.rollback()
+                    with lock:
+                        errors.append(str(e.orig))
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=writer, args=(n * rows,)) for n in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    committed = writers * rows - len(errors)
+    return {
+        "rows_committed": committed,
+        "errors": len(errors),
+        "seconds": elapsed,
+        "rows_per_second": committed / elapsed if elapsed else 0.0,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=200, help="rows per writer")
+    parser.add_argument("--url", help="database URL (default: fresh SQLite files)")
+    args = parser.parse_args(argv)
+
+    def fresh_url():
+        if args.url:
+            return args.url
+        return "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    # The engine as it was configured before profiles existed
+    bare_url = fresh_url()
+    bare = create_engine(
+        bare_url, connect_args={"check_same_thread": False} if "sqlite" in bare_url else {}
+    )
+    tuned = build_engine(fresh_url())
+
+    for name, engine in (("bare", bare), ("tuned", tuned)):
+        result = run_profile(engine, args.writers, args.rows)
+        print(f"{name:>5}: {result['rows_per_second']:8.1f} rows/s  "
+              f"({result['rows_committed']} committed, {result['errors']} errors, "
+              f"{result['seconds']:.2f}s)")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+"""
+Load-replay harness for sizing workers, database profiles and iteration caps
+
+Drives the app with either a recorded trace or a synthetic request mix,
+then reports the following. Runs are comparable across configurations:
+  * throughput (completed requests per second)
+  * latency percentiles per request kind and overall. Measured from the
+    scheduled arrival, so a saturated server shows up as latency rather
+    than as a slower arrival rate.
+  * error rates (HTTP status >= 400 or transport errors)
+  * event-loop lag: in process, sampled on the loop serving the app.
+    Against a server, read from its /metrics histogram.
+
+Targets:
+  * in process (default): the ASGI app runs in this process, startup and
+    shutdown included
+  * --uvicorn: spawns `uvicorn app.main:app --workers N` on a free port.
+    The environment is passed through, so DB profiles (SQLITE_*,
+    DB_POOL_*) and WRITE_BEHIND can be compared.
+Both run against a throwaway SQLite database, whatever $DATABASE_URL says;
+--database-url targets another (migrated and written to) instead.
+  * --url: an already running server
+
+Arrivals: --rate R gives an open loop with Poisson arrivals at R req/s
+(seeded), at most --concurrency in flight. --rate 0 gives a closed loop:
+--concurrency clients, each sending the next request as soon as the last
+one returns.
+
+Trace format (--trace, one JSON object per line):
+    {"method": "POST", "path": "/api/analyze", "json": {...}}
+    {"method": "GET", "path": "/api/analyses?limit=50", "at": 1.25}
+Optional keys: "kind" (report label, default "METHOD path"), "auth"
+(default true: send the harness user's token), and "at" (seconds from
+start). With "at" on every line and no --rate, the trace's own timing is
+replayed (scaled by --speed).
+
+Storms: --storm KIND runs the synthetic mix twice on the same target,
+first without KIND (quiet), then as given. It reports each other kind's
+p99 in both runs, e.g. whether list/get stay flat during a login storm
+(`--mix list=2,get=2,login=6 --storm login`).
+
+Usage:
+    python -m benchmarks.load --mix analyze=1,list=4,get=4,login=1 --requests 500 --concurrency 32
+    python -m benchmarks.load --mix list=2,get=2,login=6 --storm login --requests 400 --concurrency 32
+    python -m benchmarks.load --uvicorn --workers 4 --rate 50 --duration 30 --iterations 1000
+    python -m benchmarks.load --uvicorn --database-url postgresql://bench@localhost/bench --requests 1000
+    python -m benchmarks.load --trace traffic.jsonl --url http://127.0.0.1:8000 --out run.json
+    python -m benchmarks.load ... --compare previous.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.engine import make_url
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KINDS = ("analyze", "list", "get", "login")
+BENCH_USER = {
+    "username": "loadtest", "email": "loadtest@example.com", "password": "loadtest-password",
+    "first_name": "Load", "last_name": "Test",
+}
+
+
+@dataclass
+class Request:
+    kind: str
+    method: str
+    path: str
+    json: Optional[dict] = None
+    auth: bool = True
+    at: Optional[float] = None
+
+
+@dataclass
+class Sample:
+    kind: str
+    latency: float
+    status: int  # 0 for transport errors
+
+
+@dataclass
+class Run:
+    samples: List[Sample] = field(default_factory=list)
+    loop_lag: List[float] = field(default_factory=list)
+    server_loop_lag_mean: Optional[float] = None
+    elapsed: float = 0.0
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """'analyze=1,list=4' -> {'analyze': 1.0, 'list': 4.0}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in KINDS:
+            raise ValueError(f"Unknown request kind {name!r}; choose from {', '.join(KINDS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def load_trace(path: str) -> List[Request]:
+    requests = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if "method" not in entry or "path" not in entry:
+                raise ValueError(f"{path}:{number}: trace lines need 'method' and 'path'")
+            requests.append(Request(
+                kind=entry.get("kind") or f"{entry['method'].upper()} {entry['path'].split('?')[0]}",
+                method=entry["method"].upper(),
+                path=entry["path"],
+                json=entry.get("json"),
+                auth=entry.get("auth", True),
+                at=entry.get("at"),
+            ))
+    return requests
+
+
+class Synthetic:
+    """Seeded generator of analyze/list/get/login requests"""
+
+    def __init__(self, mix: Dict[str, float], iterations: int, seed: int):
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.iterations = iterations
+        self.random = random.Random(seed)
+        self.known_ids: List[int] = []
+
+    def analyze(self) -> Request:
+        r = self.random
+        return Request("analyze", "POST", "/api/analyze", json={
+            "latitude": round(r.uniform(-60, 60), 3),
+            "longitude": round(r.uniform(-180, 180), 3),
+            "surface_area": round(r.uniform(0.5, 500), 2),
+            "reservoir_age": r.randint(1, 80),
+            "trophic_status": r.choice(("Oligotrophic", "Mesotrophic", "Eutrophic", "Hypereutrophic")),
+            "run_uncertainty": True,
+            "run_sensitivity": r.random() < 0.5,
+            "uncertainty_iterations": self.iterations,
+        })
+
+    def next(self) -> Request:
+        kind = self.random.choices(self.kinds, self.weights)[0]
+        if kind == "analyze" or (kind == "get" and not self.known_ids):
+            return self.analyze()
+        if kind == "list":
+            return Request("list", "GET", "/api/analyses?limit=50")
+        if kind == "get":
+            return Request("get", "GET", f"/api/analyses/{self.random.choice(self.known_ids)}")
+        return Request("login", "POST", "/api/auth/login", auth=False, json={
+            "username": BENCH_USER["username"], "password": BENCH_USER["password"],
+        })
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "p50_ms": pick(0.50) * 1000,
+        "p90_ms": pick(0.90) * 1000,
+        "p95_ms": pick(0.95) * 1000,
+        "p99_ms": pick(0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+    }
+
+
+def summarize(run: Run) -> Dict:
+    by_kind: Dict[str, List[Sample]] = {}
+    for sample in run.samples:
+        by_kind.setdefault(sample.kind, []).append(sample)
+
+    def block(samples: List[Sample]) -> Dict:
+        errors = sum(1 for s in samples if s.status == 0 or s.status >= 400)
+        return {
+            "requests": len(samples),
+            "errors": errors,
+            "error_rate": errors / len(samples) if samples else 0.0,
+            **percentiles([s.latency for s in samples]),
+        }
+
+    return {
+        "elapsed_s": run.elapsed,
+        "throughput_rps": len(run.samples) / run.elapsed if run.elapsed else 0.0,
+        "overall": block(run.samples),
+        "by_kind": {kind: block(samples) for kind, samples in sorted(by_kind.items())},
+        "event_loop_lag": (
+            {"mean_ms": run.server_loop_lag_mean * 1000, "source": "server /metrics"}
+            if run.server_loop_lag_mean is not None
+            else {**percentiles(run.loop_lag), "source": "in-process"}
+        ),
+    }
+
+
+async def _sample_loop_lag(out: List[float], interval: float = 0.01) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        out.append(max(0.0, loop.time() - start - interval))
+
+
+async def _ensure_user(client) -> str:
+    """Register (or log in) the harness user; return a bearer token"""
+    response = await client.post("/api/auth/register", json=BENCH_USER)
+    if response.status_code != 200:
+        response = await client.post("/api/auth/login", json={
+            "username": BENCH_USER["username"], "password": BENCH_USER["password"],
+        })
+        response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def drive(client, source, args, run: Run) -> None:
+    """Send requests from `source` (a trace list or Synthetic) and record samples"""
+    token = await _ensure_user(client)
+    auth_headers = {"Authorization": f"Bearer {token}"}
+
+    synthetic = source if isinstance(source, Synthetic) else None
+    if synthetic is not None and "get" in synthetic.kinds:
+        # A few rows so "get" has ids to fetch from the first request on
+        for _ in range(min(5, args.concurrency)):
+            response = await client.post("/api/analyze", json=synthetic.analyze().json, headers=auth_headers)
+            if response.status_code == 200:
+                synthetic.known_ids.append(response.json()["id"])
+
+    limit = args.requests if synthetic is not None else len(source)
+    deadline = args.duration
+    semaphore = asyncio.Semaphore(args.concurrency)
+    rng = random.Random(args.seed + 1)
+    start = time.perf_counter()
+
+    def next_request(index: int) -> Optional[Request]:
+        if limit and index >= limit:
+            return None
+        if deadline and time.perf_counter() - start >= deadline:
+            return None
+        return synthetic.next() if synthetic is not None else source[index]
+
+    async def send(request: Request, scheduled: float) -> None:
+        headers = auth_headers if request.auth else {}
+        try:
+            response = await client.request(request.method, request.path, json=request.json, headers=headers)
+            status = response.status_code
+            if synthetic is not None and request.kind == "analyze" and status == 200:
+                synthetic.known_ids.append(response.json()["id"])
+        except Exception:
+            status = 0
+        run.samples.append(Sample(request.kind, time.perf_counter() - scheduled, status))
+
+    replay_timing = synthetic is None and not args.rate and all(r.at is not None for r in source)
+
+    if args.rate or replay_timing:
+        # Open loop: arrivals follow the schedule whether or not earlier requests finished
+        tasks = []
+        arrival = 0.0
+        index = 0
+        while True:
+            request = next_request(index)
+            if request is None:
+                break
+            if replay_timing:
+                arrival = request.at / args.speed
+            else:
+                arrival += rng.expovariate(args.rate)
+            delay = start + arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            scheduled = start + arrival
+
+            async def bounded(request=request, scheduled=scheduled):
+                async with semaphore:
+                    await send(request, scheduled)
+
+            tasks.append(asyncio.create_task(bounded()))
+            index += 1
+        await asyncio.gather(*tasks)
+    else:
+        counter = iter(range(sys.maxsize))
+
+        async def worker():
+            while True:
+                request = next_request(next(counter))
+                if request is None:
+                    return
+                await send(request, time.perf_counter())
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+    run.elapsed = time.perf_counter() - start
+
+
+def _temporary_database() -> str:
+    return "sqlite:///" + os.path.join(tempfile.mkdtemp(), "load.db")
+
+
+async def run_in_process(source, args, database_url: str) -> Run:
+    import httpx
+
+    if "app.database" not in sys.modules:
+        # Read at import: the first run decides for the process
+        os.environ["DATABASE_URL"] = database_url
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+    from app import migrations
+    from app.database import engine
+    from app.main import app
+
+    migrations.upgrade(engine)
+    run = Run()
+    await app.router.startup()
+    lag_task = asyncio.create_task(_sample_loop_lag(run.loop_lag))
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=args.timeout) as client:
+            await drive(client, source, args, run)
+    finally:
+        lag_task.cancel()
+        await app.router.shutdown()
+    return run
+
+
+def _scrape_loop_lag(base_url: str) -> Dict[str, float]:
+    """(sum, count) of the server's event-loop lag histogram"""
+    values = {"sum": 0.0, "count": 0.0}
+    try:
+        with urllib.request.urlopen(base_url + "/metrics", timeout=5) as response:
+            for line in response.read().decode().splitlines():
+                for key in values:
+                    if line.startswith(f"reservoir_event_loop_lag_seconds_{key} "):
+                        values[key] += float(line.split()[-1])
+    except OSError:
+        pass
+    return values
+
+
+async def run_against(base_url: str, source, args) -> Run:
+    import httpx
+
+    run = Run()
+    before = _scrape_loop_lag(base_url)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+        await drive(client, source, args, run)
+    after = _scrape_loop_lag(base_url)
+    count = after["count"] - before["count"]
+    if count > 0:
+        # Only the worker that answered the scrape is seen
+        run.server_loop_lag_mean = (after["sum"] - before["sum"]) / count
+    return run
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_uvicorn(workers: int, database_url: str):
+    env = dict(os.environ)
+    env["DATABASE_URL"] = database_url
+    env.pop("ASYNC_DATABASE_URL", None)
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    subprocess.check_call([sys.executable, "-m", "app.migrations"], cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            with urllib.request.urlopen(base_url + "/health", timeout=1):
+                return server, base_url
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise TimeoutError("uvicorn did not become healthy")
+
+
+def storm_comparison(quiet: Dict, storm: Dict, kind: str) -> Dict[str, Dict]:
+    """p99 of every other request kind in the quiet run and during the `kind` storm"""
+    rows = {}
+    for other, block in storm["by_kind"].items():
+        if other == kind or other not in quiet["by_kind"]:
+            continue
+        before = quiet["by_kind"][other].get("p99_ms")
+        during = block.get("p99_ms")
+        rows[other] = {
+            "quiet_p99_ms": before,
+            "storm_p99_ms": during,
+            "ratio": during / before if before and during is not None else None,
+        }
+    return rows
+
+
+def print_report(report: Dict, previous: Optional[Dict] = None) -> None:
+    results = report["results"]
+    print(f"{results['overall']['requests']} requests in {results['elapsed_s']:.2f}s: "
+          f"{results['throughput_rps']:.1f} req/s, error rate {results['overall']['error_rate']:.2%}")
+    header = f"{'kind':<24} {'n':>6} {'err%':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    print(header)
+    for kind, block in list(results["by_kind"].items()) + [("overall", results["overall"])]:
+        if not block["requests"]:
+            continue
+        print(f"{kind:<24} {block['requests']:>6} {block['error_rate'] * 100:>6.1f} "
+              f"{block['p50_ms']:>9.1f} {block['p95_ms']:>9.1f} {block['p99_ms']:>9.1f} {block['max_ms']:>9.1f}")
+    lag = results["event_loop_lag"]
+    if "p99_ms" in lag:
+        print(f"event-loop lag: mean {lag['mean_ms']:.2f} ms, p99 {lag['p99_ms']:.2f} ms, max {lag['max_ms']:.2f} ms")
+    elif "mean_ms" in lag:
+        print(f"event-loop lag ({lag['source']}): mean {lag['mean_ms']:.2f} ms")
+
+    if "storm" in report:
+        storm = report["storm"]
+        print(f"\nduring the {storm['kind']} storm (p99 ms, quiet -> storm):")
+        for kind, row in storm["others"].items():
+            ratio = f" ({row['ratio']:.2f}x)" if row["ratio"] is not None else ""
+            print(f"  {kind:<22} {row['quiet_p99_ms']:9.1f} -> {row['storm_p99_ms']:9.1f}{ratio}")
+
+    if previous:
+        old = previous["results"]
+        print(f"\nvs {previous['config'].get('label') or 'previous run'}:")
+        print(f"  throughput {old['throughput_rps']:.1f} -> {results['throughput_rps']:.1f} req/s")
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if key in old["overall"] and key in results["overall"]:
+                print(f"  overall {key}: {old['overall'][key]:.1f} -> {results['overall'][key]:.1f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--trace", help="JSONL file of requests to replay")
+    source.add_argument("--mix", default="analyze=1,list=4,get=4,login=1",
+                        help="synthetic mix weights (default %(default)s)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="base URL of a running server")
+    target.add_argument("--uvicorn", action="store_true", help="spawn a local uvicorn")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (with --uvicorn)")
+    parser.add_argument("--database-url",
+                        help="database to migrate and load instead of a throwaway SQLite file (not with --url)")
+    parser.add_argument("--concurrency", type=int, default=16, help="max requests in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="arrivals per second; 0 = closed loop")
+    parser.add_argument("--requests", type=int, default=200, help="synthetic requests to send (0 = no cap)")
+    parser.add_argument("--duration", type=float, default=0.0, help="stop scheduling after N seconds")
+    parser.add_argument("--speed", type=float, default=1.0, help="trace replay speed-up")
+    parser.add_argument("--iterations", type=int, default=1000, help="Monte Carlo iterations per analyze")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--storm", choices=KINDS,
+                        help="also run the mix without this kind first and compare the other kinds' p99")
+    parser.add_argument("--label", help="name for this configuration in the report")
+    parser.add_argument("--out", help="write the report as JSON")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    workloads = []
+    if args.trace:
+        if args.storm:
+            parser.error("--storm needs a synthetic --mix")
+        workloads.append(load_trace(args.trace))
+    else:
+        mix = parse_mix(args.mix)
+        if args.storm:
+            quiet = {kind: weight for kind, weight in mix.items() if kind != args.storm}
+            if not quiet or args.storm not in mix:
+                parser.error("--storm KIND needs KIND and at least one other kind in --mix")
+            workloads.append(Synthetic(quiet, args.iterations, args.seed))
+        workloads.append(Synthetic(mix, args.iterations, args.seed))
+    if not args.requests and not args.duration and not args.trace:
+        parser.error("a synthetic run needs --requests or --duration")
+    if args.url and args.database_url:
+        parser.error("--database-url does not apply to a running server (--url)")
+    database_url = args.database_url or _temporary_database()
+
+    server = None
+    runs = []
+    try:
+        if args.uvicorn:
+            server, base_url = spawn_uvicorn(args.workers, database_url)
+        for workload in workloads:
+            if args.uvicorn:
+                runs.append(asyncio.run(run_against(base_url, workload, args)))
+            elif args.url:
+                runs.append(asyncio.run(run_against(args.url.rstrip("/"), workload, args)))
+            else:
+                runs.append(asyncio.run(run_in_process(workload, args, database_url)))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    run = runs[-1]
+
+    config = {key: value for key, value in vars(args).items() if key not in ("out", "compare", "database_url")}
+    if not args.url:
+        config["database"] = (
+            make_url(args.database_url).render_as_string(hide_password=True) if args.database_url else "temporary sqlite"
+        )
+    config["target"] = "uvicorn" if args.uvicorn else ("url" if args.url else "in-process")
+    config["environment"] = {
+        key: value for key, value in os.environ.items()
+        if key.startswith(("SQLITE_", "DB_", "WRITE_BEHIND", "AUTH_HASH"))
+    }
+    report = {"created_at": datetime.utcnow().isoformat() + "Z", "config": config, "results": summarize(run)}
+    if args.storm:
+        quiet = summarize(runs[0])
+        report["storm"] = {
+            "kind": args.storm,
+            "quiet": quiet,
+            "others": storm_comparison(quiet, report["results"], args.storm),
+        }
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    print_report(report, previous)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Analysis response serialization benchmark: pydantic + json vs app.responses
+
+Builds one analysis with uncertainty and sensitivity results, then times
+rendering its response body the way the analyze/get routes used to
+(AnalysisResponse model, `jsonable_encoder`, standard JSONResponse) and
+the way they do now (plain payload, AnalysisJSONResponse), in the full
+and compact views and with a `fields=` selection. Reports time per
+response and body size.
+
+Usage:
+    python -m benchmarks.serialization [--repeat 5000]
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import responses, schemas
+from app.analysis import run_full_analysis
+from app.ipcc_tier1 import calculate_ipcc_tier1_emissions
+
+FIELDS = "id,emissions.co2_equivalent,uncertainty.CO2_equivalent"
+
+
+def _analysis():
+    ipcc = calculate_ipcc_tier1_emissions(
+        surface_area_ha=1200.0, latitude=30.5, trophic_status="Eutrophic", reservoir_age=35.0
+    )
+    uncertainty, sensitivity = run_full_analysis(
+        surface_area=12.0, ch4_ef=ipcc["EF_CH4_age_le_20"] * 100, co2_ef=ipcc["EF_CO2_age_le_20"] * 100,
+        n2o_ef=0.0, run_uncertainty=True, run_sensitivity=True, iterations=1000
+    )
+    emissions = {
+        "total_ch4_emissions": ipcc["E_CH4"] * 1000,
+        "total_co2_emissions": ipcc["E_CO2"] * 1000,
+        "co2_equivalent": ipcc["E_total"] * 1000,
+        "ch4_emission_factor": ipcc["EF_CH4_age_le_20"],
+        "co2_emission_factor": ipcc["EF_CO2_age_le_20"],
+        "climate_region": ipcc["climate_region"],
+        "trophic_status": "Eutrophic",
+        "ipcc_tier1_results": ipcc,
+    }
+    return dict(
+        analysis_id=123456, created_at=datetime.utcnow(), latitude=30.5, longitude=114.3, surface_area=12.0,
+        climate_region=ipcc["climate_region"], trophic_status="Eutrophic",
+        emissions=emissions, uncertainty=uncertainty, sensitivity=sensitivity,
+    )
+
+
+def _before(analysis) -> bytes:
+    model = schemas.AnalysisResponse(
+        id=analysis["analysis_id"], created_at=analysis["created_at"],
+        latitude=analysis["latitude"], longitude=analysis["longitude"], surface_area=analysis["surface_area"],
+        climate_region=analysis["climate_region"], trophic_status=analysis["trophic_status"],
+        emissions=schemas.EmissionResults(**analysis["emissions"]),
+        uncertainty=analysis["uncertainty"], sensitivity=analysis["sensitivity"],
+    )
+    return JSONResponse(jsonable_encoder(model)).body
+
+
+def _after(analysis, fields=None, view="full") -> bytes:
+    payload = responses.shape(responses.analysis_payload(**analysis), fields, view)
+    return responses.AnalysisJSONResponse(payload).body
+
+
+def _time(render, repeat: int):
+    body = render()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        render()
+    return (time.perf_counter() - start) / repeat, len(body)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    analysis = _analysis()
+    encoder = "orjson" if responses.orjson is not None else "json"
+    cases = {
+        "pydantic + json (before)": lambda: _before(analysis),
+        f"payload + {encoder}, full": lambda: _after(analysis),
+        f"payload + {encoder}, compact": lambda: _after(analysis, view="compact"),
+        f"payload + {encoder}, fields=": lambda: _after(analysis, fields=FIELDS),
+    }
+    baseline = None
+    for name, render in cases.items():
+        seconds, size = _time(render, args.repeat)
+        baseline = baseline or seconds
+        print(f"{name:>30}: {seconds * 1e6:8.1f} us/response ({baseline / seconds:5.1f}x)  {size:6,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark
+
+Measures, in fresh interpreters:
+  * import time of `app.main`
+  * time from launching uvicorn to the first successful `/health` response
+
+and fails (exit code 1) when the median exceeds the budget.
+
+Usage:
+    python -m benchmarks.startup [--runs 5] [--import-budget 1.75] [--health-budget 3.0]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def measure_import(env) -> float:
+    """Seconds to import app.main in a fresh interpreter"""
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=env)
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_health(env, timeout: float = 30.0) -> float:
+    """Seconds from spawning uvicorn to the first 200 from /health"""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"/health did not respond within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget", type=float, default=1.75, help="seconds (median)")
+    parser.add_argument("--health-budget", type=float, default=3.0, help="seconds (median)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    env = _env()
+    import_times = [measure_import(env) for _ in range(args.runs)]
+    health_times = [measure_first_health(env) for _ in range(args.runs)]
+
+    results = {
+        "import_app_main_s": {
+            "median": statistics.median(import_times),
+            "max": max(import_times),
+            "budget": args.import_budget,
+        },
+        "first_health_s": {
+            "median": statistics.median(health_times),
+            "max": max(health_times),
+            "budget": args.health_budget,
+        },
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, result in results.items():
+            status = "✅" if result["median"] <= result["budget"] else "❌"
+            print(f"{status} {name}: median {result['median']:.3f}s, "
+                  f"max {result['max']:.3f}s (budget {result['budget']:.2f}s)")
+
+    over_budget = any(result["median"] > result["budget"] for result in results.values())
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
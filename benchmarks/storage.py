@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Storage size and scan-time benchmark: legacy JSON columns vs packed results
+
+Writes the same synthetic analyses once into the legacy JSON columns and once
+through the ORM (packed binary + analysis_statistics), then compares stored
+result bytes per row, database file size (the packed file also holds
+analysis_statistics and its index), a full decode scan of the results and a
+cross-analysis aggregate (JSON scan in Python vs indexed SQL).
+
+Usage:
+    python -m benchmarks.storage [--rows 1000000] [--batch 5000]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.orm import sessionmaker
+
+from app import codecs, models, statistics
+from app.database import build_engine
+
+
+def _results(i: int):
+    scale = 1.0 + (i % 997) / 997
+    uncertainty = {
+        output: {stat: scale * (k + 1) * 1000.0 for k, stat in enumerate(codecs.UNCERTAINTY_STATS)}
+        for output in codecs.UNCERTAINTY_OUTPUTS
+    }
+    sensitivity = [
+        {"parameter": name, "correlation": 0.9 / (k + 1), "rank_correlation": 0.8 / (k + 1)}
+        for k, name in enumerate(codecs.SENSITIVITY_PARAMETERS)
+    ]
+    return uncertainty, sensitivity
+
+
+def _base(i: int) -> dict:
+    return {
+        "created_at": datetime.utcnow(),
+        "latitude": 30.0,
+        "longitude": 110.0,
+        "surface_area": 10.0 + i % 50,
+    }
+
+
+def _fill_legacy(engine, rows: int, batch: int) -> None:
+    table = models.ReservoirAnalysis.__table__
+    for start in range(0, rows, batch):
+        values = []
+        for i in range(start, min(rows, start + batch)):
+            uncertainty, sensitivity = _results(i)
+            values.append({
+                **_base(i),
+                "uncertainty_analysis": uncertainty,
+                "sensitivity_analysis": sensitivity,
+                "user_inputs": {"surface_area": 10.0 + i % 50, "run_uncertainty": True},
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(table), values)
+
+
+def _fill_packed(engine, rows: int, batch: int) -> None:
+    Session = sessionmaker(bind=engine)
+    for start in range(0, rows, batch):
+        with Session() as session:
+            for i in range(start, min(rows, start + batch)):
+                uncertainty, sensitivity = _results(i)
+                session.add(models.ReservoirAnalysis(
+                    **_base(i),
+                    uncertainty_analysis=uncertainty,
+                    sensitivity_analysis=sensitivity,
+                    user_inputs={"surface_area": 10.0 + i % 50, "run_uncertainty": True},
+                ))
+            session.commit()
+
+
+def _measure(engine, path: str, rows: int, legacy: bool) -> dict:
+    table = models.ReservoirAnalysis.__table__
+    if legacy:
+        columns = (table.c.uncertainty_analysis, table.c.sensitivity_analysis, table.c.user_inputs)
+    else:
+        columns = (table.c.uncertainty_packed, table.c.sensitivity_packed, table.c.user_inputs_packed)
+    column = columns[0]
+
+    with engine.connect() as conn:
+        conn.execute(text("VACUUM"))
+        result_bytes = conn.execute(
+            select(func.sum(sum(func.length(c) for c in columns)))
+        ).scalar()
+        start = time.perf_counter()
+        decoded = 0
+        for (value,) in conn.execution_options(yield_per=5000).execute(select(column)):
+            decoded += value is not None
+        scan = time.perf_counter() - start  # both column types decode on read
+
+        start = time.perf_counter()
+        if legacy:
+            values = [
+                value["CO2_equivalent"]["mean"]
+                for (value,) in conn.execute(select(column))
+            ]
+            mean = sum(values) / len(values)
+        else:
+            with sessionmaker(bind=conn)() as db:
+                mean = statistics.summarize(db, "CO2_equivalent", "mean")["mean"]
+        aggregate = time.perf_counter() - start
+
+    return {
+        "size_mb": os.path.getsize(path) / 1e6,
+        "bytes_per_row": result_bytes / rows,
+        "scan_s": scan,
+        "aggregate_s": aggregate,
+        "decoded": decoded,
+        "mean": mean,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=5000)
+    args = parser.parse_args()
+
+    results = {}
+    for name, fill, legacy in (("legacy JSON", _fill_legacy, True), ("packed", _fill_packed, False)):
+        path = os.path.join(tempfile.mkdtemp(), "storage.db")
+        engine = build_engine("sqlite:///" + path)
+        models.Base.metadata.create_all(bind=engine)
+        fill(engine, args.rows, args.batch)
+        results[name] = _measure(engine, path, args.rows, legacy)
+        engine.dispose()
+
+    print(f"{args.rows} analyses")
+    print(f"{'storage':<12} {'result B/row':>12} {'file MB':>9} {'scan s':>8} {'aggregate s':>12}")
+    for name, r in results.items():
+        print(
+            f"{name:<12} {r['bytes_per_row']:>12.0f} {r['size_mb']:>9.1f} "
+            f"{r['scan_s']:>8.2f} {r['aggregate_s']:>12.3f}"
+        )
+
+    legacy, packed = results["legacy JSON"], results["packed"]
+    print(
+        f"scan {legacy['scan_s'] / packed['scan_s']:.1f}x faster, "
+        f"aggregate {legacy['aggregate_s'] / packed['aggregate_s']:.1f}x faster"
+    )
+
+
+if __name__ == "__main__":
+    main()
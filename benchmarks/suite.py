@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Micro and macro benchmark suite with JSON baselines
+
+Micro: the calculation core. Tier 1 emissions, emission factor lookup and
+trophic assessment run as loops of 100/1000/10000 calls. The Monte Carlo
+uncertainty and sensitivity analyses run at 100/1000/10000 iterations.
+
+Macro: in-process POST /api/analyze and GET /api/analyses through the ASGI
+app (httpx transport, no network), against a throwaway SQLite database
+seeded with one user's analyses.
+
+Each case is timed `--repeat` times and the median is recorded. `--save`
+writes the results as the baseline. `--check` compares them with the
+baseline and fails (exit code 1) when any case is slower than
+`--threshold` times its baseline median. Baselines are machine-specific:
+save one on the machine that runs the check.
+
+Usage:
+    python -m benchmarks.suite [--only micro|macro] [--repeat 5]
+    python -m benchmarks.suite --save [--baseline benchmarks/baselines/suite.json]
+    python -m benchmarks.suite --check [--threshold 1.5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "suite.json")
+DEFAULT_THRESHOLD = float(os.getenv("BENCH_THRESHOLD", "1.5"))
+SIZES = (100, 1000, 10000)
+
+Case = Tuple[str, Callable[[], None]]
+
+
+def micro_cases() -> List[Case]:
+    from app.analysis import SensitivityAnalysis, UncertaintyAnalysis
+    from app.ipcc_tier1 import assess_trophic_status, calculate_ipcc_tier1_emissions, get_emission_factors
+
+    regions = ("温暖湿润区", "炎热潮湿区", "寒冷湿润区")
+    trophic = ("Oligotrophic", "Mesotrophic", "Eutrophic", "Hypereutrophic")
+
+    def tier1(n):
+        def run():
+            for i in range(n):
+                calculate_ipcc_tier1_emissions(
+                    surface_area_ha=100.0 + i % 500,
+                    latitude=-60.0 + (i % 120),
+                    trophic_status=trophic[i % 4],
+                    reservoir_age=1.0 + i % 40,
+                )
+        return run
+
+    def factors(n):
+        def run():
+            for i in range(n):
+                get_emission_factors(regions[i % 3], trophic[i % 4], 1.0 + i % 40)
+        return run
+
+    def assess(n):
+        def run():
+            for i in range(n):
+                assess_trophic_status(
+                    total_phosphorus=0.005 + (i % 100) / 1000,
+                    total_nitrogen=0.2 + (i % 50) / 10,
+                    chlorophyll_a=1.0 + i % 60,
+                    secchi_depth=0.5 + (i % 20) / 4,
+                )
+        return run
+
+    def uncertainty(n):
+        return lambda: UncertaintyAnalysis(iterations=n).run(100.0, 50.0, 500.0, 0.0)
+
+    def sensitivity(n):
+        return lambda: SensitivityAnalysis(iterations=n).run(100.0, 50.0, 500.0, 0.0)
+
+    cases = []
+    for n in SIZES:
+        cases += [
+            (f"calculate_ipcc_tier1_emissions[x{n}]", tier1(n)),
+            (f"get_emission_factors[x{n}]", factors(n)),
+            (f"assess_trophic_status[x{n}]", assess(n)),
+            (f"UncertaintyAnalysis[{n} iterations]", uncertainty(n)),
+            (f"SensitivityAnalysis[{n} iterations]", sensitivity(n)),
+        ]
+    return cases
+
+
+def macro_cases(seed_rows: int = 2000) -> List[Case]:
+    """ASGI cases; must run before anything else imports app.database"""
+    if "app.database" in sys.modules:
+        # The engine is already bound to DATABASE_URL, possibly a real database
+        raise RuntimeError("macro_cases() must run before app.database is imported")
+    # Always a throwaway database, even if DATABASE_URL names a real one
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "suite.db")
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+
+    import httpx
+    from app import auth, migrations, models
+    from app.database import SessionLocal, engine
+    from app.main import app
+
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        user = auth.get_user_by_username(db, "bench")
+        if user is None:
+            user = models.User(username="bench", email="bench@example.com", hashed_password="-")
+            db.add(user)
+            db.commit()
+        db.add_all([
+            models.ReservoirAnalysis(
+                user_id=user.id, latitude=30.0, longitude=110.0, climate_region="温暖湿润区",
+                trophic_status="Mesotrophic", surface_area=10.0, co2_equivalent=float(i),
+            )
+            for i in range(seed_rows)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+    headers = {"Authorization": f"Bearer {auth.create_access_token(data={'sub': 'bench'})}"}
+    payload = {
+        "latitude": 30.5, "longitude": 114.3, "surface_area": 12.0, "reservoir_age": 15,
+        "water_quality": {"total_phosphorus": 0.02, "chlorophyll_a": 5.0},
+        "run_uncertainty": True, "run_sensitivity": True, "uncertainty_iterations": 1000,
+    }
+    loop = asyncio.new_event_loop()
+
+    def request(method: str, url: str, count: int, **kwargs):
+        async def go():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                for _ in range(count):
+                    response = await client.request(method, url, headers=headers, **kwargs)
+                    response.raise_for_status()
+        return lambda: loop.run_until_complete(go())
+
+    return [
+        ("POST /api/analyze[x20]", request("POST", "/api/analyze", 20, json=payload)),
+        ("GET /api/analyses?limit=100[x50]", request("GET", "/api/analyses?limit=100", 50)),
+    ]
+
+
+def run_cases(cases: List[Case], repeat: int) -> Dict[str, Dict]:
+    results = {}
+    for name, func in cases:
+        func()  # warm-up: imports, caches, first-call allocation
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        results[name] = {"median_s": statistics.median(times), "min_s": min(times), "runs": repeat}
+        print(f"{name:<42} {results[name]['median_s'] * 1000:10.2f} ms", flush=True)
+    return results
+
+
+def compare(baseline: Dict[str, Dict], current: Dict[str, Dict], threshold: float) -> List[Dict]:
+    """Per-case ratio of current to baseline median; `regressed` above `threshold`"""
+    rows = []
+    for name, result in current.items():
+        base = baseline.get(name)
+        ratio = result["median_s"] / base["median_s"] if base and base["median_s"] > 0 else None
+        rows.append({
+            "name": name,
+            "baseline_s": base["median_s"] if base else None,
+            "current_s": result["median_s"],
+            "ratio": ratio,
+            "regressed": ratio is not None and ratio > threshold,
+        })
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", choices=("micro", "macro"))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown factor (default 1.5 or $BENCH_THRESHOLD)")
+    args = parser.parse_args(argv)
+
+    cases = []
+    if args.only != "micro":
+        cases += macro_cases()
+    if args.only != "macro":
+        cases += micro_cases()
+    results = run_cases(cases, args.repeat)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "meta": {
+                    "created_at": datetime.utcnow().isoformat() + "Z",
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "repeat": args.repeat,
+                },
+                "results": results,
+            }, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+
+    if not args.check:
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    rows = compare(baseline, results, args.threshold)
+    print(f"\nAgainst {args.baseline} (threshold {args.threshold:.2f}x):")
+    for row in rows:
+        if row["ratio"] is None:
+            print(f"  ·  {row['name']}: no baseline")
+            continue
+        status = "❌" if row["regressed"] else "✅"
+        print(f"  {status} {row['name']}: {row['ratio']:.2f}x")
+    return 1 if any(row["regressed"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Insert-throughput benchmark: per-request commits vs the write-behind persister
+
+Simulates N concurrent analyze requests persisting their rows, first with
+one commit per row (the default path) and then through
+`WriteBehindPersister` in "group" and "async" durability modes.
+
+Usage:
+    python -m benchmarks.write_behind [--concurrency 64] [--rows 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app import migrations, models
+from app.database import build_engine
+from app.persistence import WriteBehindPersister
+from sqlalchemy.orm import sessionmaker
+
+
+def _values(i: int) -> dict:
+    return dict(
+        latitude=30.0,
+        longitude=110.0,
+        climate_region="温暖湿润区",
+        trophic_status="Mesotrophic",
+        surface_area=10.0,
+        reservoir_age=20.0,
+        co2_equivalent=float(i),
+        uncertainty_analysis={"CO2": {"mean": 1.0, "std": 0.1}},
+        user_inputs={"latitude": 30.0, "surface_area": 10.0},
+    )
+
+
+def _fresh_engine():
+    engine = build_engine("sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+    migrations.upgrade(engine)
+    return engine
+
+
+async def _drive(submit, rows: int, concurrency: int) -> float:
+    """Run `rows` submissions with at most `concurrency` in flight; return seconds"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await submit(_values(i))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(rows)))
+    return time.perf_counter() - start
+
+
+async def bench_direct(rows: int, concurrency: int) -> float:
+    engine = _fresh_engine()
+    Session = sessionmaker(bind=engine)
+
+    def insert_one(values):
+        session = Session()
+        try:
+            session.add(models.ReservoirAnalysis(**values))
+            session.commit()
+        finally:
+            session.close()
+
+    async def submit(values):
+        await asyncio.to_thread(insert_one, values)
+
+    return await _drive(submit, rows, concurrency)
+
+
+async def bench_write_behind(rows: int, concurrency: int, durability: str) -> float:
+    persister = WriteBehindPersister(_fresh_engine(), durability=durability)
+    await persister.start()
+    start = time.perf_counter()
+    await _drive(persister.submit, rows, concurrency)
+    await persister.stop()  # include the final drain in the measurement
+    return time.perf_counter() - start
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    results = {
+        "direct commit": asyncio.run(bench_direct(args.rows, args.concurrency)),
+        "write-behind (group)": asyncio.run(bench_write_behind(args.rows, args.concurrency, "group")),
+        "write-behind (async)": asyncio.run(bench_write_behind(args.rows, args.concurrency, "async")),
+    }
+    baseline = args.rows / results["direct commit"]
+    for name, seconds in results.items():
+        rate = args.rows / seconds
+        print(f"{name:>22}: {rate:9.1f} rows/s  ({rate / baseline:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
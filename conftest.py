@@ -0,0 +1,18 @@
+"""
+Shared pytest setup: point the app at a throwaway SQLite database
+
+The suite deletes and rewrites rows, so the database is always replaced,
+even when DATABASE_URL is set (docker-compose sets it to the real one).
+"""
+
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="reservoir-test-"), "test.db")
+# Derived from DATABASE_URL by app.database
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+from app import migrations  # noqa: E402
+from app.database import engine  # noqa: E402
+
+migrations.upgrade(engine)
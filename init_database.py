@@ -9,14 +9,15 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app.database import engine, SessionLocal
-from app.models import Base, User
+from app.models import User
+from app import migrations
 from app.auth import get_password_hash
 from sqlalchemy.orm import Session
 
 def create_tables():
     """Create all database tables"""
     print("🔧 创建数据库表...")
-    Base.metadata.create_all(bind=engine)
+    migrations.upgrade(engine)
     print("✅ 数据库表创建完成")
 
 def create_demo_user():
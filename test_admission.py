@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test cost-based admission control for analyze requests
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import admission
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_cost_and_degrade():
+    assert admission.cost((False, False, 5000)) == 0
+    assert admission.cost((True, False, 1000)) == admission.UNCERTAINTY_OVERHEAD + 1000
+    assert admission.cost((True, True, 1000)) == admission.UNCERTAINTY_OVERHEAD + admission.SENSITIVITY_OVERHEAD + 2000
+
+    plan = (True, True, 10_000)
+    assert admission.degrade(plan, admission.cost(plan)) == plan
+    # Fewer iterations first, then no sensitivity, then nothing
+    assert admission.degrade(plan, 9_500) == (True, True, 1_000)
+    assert admission.degrade(plan, 7_500) == (True, False, 5_000)
+    assert admission.degrade(plan, 1_000) == (False, False, 10_000)
+
+
+def test_controller_queues_degrades_and_rejects():
+    async def scenario():
+        controller = admission.AdmissionController(budget=20_000, user_share=0.5, queue_timeout=0.05, max_queue=4)
+        plan = (True, False, 5_000)
+
+        first_plan, first = await controller.admit("user:1", (True, False, 4_000))
+        assert first_plan == (True, False, 4_000) and controller.in_flight == 6_500
+
+        # Same user is over its share: waits, then gets what is left of it
+        degraded_plan, second = await controller.admit("user:1", plan)
+        assert degraded_plan == (True, False, 1_000)
+        with pytest.raises(admission.Overloaded) as rejected:
+            await controller.admit("user:1", plan, allow_degraded=False)
+        assert rejected.value.status_code == 429 and rejected.value.retry_after >= 1
+
+        # A queued request is admitted as soon as capacity is released
+        waiting = asyncio.ensure_future(controller.admit("user:1", plan))
+        await asyncio.sleep(0.01)
+        assert controller.queue_depth == 1
+        first.release()
+        second.release()
+        waited_plan, waited = await waiting
+        assert waited_plan == plan and controller.queue_depth == 0
+
+        # Global budget used up by other users: 503
+        _, other = await controller.admit("user:2", (True, False, 7_500))
+        with pytest.raises(admission.Overloaded) as rejected:
+            await controller.admit("user:3", plan, allow_degraded=False)
+        assert rejected.value.status_code == 503
+
+        # Deterministic requests never wait
+        assert await controller.admit("user:3", (False, False, 5_000)) == ((False, False, 5_000), None)
+        waited.release()
+        other.release()
+        assert controller.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_analyze_reports_degradation_and_rejection(monkeypatch):
+    controller = admission.AdmissionController(budget=8_000, queue_timeout=0)
+    monkeypatch.setattr(admission, "controller", controller)
+    body = {
+        "latitude": 61.2, "longitude": -149.9, "surface_area": 2.0, "reservoir_age": 12,
+        "run_sensitivity": True, "uncertainty_iterations": 1000,
+    }
+
+    result = client.post("/api/analyze", json=body).json()
+    assert result["degraded"] == {
+        "reason": "overloaded", "requested_iterations": 1000, "iterations": 1000,
+        "uncertainty_skipped": False, "sensitivity_skipped": True,
+    }
+    assert result["sensitivity"] is None and result["uncertainty"] is not None
+    assert controller.in_flight == 0
+
+    response = client.post("/api/analyze", json={**body, "allow_degraded": False})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    plain = client.post("/api/analyze", json={**body, "run_sensitivity": False}).json()
+    assert plain["degraded"] is None
+
+
+def test_stream_releases_its_permit_when_the_client_disconnects_early(monkeypatch):
+    controller = admission.AdmissionController(budget=100_000)
+    monkeypatch.setattr(admission, "controller", controller)
+    body = json.dumps({
+        "latitude": 61.2, "longitude": -149.9, "surface_area": 2.0, "reservoir_age": 12,
+        "uncertainty_iterations": 1000,
+    }).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/api/analyze/stream", "raw_path": b"/api/analyze/stream", "query_string": b"",
+        "root_path": "", "headers": [(b"content-type", b"application/json"), (b"host", b"test")],
+        "client": ("127.0.0.1", 1), "server": ("test", 80),
+    }
+
+    async def scenario():
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            # Gone as soon as the request is read
+            return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                assert controller.in_flight > 0
+                await asyncio.sleep(0.05)  # the disconnect wins before the first event
+
+        await app(scope, receive, send)
+
+    asyncio.run(scenario())
+    assert controller.in_flight == 0
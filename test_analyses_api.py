@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Test the analysis listing API
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from sqlalchemy import text
+
+from app.main import app
+from app.database import SessionLocal
+from app import auth, models
+
+client = TestClient(app)
+
+
+def _user(username):
+    """Create `username` if needed; return (user id, auth headers)"""
+    db = SessionLocal()
+    try:
+        user = auth.get_user_by_username(db, username)
+        if user is None:
+            user = models.User(username=username, email=f"{username}@example.com", hashed_password="-")
+            db.add(user)
+            db.commit()
+        token = auth.create_access_token(data={"sub": username})
+        return user.id, {"Authorization": f"Bearer {token}"}
+    finally:
+        db.close()
+
+
+OWNER_ID, HEADERS = _user("owner")
+
+
+def _seed(count, climate_region="温暖湿润区", user_id=OWNER_ID):
+    """Insert `count` analyses with distinct, increasing timestamps"""
+    db = SessionLocal()
+    try:
+        db.query(models.ReservoirAnalysis).delete()
+        base = datetime(2024, 1, 1)
+        for i in range(count):
+            db.add(models.ReservoirAnalysis(
+                created_at=base + timedelta(minutes=i // 2),  # pairs share a timestamp
+                latitude=30.0,
+                longitude=110.0,
+                climate_region=climate_region if i % 2 else "炎热潮湿区",
+                trophic_status="Eutrophic",
+                surface_area=1.0 + i,
+                co2_equivalent=100.0 * i,
+                total_ch4_emissions=60.0 * i,
+                total_co2_emissions=40.0 * i,
+                ch4_emission_factor=1.0,
+                co2_emission_factor=1.0,
+                uncertainty_analysis={"CO2": {"mean": 1.0}},
+                user_id=user_id,
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_keyset_pagination_walks_all_rows_once():
+    """Following X-Next-Cursor visits every row exactly once, newest first"""
+    _seed(25)
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 10}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/analyses", params=params, headers=HEADERS)
+        assert response.status_code == 200
+        seen.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    
+    assert len(seen) == 25
+    assert len(set(seen)) == 25
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_list_filters_by_climate_region():
+    _seed(10)
+    response = client.get("/api/analyses", params={"climate_region": "炎热潮湿区"}, headers=HEADERS)
+    assert response.status_code == 200
+    items = response.json()
+    assert len(items) == 5
+    assert all(item["climate_region"] == "炎热潮湿区" for item in items)
+
+
+def test_invalid_cursor_is_rejected():
+    response = client.get("/api/analyses", params={"cursor": "not-a-cursor"}, headers=HEADERS)
+    assert response.status_code == 400
+
+
+def test_analyses_are_scoped_to_their_owner():
+    _seed(4)
+    other_id, other_headers = _user("someone-else")
+    mine = [item["id"] for item in client.get("/api/analyses", headers=HEADERS).json()]
+    assert len(mine) == 4
+    
+    assert client.get("/api/analyses").status_code == 403
+    assert client.get("/api/analyses", headers=other_headers).json() == []
+    assert client.get(f"/api/analyses/{mine[0]}", headers=other_headers).status_code == 404
+    assert client.delete(f"/api/analyses/{mine[0]}", headers=other_headers).status_code == 404
+    
+    # Result statistics aggregate the caller's analyses only
+    query = "/api/statistics?output=CO2&stat=mean"
+    assert client.get(query).status_code == 403
+    assert client.get(query, headers=HEADERS).json()["count"] == 4
+    assert client.get(query, headers=other_headers).json()["count"] == 0
+    
+    assert client.delete(f"/api/analyses/{mine[0]}", headers=HEADERS).status_code == 200
+    assert len(client.get("/api/analyses", headers=HEADERS).json()) == 3
+
+
+def test_analyze_records_the_caller_as_owner():
+    response = client.post("/api/analyze", headers=HEADERS, json={
+        "latitude": 30.5,
+        "longitude": 114.3,
+        "surface_area": 12.0,
+        "reservoir_age": 15,
+        "trophic_status": "Eutrophic",
+        "run_uncertainty": False,
+        "run_sensitivity": False,
+    })
+    assert response.status_code == 200
+    analysis_id = response.json()["id"]
+    db = SessionLocal()
+    try:
+        assert db.get(models.ReservoirAnalysis, analysis_id).user_id == OWNER_ID
+    finally:
+        db.close()
+    
+    assert client.get(f"/api/analyses/{analysis_id}", headers=HEADERS).status_code == 200
+    assert client.get(f"/api/analyses/{analysis_id}").status_code == 404
+
+
+def test_owner_listing_uses_the_user_index():
+    db = SessionLocal()
+    try:
+        plan = db.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM reservoir_analyses WHERE user_id = 1 "
+            "ORDER BY created_at DESC, id DESC LIMIT 10"
+        )).all()
+    finally:
+        db.close()
+    details = " ".join(row[-1] for row in plan)
+    assert "ix_reservoir_analyses_user_created" in details
+    assert "TEMP B-TREE" not in details
+
+
+def test_csv_export_flattens_tier1_and_uncertainty():
+    _seed(3)
+    db = SessionLocal()
+    try:
+        for analysis in db.query(models.ReservoirAnalysis):
+            analysis.reservoir_age = 30.0
+        db.commit()
+    finally:
+        db.close()
+    
+    response = client.get("/api/export/analyses", params={"format": "csv"}, headers=HEADERS)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    
+    lines = response.text.strip().splitlines()
+    header = lines[0].split(",")
+    assert len(lines) == 4
+    assert "tier1_E_total" in header
+    assert "uncertainty_CO2_mean" in header
+    
+    first = dict(zip(header, lines[1].split(",")))
+    assert float(first["tier1_E_total"]) > 0
+    assert float(first["uncertainty_CO2_mean"]) == 1.0
+
+
+def test_export_flags_tier1_recomputed_for_stale_factor_versions():
+    from app.ipcc_tier1 import FACTOR_VERSION
+    
+    _seed(2)
+    db = SessionLocal()
+    try:
+        current, stale = db.query(models.ReservoirAnalysis).order_by(models.ReservoirAnalysis.id).all()
+        current.reservoir_age = stale.reservoir_age = 30.0
+        current.factor_version = FACTOR_VERSION
+        stale.factor_version = "0" * 16
+        db.commit()
+    finally:
+        db.close()
+    
+    response = client.get("/api/export/analyses", params={"format": "csv"}, headers=HEADERS)
+    lines = response.text.strip().splitlines()
+    header = lines[0].split(",")
+    rows = [dict(zip(header, line.split(","))) for line in lines[1:]]
+    assert [row["factor_version"] for row in rows] == [FACTOR_VERSION, "0" * 16]
+    assert [row["tier1_recomputed"] for row in rows] == ["False", "True"]
+    # Still recomputed with the current factors, but flagged as such
+    assert float(rows[1]["tier1_E_total"]) > 0
+
+
+def test_parquet_export_round_trips():
+    import io
+    import pyarrow.parquet as pq
+    
+    _seed(5)
+    response = client.get(
+        "/api/export/analyses",
+        params={"format": "parquet", "climate_region": "炎热潮湿区"},
+        headers=HEADERS
+    )
+    assert response.status_code == 200
+    
+    table = pq.ParquetFile(io.BytesIO(response.content)).read(use_threads=False)
+    assert table.num_rows == 3
+    assert set(table.column("climate_region").to_pylist()) == {"炎热潮湿区"}
+    assert table.column("tier1_recomputed").to_pylist() == [False] * 3
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test archiving old analyses to Parquet and reading them back
+"""
+
+import io
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import archive, auth, export, migrations, models
+from app.database import async_url, build_async_engine, build_engine, get_async_db
+from app.main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def bind(tmp_path, monkeypatch):
+    """A database of its own: archiving strips every old analysis it finds"""
+    url = f"sqlite:///{tmp_path / 'archive.db'}"
+    bind = build_engine(url)
+    migrations.upgrade(bind)
+    async_sessions = async_sessionmaker(build_async_engine(async_url(url)), autoflush=False, expire_on_commit=False)
+
+    async def get_archive_db():
+        async with async_sessions() as db:
+            yield db
+
+    monkeypatch.setitem(app.dependency_overrides, get_async_db, get_archive_db)
+    monkeypatch.setattr(export, "SessionLocal", sessionmaker(bind=bind))
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    yield bind
+    bind.dispose()
+
+
+def test_archived_analyses_read_back_transparently(bind):
+    with Session(bind) as session:
+        session.add(models.User(username="archivist", email="archivist@example.com", hashed_password="-"))
+        session.commit()
+    headers = {"Authorization": f"Bearer {auth.create_access_token(data={'sub': 'archivist'})}"}
+    body = {
+        "latitude": 47.1, "longitude": 8.5, "surface_area": 3.0, "reservoir_age": 40,
+        "uncertainty_iterations": 100,
+    }
+    ids = [client.post("/api/analyze", headers=headers, json=body).json()["id"] for _ in range(3)]
+    # A recent analysis stays in the database
+    recent = client.post("/api/analyze", headers=headers, json=body).json()["id"]
+    before = {analysis_id: client.get(f"/api/analyses/{analysis_id}", headers=headers).json() for analysis_id in ids}
+
+    table = models.ReservoirAnalysis.__table__
+    with bind.begin() as conn:
+        for analysis_id, created_at in zip(ids, (datetime(2021, 3, 5), datetime(2021, 3, 20), datetime(2022, 1, 2))):
+            conn.execute(update(table).where(table.c.id == analysis_id).values(created_at=created_at))
+
+    assert archive.archive(bind, timedelta(days=365)) == {"analyses": 3, "partitions": 2}
+    assert os.path.exists(archive.partition_path("2021-03"))
+    with bind.connect() as conn:
+        stubs = conn.execute(
+            select(table.c.archived_month, table.c.uncertainty_packed, table.c.co2_equivalent)
+            .where(table.c.id.in_(ids + [recent])).order_by(table.c.id)
+        ).all()
+    assert [stub.archived_month for stub in stubs] == ["2021-03", "2021-03", "2022-01", None]
+    assert all(stub.uncertainty_packed is None and stub.co2_equivalent > 0 for stub in stubs[:3])
+
+    for analysis_id in ids:
+        after = client.get(f"/api/analyses/{analysis_id}", headers=headers).json()
+        assert after["uncertainty"] == before[analysis_id]["uncertainty"]
+        assert after["sensitivity"] == before[analysis_id]["sensitivity"]
+
+    csv = client.get("/api/export/analyses", headers=headers).text
+    exported = pd.read_csv(io.StringIO(csv)).set_index("id")
+    expected = before[ids[0]]["uncertainty"]["CO2_equivalent"]["mean"]
+    assert exported.loc[ids[0], "uncertainty_CO2_equivalent_mean"] == pytest.approx(expected, rel=1e-12)
+
+    # Nothing left to archive; deleted stubs are pruned from the partitions
+    assert archive.archive(bind, timedelta(days=365))["analyses"] == 0
+    client.delete(f"/api/analyses/{ids[2]}", headers=headers)
+    assert archive.prune(bind) == 1
+    assert not os.path.exists(archive.partition_path("2022-01"))
+    assert archive.load(ids[0], "2021-03")["latitude"] == 47.1
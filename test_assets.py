@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test precompressed static assets and cached page shells
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import re
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_dashboard_links_fingerprinted_immutable_assets():
+    page = client.get("/dashboard")
+    assert page.status_code == 200
+    
+    url = re.search(r'src="(/static/app\.[0-9a-f]{12}\.js)"', page.text).group(1)
+    asset = client.get(url)
+    assert asset.status_code == 200
+    assert "immutable" in asset.headers["cache-control"]
+
+
+def test_static_files_are_served_precompressed():
+    response = client.get("/static/style.css", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    
+    raw = client.get("/static/style.css", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+    assert int(response.headers["content-length"]) < len(raw.content)
+
+
+def test_page_shell_revalidates_with_etag():
+    first = client.get("/login")
+    assert first.headers["cache-control"] == "no-cache"
+    
+    again = client.get("/login", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+    assert again.content == b""
+
+
+def test_unknown_static_file_is_404():
+    assert client.get("/static/missing.js").status_code == 404
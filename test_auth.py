@@ -38,6 +38,45 @@ def test_password_hashing():
         print(f"❌ 密码哈希测试失败: {e}")
         return False
 
+def test_verified_tokens_are_cached_until_expiry():
+    """A verified token is served from the cache and never outlives its exp"""
+    from datetime import timedelta
+    from app import auth
+    
+    token = auth.create_access_token(data={"sub": "cache-user"})
+    auth.token_cache.clear()
+    assert auth.verify_token(token) == "cache-user"
+    assert auth.token_cache.get(token) == "cache-user"
+    
+    expired = auth.create_access_token(data={"sub": "old-user"}, expires_delta=timedelta(seconds=-1))
+    assert auth.verify_token(expired) is None
+    assert auth.token_cache.get(expired) is None
+
+def test_profile_cache_is_invalidated_on_update():
+    """Profile reads are cached, and a profile update is visible immediately"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+    
+    client = TestClient(app)
+    response = client.post("/api/auth/register", json={
+        "username": "cacheuser",
+        "email": "cacheuser@example.com",
+        "password": "longenough",
+        "first_name": "Cache",
+        "last_name": "User",
+    })
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    
+    assert client.get("/api/user/profile", headers=headers).json()["organization"] is None
+    client.put("/api/user/profile", headers=headers, json={"organization": "Hydro Lab"})
+    assert client.get("/api/user/profile", headers=headers).json()["organization"] == "Hydro Lab"
+    
+    login = client.post("/api/auth/login", json={"username": "cacheuser", "password": "longenough"})
+    assert login.status_code == 200
+    bad = client.post("/api/auth/login", json={"username": "cacheuser", "password": "wrong-password"})
+    assert bad.status_code == 401
+
 if __name__ == "__main__":
     success = test_password_hashing()
     sys.exit(0 if success else 1)
\ No newline at end of file
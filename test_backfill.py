@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test factor versioning and the bulk backfill of stale analyses
+"""
+
+import io
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app import backfill, ipcc_tier1, migrations, models, rollups
+from app.database import build_engine
+
+
+def _stored(trophic_status, surface_area, latitude, age, user_id):
+    """An analysis as the analyze route stores it"""
+    ipcc = ipcc_tier1.calculate_ipcc_tier1_emissions(surface_area * 100, latitude, trophic_status, age)
+    ch4_ef, co2_ef, _ = ipcc_tier1.get_emission_factors(ipcc["climate_region"], trophic_status, age)
+    return models.ReservoirAnalysis(
+        latitude=latitude, longitude=10.0, surface_area=surface_area, reservoir_age=age,
+        trophic_status=trophic_status, climate_region=ipcc["climate_region"], user_id=user_id,
+        ch4_emission_factor=ch4_ef, co2_emission_factor=co2_ef,
+        total_ch4_emissions=ipcc["E_CH4"] * 1000, total_co2_emissions=ipcc["E_CO2"] * 1000,
+        co2_equivalent=ipcc["E_total"] * 1000, factor_version=ipcc_tier1.FACTOR_VERSION,
+        created_at=datetime(2024, 1 + user_id, 15),
+    )
+
+
+def _rollups(session):
+    table = models.AnalysisRollup
+    rows = session.execute(select(
+        table.climate_region, table.trophic_status, table.user_id, table.month,
+        table.analysis_count, table.co2_equivalent_total
+    ).order_by(table.id)).all()
+    return {tuple(row[:4]): (row.analysis_count, row.co2_equivalent_total) for row in rows}
+
+
+def test_backfill_recomputes_stale_rows_and_rollups(tmp_path, monkeypatch):
+    bind = build_engine(f"sqlite:///{tmp_path / 'backfill.db'}")
+    migrations.upgrade(bind)
+    cases = [
+        ("Eutrophic", 12.0, 30.5, 35.0, 1), ("Oligotrophic", 0.8, 12.0, 8.0, 2),
+        (None, 150.0, -41.0, 20.0, 1), ("Hypereutrophic", 3.0, 55.0, 60.0, 3),
+    ] * 5
+    with Session(bind) as session:
+        session.add_all(_stored(*case) for case in cases)
+        session.add(models.ReservoirAnalysis(latitude=1.0, longitude=1.0, surface_area=1.0, co2_equivalent=7.0))
+        session.commit()
+    assert backfill.count_stale(bind) == {"stale": 0, "skipped": 1}
+
+    # New factors: every dated row is stale, the age-less one is skipped
+    monkeypatch.setattr(ipcc_tier1, "GWP_100yr_CH4", 29.8)
+    monkeypatch.setitem(ipcc_tier1.TROPHIC_ADJUSTMENT_FACTORS, "Eutrophic", 12)
+    monkeypatch.setattr(ipcc_tier1, "FACTOR_VERSION", ipcc_tier1.factor_fingerprint())
+    assert backfill.count_stale(bind) == {"stale": 20, "skipped": 1}
+
+    # Interrupt after the first chunk: it is committed, the rest stays stale
+    progress = io.StringIO()
+    with monkeypatch.context() as patch:
+        calls = []
+
+        def interrupted(rows):
+            if calls:
+                raise KeyboardInterrupt
+            calls.append(len(rows))
+            return recompute(rows)
+
+        recompute = backfill.recompute
+        patch.setattr(backfill, "recompute", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            backfill.backfill(bind, chunk_size=8, progress=progress)
+    assert backfill.count_stale(bind)["stale"] == 12
+    assert progress.getvalue().startswith("8/20 (40%) analyses recomputed")
+
+    summary = backfill.backfill(bind, chunk_size=8, progress=None)
+    assert summary["rows"] == 12 and summary["skipped"] == 1
+
+    with Session(bind) as session:
+        stored = session.scalars(
+            select(models.ReservoirAnalysis).where(models.ReservoirAnalysis.reservoir_age.isnot(None))
+            .order_by(models.ReservoirAnalysis.id)
+        ).all()
+        for analysis, case in zip(stored, cases):
+            expected = _stored(*case)
+            assert analysis.factor_version == ipcc_tier1.FACTOR_VERSION
+            assert analysis.climate_region == expected.climate_region
+            for column in backfill._RESULT_COLUMNS[1:]:
+                assert getattr(analysis, column) == pytest.approx(getattr(expected, column), rel=1e-12)
+
+        # Incremental rollup deltas agree with a rebuild from scratch
+        incremental = _rollups(session)
+        rollups.rebuild(session)
+        rebuilt = _rollups(session)
+        assert incremental.keys() == rebuilt.keys()
+        for key, (count, total) in rebuilt.items():
+            assert incremental[key][0] == count and incremental[key][1] == pytest.approx(total, rel=1e-9)
+
+        session.execute(update(models.ReservoirAnalysis).values(factor_version="old"))
+        session.commit()
+    # Unchanged results: rows are restamped, rollups untouched
+    assert backfill.backfill(bind, progress=None)["rows"] == 20
+    with Session(bind) as session:
+        assert _rollups(session) == rebuilt
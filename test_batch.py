@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test the offline bulk inventory runner (python -m app)
+"""
+
+import io
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from app import batch
+from app.analysis import UncertaintyAnalysis
+from app.ipcc_tier1 import (
+    assess_trophic_status,
+    assess_trophic_status_batch,
+    calculate_ipcc_tier1_emissions,
+    calculate_ipcc_tier1_emissions_batch,
+)
+
+STATUSES = ["Oligotrophic", "Mesotrophic", "Eutrophic", "Hypereutrophic", None]
+
+
+def _reservoirs(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "name": [f"R{i}" for i in range(count)],
+        "latitude": rng.uniform(-70, 70, count),
+        "longitude": rng.uniform(-180, 180, count),
+        "surface_area": rng.uniform(0.1, 500, count),
+        "reservoir_age": rng.uniform(1, 60, count).round(1),
+        "trophic_status": rng.choice(STATUSES, count),
+        "total_phosphorus": np.where(rng.random(count) < 0.5, rng.uniform(0, 0.2, count), np.nan),
+    })
+
+
+def test_tier1_batch_matches_scalar():
+    frame = _reservoirs(500)
+    results = calculate_ipcc_tier1_emissions_batch(
+        frame.surface_area * 100, frame.latitude, frame.trophic_status.to_numpy(), frame.reservoir_age
+    )
+    for i, row in frame.iterrows():
+        expected = calculate_ipcc_tier1_emissions(
+            row.surface_area * 100, row.latitude, row.trophic_status, row.reservoir_age
+        )
+        assert results["climate_region"][i] == expected["climate_region"]
+        for key in batch.TIER1_KEYS:
+            assert np.isclose(results[key][i], expected[key], rtol=1e-12), key
+
+
+def test_trophic_batch_matches_scalar():
+    rng = np.random.default_rng(1)
+    columns = [rng.uniform(0, high, 400) for high in (0.2, 2.0, 40.0, 6.0)]
+    for values in columns:
+        values[rng.random(400) < 0.3] = np.nan
+    statuses = assess_trophic_status_batch(*columns)
+    for i, status in enumerate(statuses):
+        values = [None if np.isnan(values[i]) else values[i] for values in columns]
+        assert status == assess_trophic_status(*values)
+
+
+def test_validate_reports_every_problem_per_row():
+    frame = _reservoirs(4)
+    frame.loc[1, "surface_area"] = 0
+    frame["latitude"] = frame["latitude"].astype(object)
+    frame.loc[2, "latitude"] = "north"
+    frame.loc[2, "trophic_status"] = "Murky"
+    frame, errors = batch.validate(frame)
+    assert errors[0] == "" and errors[3] == ""
+    assert errors[1] == "surface_area must be > 0"
+    assert "latitude is not a number" in errors[2] and "trophic_status must be one of" in errors[2]
+
+
+def test_run_is_deterministic_across_chunks_and_workers():
+    directory = tempfile.mkdtemp()
+    source = os.path.join(directory, "reservoirs.csv")
+    frame = _reservoirs(300)
+    frame.loc[10, "reservoir_age"] = 0
+    frame.to_csv(source, index=False)
+
+    outputs = []
+    for chunk_size, workers in ((300, 1), (64, 2)):
+        out = os.path.join(directory, f"out-{chunk_size}.parquet")
+        summary = batch.run(
+            source, out, errors_path=os.path.join(directory, "errors.csv"),
+            chunk_size=chunk_size, workers=workers, uncertainty_iterations=200, seed=7,
+            progress=io.StringIO()
+        )
+        assert (summary["rows"], summary["invalid"]) == (300, 1)
+        outputs.append(pd.read_parquet(out))
+
+    pd.testing.assert_frame_equal(outputs[0], outputs[1])
+    results = outputs[0]
+    assert list(results["row"][:11]) == list(range(10)) + [11]
+    assert pd.read_csv(os.path.join(directory, "errors.csv"))["row"].tolist() == [10]
+
+    # A row's statistics equal the API's analysis under the row's seed
+    first = results.iloc[0]
+    np.random.seed([7, 0])
+    expected = UncertaintyAnalysis(iterations=200).run(
+        first.surface_area, first.ch4_emission_factor, first.co2_emission_factor, 0.0
+    )
+    for stat, value in expected["CO2_equivalent"].items():
+        assert np.isclose(first[f"uncertainty_CO2_equivalent_{stat}"], value, rtol=1e-12)
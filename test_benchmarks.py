@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Test the benchmark suite's baseline comparison
+"""
+
+import json
+
+from benchmarks import suite
+
+
+def test_compare_flags_cases_over_the_threshold():
+    baseline = {"a": {"median_s": 1.0}, "b": {"median_s": 1.0}}
+    current = {"a": {"median_s": 1.4}, "b": {"median_s": 1.6}, "new": {"median_s": 1.0}}
+    rows = {row["name"]: row for row in suite.compare(baseline, current, threshold=1.5)}
+    assert not rows["a"]["regressed"]
+    assert rows["b"]["regressed"] and rows["b"]["ratio"] == 1.6
+    assert rows["new"]["ratio"] is None and not rows["new"]["regressed"]
+
+
+def test_save_then_check_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(suite, "SIZES", (10,))
+    path = tmp_path / "baseline.json"
+    assert suite.main(["--only", "micro", "--repeat", "1", "--save", "--baseline", str(path)]) == 0
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert "calculate_ipcc_tier1_emissions[x10]" in saved["results"]
+    
+    # An impossible budget fails, a generous one passes
+    args = ["--only", "micro", "--repeat", "1", "--check", "--baseline", str(path)]
+    assert suite.main(args + ["--threshold", "1000"]) == 0
+    for result in saved["results"].values():
+        result["median_s"] = 1e-12
+    path.write_text(json.dumps(saved), encoding="utf-8")
+    assert suite.main(args + ["--threshold", "1.5"]) == 1
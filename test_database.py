@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test database engine profiles
+"""
+
+import asyncio
+import os
+import tempfile
+
+from sqlalchemy import text
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.database import async_url, build_async_engine, build_engine
+
+
+def test_sqlite_profile_applies_pragmas_on_connect():
+    url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "profile.db")
+    engine = build_engine(url)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+    engine.dispose()
+
+
+def test_in_memory_sqlite_skips_file_only_pragmas():
+    engine = build_engine("sqlite://")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "memory"
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+
+
+def test_async_url_swaps_in_the_asyncio_driver():
+    assert async_url("sqlite:///./data/x.db") == "sqlite+aiosqlite:///./data/x.db"
+    assert async_url("postgresql+psycopg2://u:p@db/x") == "postgresql+asyncpg://u:p@db/x"
+
+
+def test_async_sqlite_profile_applies_pragmas_on_connect():
+    url = "sqlite+aiosqlite:///" + os.path.join(tempfile.mkdtemp(), "profile.db")
+    engine = build_async_engine(url)
+
+    async def pragmas():
+        async with engine.connect() as conn:
+            return [
+                (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+                for name in ("journal_mode", "busy_timeout")
+            ]
+
+    assert asyncio.run(pragmas()) == ["wal", 5000]
+    # File databases are pooled, so connections keep their page cache
+    assert isinstance(engine.pool, AsyncAdaptedQueuePool)
+    asyncio.run(engine.dispose())
+
+
+def test_missing_asyncio_driver_falls_back_to_threaded_sessions(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import database
+    from app.main import app
+
+    assert database.resolve_async_url("mssql+pyodbc://u:p@db/x") is None
+    monkeypatch.setattr(database, "get_async_engine", lambda: None)
+    client = TestClient(app)
+
+    user = {
+        "username": "threaded", "email": "threaded@example.com", "password": "threaded-password",
+        "first_name": "Thread", "last_name": "Pool",
+    }
+    response = client.post("/api/auth/register", json=user)
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    analysis = client.post("/api/analyze", headers=headers, json={
+        "latitude": 30.5, "longitude": 114.3, "surface_area": 12.0, "reservoir_age": 15,
+        "trophic_status": "Eutrophic", "run_uncertainty": False, "run_sensitivity": False,
+    }).json()
+    assert [item["id"] for item in client.get("/api/analyses", headers=headers).json()] == [analysis["id"]]
+    assert client.get(f"/api/analyses/{analysis['id']}", headers=headers).json()["surface_area"] == 12.0
+    assert client.get("/api/aggregates", headers=headers).json()[0]["analysis_count"] == 1
+    assert client.delete(f"/api/analyses/{analysis['id']}", headers=headers).status_code == 200
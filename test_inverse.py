@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test the inverse Tier 1 solver and /api/solve
+"""
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app import inverse, ipcc_tier1
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_solutions_reproduce_the_forward_model():
+    rng = np.random.default_rng(3)
+    size = 2000
+    latitude = rng.uniform(-60, 60, size)
+    area = rng.uniform(0.5, 300, size)
+    age = rng.uniform(1, 100, size)
+    trophic = np.array(list(ipcc_tier1.TROPHIC_ADJUSTMENT_FACTORS) + [None], dtype=object)[rng.integers(0, 5, size)]
+    budget = inverse.co2_equivalent(area, latitude, trophic, age)
+
+    assert np.allclose(inverse.max_surface_area(budget, latitude, trophic, age), area, rtol=1e-12)
+    assert np.allclose(inverse.crossing_age(budget, latitude, area, trophic), age, rtol=0, atol=1e-8)
+
+    status, factor = inverse.max_trophic_status(budget, latitude, area, age)
+    expected = np.array([ipcc_tier1.TROPHIC_ADJUSTMENT_FACTORS.get(name, 3) for name in trophic])
+    assert np.allclose(factor, expected, rtol=1e-12)
+    # Slightly more budget than a known state needs still selects that state
+    status, _ = inverse.max_trophic_status(budget * (1 + 1e-9), latitude, area, age)
+    known = trophic != None  # noqa: E711
+    assert (status[known] == trophic[known]).all()
+
+
+def test_solve_endpoint_inverts_analyze():
+    body = {
+        "latitude": 23.4, "longitude": 101.2, "surface_area": 8.0, "reservoir_age": 30,
+        "trophic_status": "Eutrophic", "run_uncertainty": False, "run_sensitivity": False,
+    }
+    budget = client.post("/api/analyze", json=body).json()["emissions"]["co2_equivalent"]
+    reservoir = {"latitude": 23.4, "co2_equivalent_budget": budget}
+
+    solved = client.post("/api/solve", json={"solve_for": "surface_area", "reservoirs": [
+        {**reservoir, "reservoir_age": 30, "trophic_status": "Eutrophic"},
+        {**reservoir, "reservoir_age": 30, "trophic_status": "Oligotrophic"},
+    ]}).json()
+    assert solved["solutions"][0] == {"feasible": True, "surface_area": pytest.approx(8.0, rel=1e-12)}
+    assert solved["solutions"][1]["surface_area"] > 8.0
+
+    solved = client.post("/api/solve", json={"solve_for": "trophic_status", "reservoirs": [
+        {**reservoir, "surface_area": 8.0, "reservoir_age": 30, "co2_equivalent_budget": budget * 1.01},
+        {**reservoir, "surface_area": 800.0, "reservoir_age": 30},
+    ]}).json()["solutions"]
+    assert solved[0]["trophic_status"] == "Eutrophic" and solved[0]["max_trophic_factor"] > 10
+    assert not solved[1]["feasible"] and solved[1]["trophic_status"] is None
+    assert solved[1]["max_trophic_factor"] < min(ipcc_tier1.TROPHIC_ADJUSTMENT_FACTORS.values())
+
+    solved = client.post("/api/solve", json={"solve_for": "reservoir_age", "max_age": 100, "reservoirs": [
+        {**reservoir, "surface_area": 8.0, "trophic_status": "Eutrophic"},
+        {**reservoir, "surface_area": 0.01, "trophic_status": "Eutrophic"},
+    ]}).json()["solutions"]
+    assert solved[0]["reservoir_age"] == pytest.approx(30, abs=1e-6)
+    assert solved[1] == {"feasible": False, "reservoir_age": None}
+
+    response = client.post("/api/solve", json={"solve_for": "reservoir_age", "reservoirs": [reservoir]})
+    assert response.status_code == 400 and "surface_area" in response.json()["detail"]
+    assert client.post("/api/solve", json={"solve_for": "latitude", "reservoirs": [reservoir]}).status_code == 422
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test the load-replay harness in process
+"""
+
+import json
+
+from benchmarks import load
+
+
+def test_synthetic_mix_reports_latency_and_errors(tmp_path):
+    out = tmp_path / "run.json"
+    assert load.main([
+        "--mix", "analyze=1,list=1,get=1", "--requests", "20", "--concurrency", "4",
+        "--iterations", "100", "--out", str(out),
+    ]) == 0
+    
+    report = json.loads(out.read_text(encoding="utf-8"))
+    results = report["results"]
+    assert results["overall"]["requests"] == 20
+    assert results["overall"]["errors"] == 0
+    assert results["throughput_rps"] > 0
+    assert {"p50_ms", "p99_ms"} <= set(results["overall"])
+    assert set(results["by_kind"]) <= {"analyze", "list", "get"}
+    assert results["event_loop_lag"]["max_ms"] >= 0
+    assert report["config"]["target"] == "in-process"
+    assert report["config"]["database"] == "temporary sqlite"
+
+
+def test_database_url_is_explicit(monkeypatch):
+    import pytest
+
+    def spawn_uvicorn(workers, database_url):
+        raise RuntimeError(database_url)
+
+    # An inherited DATABASE_URL is not the load target
+    monkeypatch.setenv("DATABASE_URL", "postgresql://prod@db/reservoirs")
+    monkeypatch.setattr(load, "spawn_uvicorn", spawn_uvicorn)
+    with pytest.raises(RuntimeError, match=r"^sqlite:///.*load\.db$"):
+        load.main(["--uvicorn", "--requests", "1"])
+    with pytest.raises(RuntimeError, match="^sqlite:///other.db$"):
+        load.main(["--uvicorn", "--requests", "1", "--database-url", "sqlite:///other.db"])
+    
+    with pytest.raises(SystemExit):
+        load.main(["--url", "http://127.0.0.1:1", "--database-url", "sqlite:///other.db"])
+
+
+def test_trace_replay_keeps_its_timing(tmp_path):
+    trace = tmp_path / "trace.jsonl"
+    trace.write_text("\n".join(json.dumps(line) for line in [
+        {"method": "GET", "path": "/health", "auth": False, "at": 0.0},
+        {"method": "GET", "path": "/api/analyses?limit=5", "at": 0.2},
+        {"method": "GET", "path": "/api/analyses/999999999", "kind": "missing", "at": 0.4},
+    ]) + "\n", encoding="utf-8")
+    out = tmp_path / "trace.json"
+    assert load.main(["--trace", str(trace), "--out", str(out)]) == 0
+    
+    results = json.loads(out.read_text(encoding="utf-8"))["results"]
+    assert results["elapsed_s"] >= 0.4
+    assert results["by_kind"]["GET /health"]["errors"] == 0
+    assert results["by_kind"]["missing"]["error_rate"] == 1.0
+
+
+def test_login_storm_does_not_block_other_requests(tmp_path):
+    import time
+
+    from app import auth
+
+    start = time.perf_counter()
+    auth.get_password_hash("one bcrypt round")
+    hash_ms = (time.perf_counter() - start) * 1000
+
+    out = tmp_path / "storm.json"
+    assert load.main([
+        "--mix", "list=1,get=1,login=2", "--storm", "login", "--requests", "24", "--concurrency", "8",
+        "--iterations", "100", "--out", str(out),
+    ]) == 0
+
+    report = json.loads(out.read_text(encoding="utf-8"))
+    assert set(report["storm"]["quiet"]["by_kind"]) <= {"analyze", "list", "get"}
+    assert report["results"]["by_kind"]["login"]["errors"] == 0
+    assert set(report["storm"]["others"]) == {"list", "get"} & set(report["results"]["by_kind"])
+    # Hashing off the loop: no stall as long as one bcrypt hash
+    assert report["results"]["event_loop_lag"]["max_ms"] < hash_ms
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test the metrics layer and the /metrics endpoint
+"""
+
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("demo_seconds", "Demo", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "x")
+    lines = histogram.collect()
+    assert 'demo_seconds_bucket{stage="x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="x",le="1"} 3' in lines
+    assert 'demo_seconds_bucket{stage="x",le="+Inf"} 4' in lines
+    assert 'demo_seconds_count{stage="x"} 4' in lines
+
+
+def test_analyze_reports_stage_timings():
+    before = metrics.STAGE_SECONDS.count("uncertainty")
+    response = client.post("/api/analyze", json={
+        "latitude": 30.5,
+        "longitude": 114.3,
+        "surface_area": 12.0,
+        "reservoir_age": 15,
+        "water_quality": {"total_phosphorus": 0.02},
+        "run_uncertainty": True,
+        "run_sensitivity": False,
+        "uncertainty_iterations": 100,
+    })
+    assert response.status_code == 200
+    
+    timing = response.headers["Server-Timing"]
+    for name in ("trophic", "tier1", "uncertainty", "db", "serialize", "total"):
+        assert f"{name};dur=" in timing
+    assert metrics.STAGE_SECONDS.count("uncertainty") == before + 1
+    
+    body = client.get("/metrics")
+    assert body.status_code == 200
+    assert body.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = body.text
+    assert 'reservoir_http_requests_total{method="POST",route="/api/analyze",status="200"}' in text
+    assert 'reservoir_stage_duration_seconds_count{stage="tier1"}' in text
+    assert 'reservoir_cache_hit_ratio{cache="token"}' in text
+    assert "reservoir_write_behind_queue_depth 0" in text
+    assert "reservoir_auth_hash_pending 0" in text
+
+
+def test_routes_are_labelled_by_template():
+    client.get("/api/climate-region/31.5")
+    assert metrics.REQUESTS.value("GET", "/api/climate-region/{latitude}", "200") >= 1
+
+
+def test_disabled_metrics_are_no_ops(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    assert metrics.stage("tier1") is metrics.stage("db")
+    with metrics.stage("tier1"):
+        pass
+    assert client.get("/metrics").status_code == 404
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test water quality time-series ingestion and its use by /api/analyze
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from app import auth, models, monitoring
+from app.database import SessionLocal
+from app.main import app
+from app.ipcc_tier1 import assess_trophic_status
+
+client = TestClient(app)
+
+
+def _user(username):
+    db = SessionLocal()
+    try:
+        user = auth.get_user_by_username(db, username)
+        if user is None:
+            user = models.User(username=username, email=f"{username}@example.com", hashed_password="-")
+            db.add(user)
+            db.commit()
+        return user.id, {"Authorization": f"Bearer {auth.create_access_token(data={'sub': username})}"}
+    finally:
+        db.close()
+
+
+USER_ID, HEADERS = _user("monitor")
+
+
+def _samples(count=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        "reservoir_id": rng.choice(["A", "B", "C"], count),
+        "date": pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, count), unit="D"),
+        "total_phosphorus": rng.uniform(0, 0.15, count),
+        "chlorophyll_a": rng.uniform(0, 30, count),
+        "secchi_depth": rng.uniform(0.2, 6, count),
+    })
+    frame.loc[frame.index[::7], "chlorophyll_a"] = np.nan
+    return frame
+
+
+def test_chunked_aggregates_match_whole_file_means():
+    frame = _samples()
+    chunks = (frame[i:i + 150] for i in range(0, len(frame), 150))
+    records, stats = monitoring.aggregate(chunks, "annual")
+    assert stats == {"samples": len(frame), "skipped": 0}
+
+    expected = frame.groupby([frame.reservoir_id, frame.date.dt.year.astype(str).rename("period")]).mean(numeric_only=True)
+    records = records.set_index(["reservoir_id", "period"])
+    assert len(records) == len(expected) == 9
+    for column in ("total_phosphorus", "chlorophyll_a", "secchi_depth"):
+        assert np.allclose(records[column], expected[column], rtol=1e-12)
+    for (_, _), row in records.iterrows():
+        assert row.trophic_status == assess_trophic_status(
+            total_phosphorus=row.total_phosphorus, chlorophyll_a=row.chlorophyll_a, secchi_depth=row.secchi_depth
+        )
+
+
+def test_seasons_put_december_in_next_winter():
+    dates = pd.Series(pd.to_datetime(["2022-12-15", "2023-02-01", "2023-07-04"]))
+    assert monitoring.periods(dates, "seasonal").tolist() == ["2023-DJF", "2023-DJF", "2023-JJA"]
+
+
+def test_bad_rows_are_skipped():
+    frame = pd.DataFrame({
+        "reservoir_id": ["A", None, "A", "A"],
+        "date": ["2023-05-01", "2023-05-02", "not a date", "2023-06-01"],
+        "total_phosphorus": [0.02, 0.02, 0.02, -1],
+    })
+    records, stats = monitoring.aggregate([frame])
+    assert stats == {"samples": 1, "skipped": 3}
+    assert records.sample_count.tolist() == [1]
+
+
+def test_analyze_uses_uploaded_monitoring_record():
+    frame = _samples(seed=1)
+    body = frame.to_csv(index=False).encode()
+    response = client.post(
+        "/api/monitoring/upload", headers=HEADERS, files={"file": ("samples.csv", io.BytesIO(body), "text/csv")}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"samples": len(frame), "skipped": 0, "reservoirs": 3, "records": 9}
+
+    # Re-uploading replaces rather than duplicates
+    client.post("/api/monitoring/upload", headers=HEADERS, files={"file": ("samples.csv", io.BytesIO(body), "text/csv")})
+    records = client.get("/api/monitoring/B", headers=HEADERS).json()
+    assert [record["period"] for record in records] == ["2023", "2022", "2021"]
+
+    latest = records[0]
+    response = client.post("/api/analyze", headers=HEADERS, json={
+        "latitude": 30.5, "longitude": 114.3, "surface_area": 12.0, "reservoir_age": 15,
+        "monitoring_reservoir_id": "B", "run_uncertainty": False, "run_sensitivity": False,
+    })
+    assert response.status_code == 200
+    assert response.json()["trophic_status"] == latest["trophic_status"]
+
+    response = client.post("/api/analyze", headers=HEADERS, json={
+        "latitude": 30.5, "longitude": 114.3, "surface_area": 12.0, "reservoir_age": 15,
+        "monitoring_reservoir_id": "B", "monitoring_period": "1999",
+    })
+    assert response.status_code == 404
+
+    # A record reference replaces, rather than supplements, direct inputs
+    response = client.post("/api/analyze", headers=HEADERS, json={
+        "latitude": 30.5, "longitude": 114.3, "surface_area": 12.0, "reservoir_age": 15,
+        "monitoring_reservoir_id": "B", "trophic_status": "Eutrophic",
+    })
+    assert response.status_code == 422
+
+    # Another user's records are not visible
+    _, other = _user("monitor-other")
+    assert client.get("/api/monitoring/B", headers=other).status_code == 404
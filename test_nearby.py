@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test the nearest-analysis index and /api/analyses/nearby
+"""
+
+import time
+
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+
+from app import auth, models, nearby
+from app.database import SessionLocal
+from app.main import app
+
+client = TestClient(app)
+
+
+def _user(username):
+    db = SessionLocal()
+    try:
+        user = auth.get_user_by_username(db, username)
+        if user is None:
+            user = models.User(username=username, email=f"{username}@example.com", hashed_password="-")
+            db.add(user)
+            db.commit()
+        return user.id, {"Authorization": f"Bearer {auth.create_access_token(data={'sub': username})}"}
+    finally:
+        db.close()
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * nearby.EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def test_index_matches_brute_force_through_inserts_merges_and_deletes(monkeypatch):
+    monkeypatch.setattr(nearby, "MIN_BUFFER", 8)
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(29.5, 30.5, 2000)
+    lon = np.concatenate([rng.uniform(179.5, 180, 1000), rng.uniform(-180, -179.5, 1000)])
+    owners = rng.choice([None, 1, 2], 2000)
+
+    bind = create_engine("sqlite://")
+    models.Base.metadata.create_all(bind)
+    with bind.begin() as conn:
+        conn.execute(insert(models.ReservoirAnalysis.__table__), [
+            {"id": i + 1, "latitude": lat[i], "longitude": lon[i], "surface_area": 1.0, "user_id": owners[i]}
+            for i in range(1500)
+        ])
+    index = nearby.NearbyIndex()
+    index.load(bind)
+    for i in range(1500, 2000):
+        index.add(i + 1, lat[i], lon[i], owners[i])
+    for i in range(0, 2000, 7):
+        index.remove(i + 1)
+    deadline = time.monotonic() + 10
+    while index._merging and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert index.merges >= 1
+
+    removed = np.arange(2000) % 7 == 0
+    for center_lat, center_lon in ((30.0, 179.95), (29.6, -179.9)):
+        distances = _haversine_km(center_lat, center_lon, lat, lon)
+        visible = ((owners == None) | (owners == 1)) & ~removed  # noqa: E711
+        expected = np.flatnonzero(visible & (distances <= 10))
+        expected = expected[np.argsort(distances[expected])][:20]
+
+        found = index.query(center_lat, center_lon, 10, user_id=1, limit=20)
+        assert [analysis_id - 1 for analysis_id, _ in found] == expected.tolist()
+        assert np.allclose([distance for _, distance in found], distances[expected], atol=1e-6)
+
+
+def test_nearby_endpoint_offers_visible_analyses():
+    user_id, headers = _user("neighbour")
+    _, other = _user("neighbour-other")
+    db = SessionLocal()
+    try:
+        analyses = [
+            models.ReservoirAnalysis(
+                latitude=lat, longitude=45.10, surface_area=1.0, climate_region="warm_temperate_moist",
+                co2_equivalent=5.0, user_id=owner
+            )
+            for lat, owner in ((-12.302, user_id), (-12.31, None), (-12.40, user_id))
+        ]
+        db.add_all(analyses)
+        db.commit()
+        ids = [analysis.id for analysis in analyses]
+    finally:
+        db.close()
+
+    params = {"latitude": -12.30, "longitude": 45.10, "radius_km": 5}
+    found = client.get("/api/analyses/nearby", params=params, headers=headers).json()
+    assert [item["id"] for item in found] == ids[:2]
+    assert abs(found[0]["distance_km"] - 0.222) < 0.001
+
+    assert [item["id"] for item in client.get("/api/analyses/nearby", params=params, headers=other).json()] == ids[1:2]
+
+    client.delete(f"/api/analyses/{ids[0]}", headers=headers)
+    assert [item["id"] for item in client.get("/api/analyses/nearby", params=params, headers=headers).json()] == ids[1:2]
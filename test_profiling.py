@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test admin opt-in request profiling
+"""
+
+import pstats
+
+from fastapi.testclient import TestClient
+
+from app import auth, models, persistence, profiling
+from app.database import SessionLocal
+from app.main import app
+
+ANALYSIS = {
+    "latitude": 30.5,
+    "longitude": 114.3,
+    "surface_area": 12.0,
+    "reservoir_age": 15,
+    "trophic_status": "Eutrophic",
+    "run_uncertainty": True,
+    "run_sensitivity": False,
+    "uncertainty_iterations": 100,
+}
+
+
+def _headers(username):
+    db = SessionLocal()
+    try:
+        if auth.get_user_by_username(db, username) is None:
+            db.add(models.User(username=username, email=f"{username}@example.com", hashed_password="-"))
+            db.commit()
+    finally:
+        db.close()
+    return {"Authorization": f"Bearer {auth.create_access_token(data={'sub': username})}"}
+
+
+def _enable(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILING_ADMINS", {"profiler-admin"})
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+
+
+def test_admin_can_profile_one_request(monkeypatch, tmp_path):
+    _enable(monkeypatch, tmp_path)
+    client = TestClient(app)
+    admin = _headers("profiler-admin")
+    
+    response = client.post("/api/analyze", json=ANALYSIS, headers={**admin, "X-Profile": "1"})
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+    
+    report = client.get(f"/api/admin/profiles/{profile_id}", headers=admin)
+    assert report.status_code == 200
+    assert "run_full_analysis" in report.text
+    assert "call tree" in report.text
+    assert "allocations: net growth by line" in report.text
+    
+    dump = client.get(f"/api/admin/profiles/{profile_id}", params={"format": "prof"}, headers=admin)
+    assert dump.status_code == 200
+    assert pstats.Stats(profiling.profile_path(profile_id, "prof")).total_calls > 0
+    
+    assert client.get(f"/api/admin/profiles/{profile_id}", headers=_headers("someone")).status_code == 403
+    assert client.get("/api/admin/profiles/../etc", headers=admin).status_code == 404
+
+
+def test_unflagged_and_non_admin_requests_are_not_profiled(monkeypatch, tmp_path):
+    _enable(monkeypatch, tmp_path)
+    client = TestClient(app)
+    
+    plain = client.post("/api/analyze", json=ANALYSIS, headers=_headers("profiler-admin"))
+    flagged = client.post("/api/analyze", json=ANALYSIS, headers={**_headers("someone"), "X-Profile": "1"})
+    anonymous = client.post("/api/analyze?profile=1", json=ANALYSIS)
+    for response in (plain, flagged, anonymous):
+        assert response.status_code == 200
+        assert "X-Profile-Id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_write_behind_flush_is_profiled(monkeypatch, tmp_path):
+    _enable(monkeypatch, tmp_path)
+    monkeypatch.setattr(persistence, "WRITE_BEHIND", True)
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/analyze?profile=1", json=ANALYSIS, headers=_headers("profiler-admin")
+        )
+        assert response.status_code == 200
+        profile_id = response.headers["X-Profile-Id"]
+    
+    with open(profiling.profile_path(profile_id, "txt"), encoding="utf-8") as f:
+        report = f.read()
+    assert "write-behind flush (1 rows)" in report
+    assert "apply_inserted" in report
+
+
+def test_streamed_analysis_workers_are_profiled(monkeypatch, tmp_path):
+    _enable(monkeypatch, tmp_path)
+    client = TestClient(app)
+    
+    response = client.post(
+        "/api/analyze/stream", json={**ANALYSIS, "run_sensitivity": True},
+        headers={**_headers("profiler-admin"), "X-Profile": "1"}
+    )
+    assert response.status_code == 200
+    assert "event: result" in response.text
+    profile_id = response.headers["X-Profile-Id"]
+    
+    with open(profiling.profile_path(profile_id, "txt"), encoding="utf-8") as f:
+        report = f.read()
+    # One section for all chunks, each chunk ran in its own worker thread
+    assert report.count("== uncertainty chunks: top functions") == 1
+    assert "iter_chunks" in report
+    assert "== sensitivity worker: top functions" in report
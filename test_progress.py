@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test streamed analysis progress (server-sent events)
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import json
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.main import app, _analysis_events
+from app.analysis import UncertaintyAnalysis
+from app.database import SessionLocal
+from app import models, schemas
+
+client = TestClient(app)
+
+PAYLOAD = {
+    "latitude": 30.5, "longitude": 114.3, "surface_area": 12.0, "reservoir_age": 15,
+    "trophic_status": "Eutrophic",
+    "run_uncertainty": True, "run_sensitivity": True, "uncertainty_iterations": 1000,
+}
+
+
+def _events(body):
+    """Parse an event-stream body into (event, data) pairs"""
+    events = []
+    for frame in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_chunks_end_with_the_full_run():
+    np.random.seed(7)
+    expected = UncertaintyAnalysis(iterations=1000).run(100.0, 50.0, 500.0, 0.0)
+    np.random.seed(7)
+    steps = list(UncertaintyAnalysis(iterations=1000).iter_chunks(100.0, 50.0, 500.0, 0.0, chunk_size=1000))
+    assert steps[-1] == (1000, expected)
+
+    steps = list(UncertaintyAnalysis(iterations=1000).iter_chunks(100.0, 50.0, 500.0, 0.0, chunk_size=300))
+    assert [done for done, _ in steps] == [300, 600, 900, 1000]
+    assert set(steps[0][1]) == {"CH4", "CO2", "CO2_equivalent"}
+
+
+def test_stream_reports_progress_then_result():
+    response = client.post("/api/analyze/stream", json=PAYLOAD)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = _events(response.text)
+    progress = [data for event, data in events if event == "progress" and data["stage"] == "uncertainty"]
+    assert len(progress) == 20
+    assert progress[-1]["done"] == 1000
+    assert "ci_lower" in progress[0]["estimate"]["CO2_equivalent"]
+
+    event, result = events[-1]
+    assert event == "result"
+    assert result["uncertainty"] == progress[-1]["estimate"]
+    assert result["sensitivity"]
+    assert client.get(f"/api/analyses/{result['id']}").status_code == 200
+
+
+def test_closing_the_stream_cancels_the_analysis():
+    db = SessionLocal()
+    before = db.query(models.ReservoirAnalysis).count()
+
+    async def first_events():
+        events = _analysis_events(schemas.ReservoirInput(**PAYLOAD), None)
+        frames = [await events.__anext__() for _ in range(2)]
+        await events.aclose()
+        return frames
+
+    frames = asyncio.run(first_events())
+    assert all(frame.startswith("event: progress") for frame in frames)
+    assert db.query(models.ReservoirAnalysis).count() == before
+    db.close()
+
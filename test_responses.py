@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test sparse field selection, the compact view and fast JSON rendering
+"""
+
+import json
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from app import responses, schemas
+from app.main import app
+
+client = TestClient(app)
+
+BODY = {
+    "latitude": 33.7, "longitude": 72.9, "surface_area": 4.0, "reservoir_age": 25,
+    "trophic_status": "Mesotrophic", "uncertainty_iterations": 200,
+}
+
+
+def test_full_response_matches_the_schema_and_both_encoders(monkeypatch):
+    full = client.post("/api/analyze", json=BODY).json()
+    assert jsonable_encoder(schemas.AnalysisResponse(**full)) == full
+    assert full["emissions"]["ipcc_tier1_results"]["GWP_100yr_CH4"] > 0
+
+    stored = client.get(f"/api/analyses/{full['id']}")
+    monkeypatch.setattr(responses, "orjson", None)
+    assert client.get(f"/api/analyses/{full['id']}").content == stored.content
+
+
+def test_fields_and_compact_view_trim_the_response():
+    params = {"fields": "id,emissions.co2_equivalent,uncertainty.CO2_equivalent.mean,sensitivity.parameter"}
+    sparse = client.post("/api/analyze", json=BODY, params=params).json()
+    assert set(sparse) == {"id", "emissions", "uncertainty", "sensitivity"}
+    assert list(sparse["emissions"]) == ["co2_equivalent"]
+    assert list(sparse["uncertainty"]) == ["CO2_equivalent"]
+    assert list(sparse["uncertainty"]["CO2_equivalent"]) == ["mean"]
+    assert all(list(item) == ["parameter"] for item in sparse["sensitivity"])
+
+    stored = client.get(f"/api/analyses/{sparse['id']}", params={"fields": "id,emissions"}).json()
+    assert stored["id"] == sparse["id"]
+    assert stored["emissions"]["co2_equivalent"] == sparse["emissions"]["co2_equivalent"]
+
+    compact = client.post("/api/analyze", json={**BODY, "run_sensitivity": False}, params={"view": "compact"}).json()
+    assert "sensitivity" not in compact and "degraded" not in compact
+    ipcc = compact["emissions"]["ipcc_tier1_results"]
+    assert "E_total" in ipcc and not responses.COMPACT_OMITTED & set(ipcc)
+
+    assert client.post("/api/analyze", json=BODY, params={"fields": "id,nope"}).status_code == 400
+    assert client.post("/api/analyze", json=BODY, params={"view": "tiny"}).status_code == 422
+
+
+def test_parse_fields_merges_overlapping_paths():
+    assert responses.parse_fields("emissions.co2_equivalent,emissions") == {"emissions": {}}
+    assert responses.parse_fields("emissions,emissions.co2_equivalent") == {"emissions": {}}
+    assert json.loads(responses.AnalysisJSONResponse({"a": [1.5, None]}).body) == {"a": [1.5, None]}
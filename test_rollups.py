@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Test incremental analysis rollups and the aggregates API
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.database import SessionLocal
+from app import auth, models, rollups
+
+client = TestClient(app)
+
+
+def _analysis(month, region, co2_eq, user_id=None):
+    return models.ReservoirAnalysis(
+        user_id=user_id,
+        created_at=datetime(2024, month, 15),
+        latitude=30.0,
+        longitude=110.0,
+        climate_region=region,
+        trophic_status="Mesotrophic",
+        surface_area=2.0,
+        total_ch4_emissions=1.0,
+        total_co2_emissions=3.0,
+        co2_equivalent=co2_eq,
+    )
+
+
+def _reset(db):
+    db.query(models.ReservoirAnalysis).delete()
+    db.query(models.AnalysisRollup).delete()
+    db.commit()
+
+
+def test_rollups_track_insert_update_and_delete():
+    db = SessionLocal()
+    try:
+        _reset(db)
+        a = _analysis(1, "温暖湿润区", 100.0)
+        b = _analysis(1, "温暖湿润区", 50.0)
+        c = _analysis(2, "炎热潮湿区", 10.0)
+        db.add_all([a, b, c])
+        db.commit()
+        
+        totals = rollups.summarize(db, group_by=["climate_region"])
+        by_region = {row["climate_region"]: row for row in totals}
+        assert by_region["温暖湿润区"]["analysis_count"] == 2
+        assert by_region["温暖湿润区"]["co2_equivalent_total"] == 150.0
+        assert by_region["炎热潮湿区"]["surface_area_total"] == 2.0
+        
+        # Moving an analysis between groups shifts its totals
+        b.climate_region = "炎热潮湿区"
+        db.commit()
+        by_region = {row["climate_region"]: row for row in rollups.summarize(db, group_by=["climate_region"])}
+        assert by_region["温暖湿润区"]["co2_equivalent_total"] == 100.0
+        assert by_region["炎热潮湿区"]["co2_equivalent_total"] == 60.0
+        
+        db.delete(a)
+        db.commit()
+        grand_total = rollups.summarize(db)[0]
+        assert grand_total["analysis_count"] == 2
+        assert grand_total["co2_equivalent_total"] == 60.0
+        
+        # Emptied groups are removed rather than left at zero
+        assert db.query(models.AnalysisRollup).filter(
+            models.AnalysisRollup.climate_region == "温暖湿润区"
+        ).count() == 0
+    finally:
+        db.close()
+
+
+def test_rebuild_matches_incremental_totals():
+    db = SessionLocal()
+    try:
+        _reset(db)
+        db.add_all([_analysis(m, "温暖湿润区", 10.0 * m) for m in range(1, 7)])
+        db.commit()
+        incremental = rollups.summarize(db, group_by=["month"])
+        
+        assert rollups.rebuild(db) == 6
+        assert rollups.summarize(db, group_by=["month"]) == incremental
+    finally:
+        db.close()
+
+
+def test_aggregates_endpoint_is_scoped_to_the_caller():
+    db = SessionLocal()
+    try:
+        _reset(db)
+        user = auth.get_user_by_username(db, "rollup-user")
+        if user is None:
+            user = models.User(username="rollup-user", email="rollup-user@example.com", hashed_password="-")
+            db.add(user)
+            db.commit()
+        user_id = user.id
+        db.add_all([
+            _analysis(3, "温暖湿润区", 5.0, user_id),
+            _analysis(4, "温暖湿润区", 7.0, user_id),
+            _analysis(4, "温暖湿润区", 11.0),  # someone else's
+        ])
+        db.commit()
+    finally:
+        db.close()
+    
+    headers = {"Authorization": f"Bearer {auth.create_access_token(data={'sub': 'rollup-user'})}"}
+    response = client.get(
+        "/api/aggregates", params={"group_by": "month", "month_from": "2024-04"}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json() == [{
+        "climate_region": None,
+        "trophic_status": None,
+        "user_id": None,
+        "month": "2024-04",
+        "analysis_count": 1,
+        "surface_area_total": 2.0,
+        "total_ch4_emissions": 1.0,
+        "total_co2_emissions": 3.0,
+        "co2_equivalent_total": 7.0,
+    }]
+    
+    assert client.get("/api/aggregates", params={"group_by": "latitude"}, headers=headers).status_code == 400
+    assert client.get("/api/aggregates").status_code == 403
+
+
+
+def test_group_key_is_unique_and_deltas_upsert(tmp_path):
+    """Each group has one row, NULL key fields included; upgrades rebuild unkeyed tables"""
+    import pytest
+    from sqlalchemy import select, update
+    from sqlalchemy.exc import IntegrityError
+    from sqlalchemy.orm import Session
+
+    from app import migrations
+    from app.database import build_engine
+
+    bind = build_engine(f"sqlite:///{tmp_path / 'rollups.db'}")
+    migrations.upgrade(bind)
+    with Session(bind) as session:
+        session.add(_analysis(5, None, 1.0))
+        session.commit()
+        # A second analysis through the ORM, more through the bulk path
+        session.add(_analysis(5, None, 2.0))
+        rollups.apply_inserted(session, [
+            {"climate_region": None, "trophic_status": "Mesotrophic", "user_id": None,
+             "created_at": datetime(2024, 5, 1), "co2_equivalent": 4.0},
+        ])
+        session.commit()
+
+    table = models.AnalysisRollup.__table__
+    with bind.connect() as conn:
+        rows = conn.execute(select(table.c.analysis_count, table.c.co2_equivalent_total, table.c.group_key)).all()
+    assert [tuple(row[:2]) for row in rows] == [(3, 7.0)]
+    # What a racing transaction's plain INSERT of the same group would hit
+    with pytest.raises(IntegrityError), bind.begin() as conn:
+        conn.execute(table.insert().values(month="2024-05", group_key=rows[0].group_key))
+
+    # Tables from before group_key are rebuilt on upgrade, dropping duplicates
+    with bind.begin() as conn:
+        conn.execute(update(table).values(group_key=None))
+        conn.execute(table.insert().values(month="2024-05", trophic_status="Mesotrophic", analysis_count=7))
+    migrations.upgrade(bind)
+    with bind.connect() as conn:
+        rows = conn.execute(select(table.c.analysis_count, table.c.co2_equivalent_total, table.c.group_key)).all()
+    assert [tuple(row[:2]) for row in rows] == [(2, 3.0)] and rows[0].group_key is not None
+
+
+def test_portable_upsert_fallback(tmp_path, monkeypatch):
+    """Dialects without a native upsert UPDATE, then INSERT, retrying when a racing INSERT wins"""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    from app import migrations
+    from app.database import build_engine
+
+    monkeypatch.setattr(rollups, "_upsert_statement", lambda table, deltas, dialect: None)
+    bind = build_engine(f"sqlite:///{tmp_path / 'rollups.db'}")
+    migrations.upgrade(bind)
+    with Session(bind) as session:
+        a = _analysis(6, "温暖湿润区", 1.0)
+        session.add_all([a, _analysis(6, "温暖湿润区", 2.0), _analysis(7, "温暖湿润区", 4.0)])
+        session.commit()
+        a.climate_region = "炎热潮湿区"
+        session.commit()
+        by_region = {row["climate_region"]: row for row in rollups.summarize(session, group_by=["climate_region"])}
+        assert by_region["温暖湿润区"]["co2_equivalent_total"] == 6.0
+        assert by_region["炎热潮湿区"]["analysis_count"] == 1
+
+        # Another transaction creates the group between our UPDATE and INSERT
+        raced = []
+
+        def race(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("UPDATE analysis_rollups") and cursor.rowcount == 0 and not raced:
+                raced.append(parameters)
+                cursor.connection.execute(
+                    "INSERT INTO analysis_rollups (month, climate_region, trophic_status, group_key, analysis_count,"
+                    " surface_area_total, total_ch4_emissions, total_co2_emissions, co2_equivalent_total)"
+                    " VALUES ('2024-08', '温暖湿润区', 'Mesotrophic', ?, 5, 0.0, 0.0, 0.0, 10.0)",
+                    (rollups.group_key(("温暖湿润区", "Mesotrophic", None, "2024-08")),),
+                )
+
+        event.listen(bind, "after_cursor_execute", race)
+        session.add(_analysis(8, "温暖湿润区", 1.0))
+        session.commit()
+        assert raced
+        august = rollups.summarize(session, group_by=["month"], month_from="2024-08")
+        assert [(row["analysis_count"], row["co2_equivalent_total"]) for row in august] == [(6, 11.0)]
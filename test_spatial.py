@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test quadkey indexing and the map cell endpoint
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, select
+
+from app import auth, migrations, models, spatial
+from app.database import SessionLocal, engine
+from app.main import app
+
+client = TestClient(app)
+
+
+def _user(username):
+    db = SessionLocal()
+    try:
+        user = auth.get_user_by_username(db, username)
+        if user is None:
+            user = models.User(username=username, email=f"{username}@example.com", hashed_password="-")
+            db.add(user)
+            db.commit()
+        return user.id, {"Authorization": f"Bearer {auth.create_access_token(data={'sub': username})}"}
+    finally:
+        db.close()
+
+
+def _add(user_id, points):
+    db = SessionLocal()
+    try:
+        db.add_all([
+            models.ReservoirAnalysis(latitude=lat, longitude=lon, surface_area=1.0, co2_equivalent=10.0, user_id=user_id)
+            for lat, lon in points
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_quadkeys_nest_and_bound_their_points():
+    assert spatial._encode(3, 5, 3) == "213"
+    key = spatial.quadkey(30.52, 114.31)
+    assert len(key) == spatial.QUADKEY_LEVEL
+    assert spatial.quadkey(30.52, 114.31, 6) == key[:6]
+    south, west, north, east = spatial.bounds(key[:12])
+    assert south <= 30.52 <= north and west <= 114.31 <= east
+
+
+def test_tiles_wrap_the_antimeridian_and_are_bounded():
+    # Columns 3 and 0 at zoom 2, rows 1 and 2
+    assert spatial.tiles(-10, 170, 10, 190, 2) == ["02", "13", "20", "31"]
+    with pytest.raises(ValueError):
+        spatial.tiles(-80, -180, 80, 180, 8)
+
+
+def test_map_cells_summarise_and_follow_writes():
+    user_id, headers = _user("mapper")
+    _add(user_id, [(30.50 + i * 0.001, 114.30) for i in range(5)] + [(-33.9, 18.4)])
+    params = {"south": 29, "west": 113, "north": 32, "east": 116, "zoom": 6}
+
+    response = client.get("/api/map/cells", params=params, headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["level"] == 8
+    assert [(cell["count"], cell["co2_equivalent"]) for cell in body["cells"]] == [(5, 50.0)]
+    assert 30.5 < body["cells"][0]["latitude"] < 30.51
+
+    # A new analysis evicts the cached tile
+    _add(user_id, [(30.6, 114.35)])
+    cells = client.get("/api/map/cells", params=params, headers=headers).json()["cells"]
+    assert sum(cell["count"] for cell in cells) == 6
+
+    _, other = _user("mapper-other")
+    assert client.get("/api/map/cells", params=params, headers=other).json()["cells"] == []
+    too_wide = {**params, "south": -80, "west": -180, "north": 80, "east": 180, "zoom": 10}
+    assert client.get("/api/map/cells", params=too_wide, headers=headers).status_code == 400
+
+
+def test_upgrade_fills_missing_quadkeys():
+    table = models.ReservoirAnalysis.__table__
+    with engine.begin() as conn:
+        row_id = conn.execute(
+            insert(table).values(latitude=-8.0, longitude=-63.0, surface_area=1.0)
+        ).inserted_primary_key[0]
+    migrations.upgrade(engine)
+    with engine.connect() as conn:
+        assert conn.scalar(select(table.c.quadkey).where(table.c.id == row_id)) == spatial.quadkey(-8.0, -63.0)
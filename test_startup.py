@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Test that importing the app stays cheap
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_import_defers_heavy_modules_and_schema_setup():
+    """scipy.stats and pandas load on first use; import creates no tables"""
+    snippet = (
+        "import sys, app.main; "
+        "from sqlalchemy import inspect; from app.database import engine; "
+        "print('scipy.stats' in sys.modules, 'pandas' in sys.modules, inspect(engine).get_table_names())"
+    )
+    env = dict(os.environ, DATABASE_URL="sqlite://", AUTO_MIGRATE="0")
+    output = subprocess.check_output([sys.executable, "-c", snippet], cwd=ROOT, env=env)
+    assert output.decode().strip() == "False False []"
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test packed result storage, the statistics table and the legacy migration
+"""
+
+import os
+import tempfile
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from app import codecs, migrations, models, statistics
+from app.database import build_engine
+
+UNCERTAINTY = {
+    output: {stat: float(i + j) for j, stat in enumerate(codecs.UNCERTAINTY_STATS)}
+    for i, output in enumerate(codecs.UNCERTAINTY_OUTPUTS)
+}
+SENSITIVITY = [
+    {"parameter": name, "correlation": 0.5 - i / 10, "rank_correlation": 0.4 - i / 10}
+    for i, name in enumerate(codecs.SENSITIVITY_PARAMETERS)
+]
+
+
+def _engine():
+    return build_engine("sqlite:///" + os.path.join(tempfile.mkdtemp(), "storage.db"))
+
+
+def test_codecs_round_trip_and_fall_back_to_json():
+    packed = codecs.encode_uncertainty(UNCERTAINTY)
+    assert packed[0] == codecs.TAG_UNCERTAINTY
+    assert codecs.decode(packed) == UNCERTAINTY
+
+    packed = codecs.encode_sensitivity(SENSITIVITY)
+    assert packed[0] == codecs.TAG_SENSITIVITY
+    assert codecs.decode(packed) == SENSITIVITY
+
+    partial = {"CO2": {"mean": 1.0}}
+    packed = codecs.encode_uncertainty(partial)
+    assert packed[0] == codecs.TAG_JSON
+    assert codecs.decode(packed) == partial
+
+
+def test_statistics_follow_insert_update_and_delete():
+    engine = _engine()
+    migrations.upgrade(engine)
+    Session = sessionmaker(bind=engine)
+
+    with Session() as db:
+        analysis = models.ReservoirAnalysis(
+            latitude=30.0, longitude=110.0, surface_area=10.0,
+            uncertainty_analysis=UNCERTAINTY, sensitivity_analysis=SENSITIVITY,
+        )
+        db.add(analysis)
+        db.commit()
+
+        summary = statistics.summarize(db, "CO2_equivalent", "mean")
+        assert summary["count"] == 1 and summary["mean"] == 2.0
+        assert statistics.summarize(db, "Surface Area", "correlation")["max"] == 0.5
+
+        analysis.uncertainty_analysis = {"CO2_equivalent": {**UNCERTAINTY["CO2_equivalent"], "mean": 7.0}}
+        db.commit()
+        assert statistics.summarize(db, "CO2_equivalent", "mean")["mean"] == 7.0
+        assert statistics.summarize(db, "CH4", "mean")["count"] == 0
+
+        db.delete(analysis)
+        db.commit()
+        assert db.query(models.AnalysisStatistic).count() == 0
+    engine.dispose()
+
+
+def test_migration_packs_legacy_json_columns():
+    engine = _engine()
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(models.ReservoirAnalysis.__table__.insert(), [
+            {
+                "latitude": 30.0, "longitude": 110.0, "surface_area": 10.0,
+                "uncertainty_analysis": UNCERTAINTY,
+                "sensitivity_analysis": SENSITIVITY,
+                "user_inputs": {"surface_area": 10.0},
+            }
+            for _ in range(3)
+        ])
+
+    assert migrations._pack_legacy_results(engine, batch_size=2) == 3
+    assert migrations._pack_legacy_results(engine) == 0
+
+    with sessionmaker(bind=engine)() as db:
+        for analysis in db.query(models.ReservoirAnalysis):
+            assert analysis.uncertainty_analysis == UNCERTAINTY
+            assert analysis.sensitivity_analysis == SENSITIVITY
+            assert analysis.user_inputs == {"surface_area": 10.0}
+            assert analysis.uncertainty_analysis_legacy is None
+        assert statistics.summarize(db, "CH4", "std")["count"] == 3
+        assert db.execute(text(
+            "SELECT COUNT(*) FROM reservoir_analyses WHERE uncertainty_analysis IS NOT NULL"
+        )).scalar() == 0
+    engine.dispose()
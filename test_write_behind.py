@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test the group-commit write-behind persister
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app import models, persistence, rollups
+from app.database import SessionLocal, engine
+from app.main import app
+
+
+def _values(i):
+    return dict(
+        latitude=30.0,
+        longitude=110.0,
+        climate_region="温暖湿润区",
+        trophic_status="Mesotrophic",
+        surface_area=1.0,
+        reservoir_age=10.0,
+        co2_equivalent=float(i),
+        uncertainty_analysis={"CO2": {"mean": 1.0}},
+    )
+
+
+def test_concurrent_submissions_share_commits_and_update_rollups():
+    db = SessionLocal()
+    db.query(models.ReservoirAnalysis).delete()
+    db.query(models.AnalysisRollup).delete()
+    db.commit()
+    
+    async def run():
+        persister = persistence.WriteBehindPersister(engine, max_batch=50, interval_ms=5, durability="group")
+        await persister.start()
+        results = await asyncio.gather(*(persister.submit(_values(i)) for i in range(120)))
+        await persister.stop()
+        return persister, results
+    
+    persister, results = asyncio.run(run())
+    ids = [analysis_id for analysis_id, _ in results]
+    
+    assert len(set(ids)) == 120
+    assert persister.rows_written == 120
+    assert persister.batches_written < 120 / 10  # group commit, not one per row
+    assert not persister.pending
+    
+    assert db.query(models.ReservoirAnalysis).filter(models.ReservoirAnalysis.id.in_(ids)).count() == 120
+    assert rollups.summarize(db)[0]["analysis_count"] == 120
+    db.close()
+
+
+def test_async_durability_drains_queue_on_stop():
+    async def run():
+        persister = persistence.WriteBehindPersister(engine, interval_ms=50, durability="async")
+        await persister.start()
+        analysis_id, _ = await persister.submit(_values(1))
+        assert analysis_id in persister.pending  # returned before the commit
+        await persister.stop()
+        return analysis_id
+    
+    analysis_id = asyncio.run(run())
+    db = SessionLocal()
+    assert db.get(models.ReservoirAnalysis, analysis_id) is not None
+    db.close()
+
+
+def test_analyze_endpoint_with_write_behind(monkeypatch):
+    monkeypatch.setattr(persistence, "WRITE_BEHIND", True)
+    with TestClient(app) as client:
+        response = client.post("/api/analyze", json={
+            "latitude": 30.5,
+            "longitude": 114.3,
+            "surface_area": 12.0,
+            "reservoir_age": 15,
+            "trophic_status": "Eutrophic",
+            "run_uncertainty": True,
+            "run_sensitivity": False,
+            "uncertainty_iterations": 100,
+        })
+        assert response.status_code == 200
+        analysis_id = response.json()["id"]
+        
+        fetched = client.get(f"/api/analyses/{analysis_id}")
+        assert fetched.status_code == 200
+        assert fetched.json()["surface_area"] == 12.0
+    assert persistence.persister is None
+
+
+def test_failed_batches_are_retried_and_bad_rows_fail_alone(monkeypatch):
+    from sqlalchemy.exc import OperationalError
+    
+    async def run():
+        persister = persistence.WriteBehindPersister(engine, interval_ms=20, durability="async", retry_ms=1)
+        write = persister._write
+        failures = []
+        
+        def flaky(rows, profiles=()):
+            if len(failures) < 2:
+                failures.append(len(rows))
+                raise OperationalError("INSERT", {}, Exception("database is locked"))
+            write(rows, profiles)
+        
+        monkeypatch.setattr(persister, "_write", flaky)
+        await persister.start()
+        ids = [(await persister.submit(_values(i)))[0] for i in range(3)]
+        # NOT NULL violation: not retried as a batch, only this row is lost
+        ids.append((await persister.submit({**_values(3), "surface_area": None}))[0])
+        ids.append((await persister.submit(_values(4)))[0])
+        await persister.stop()
+        return persister, failures, ids
+    
+    persister, failures, ids = asyncio.run(run())
+    assert failures == [5, 5]  # the batch waited out two transient failures
+    assert persister.rows_written == 4 and persister.rows_dropped == 1
+    assert not persister.pending
+    db = SessionLocal()
+    stored = {row.id for row in db.query(models.ReservoirAnalysis.id).filter(models.ReservoirAnalysis.id.in_(ids))}
+    db.close()
+    assert stored == set(ids) - {ids[3]}